@@ -0,0 +1,92 @@
+# bench_startup.py
+"""
+冷启动基准：每轮在新的子进程中导入 main 并启动应用，统计模块导入耗时、
+启动到首个健康检查响应的耗时，以及首个表格 / PDF 请求的延迟（含延迟导入开销）。
+
+用法:
+    python bench_startup.py --runs 5
+    EXCELAB_PRELOAD=all python bench_startup.py --runs 5 --idle-seconds 2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 在子进程中执行，输出一行 JSON 结果
+CHILD_SCRIPT = r"""
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+
+result = {"import_ms": (imported - started) * 1000}
+with TestClient(main.app) as client:
+    client.get("/health")
+    result["health_ms"] = (time.perf_counter() - started) * 1000
+    time.sleep(float(sys.argv[2]))  # 模拟启动后首个请求到来前的空闲时间
+    result["modules_before_first_request"] = sorted(getattr(main, "IMPORT_TIMINGS", {}))
+
+    t = time.perf_counter()
+    response = client.post("/api/clean/preview", files={"file": ("a.csv", b"id,name\n1,a\n2,b\n", "text/csv")})
+    assert response.status_code == 200, response.text
+    result["first_table_ms"] = (time.perf_counter() - t) * 1000
+
+    t = time.perf_counter()
+    pdf = open(sys.argv[1], "rb").read()
+    response = client.post("/api/pdfmerge/preview", files=[
+        ("files", ("a.pdf", pdf, "application/pdf")), ("files", ("b.pdf", pdf, "application/pdf")),
+    ])
+    assert response.status_code == 200, response.text
+    result["first_pdf_ms"] = (time.perf_counter() - t) * 1000
+print(json.dumps(result))
+"""
+
+
+def make_sample_pdf(path: str) -> None:
+    """生成一页的示例 PDF（在父进程中导入 PyMuPDF，不影响子进程的计时）。"""
+    import fitz
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "excelab")
+    doc.save(path)
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Excelab 后端冷启动基准")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--idle-seconds", type=float, default=0, help="启动后等待多久再发首个请求（用于观察后台预加载效果）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "sample.pdf")
+        make_sample_pdf(pdf_path)
+        env = {**os.environ, "EXCELAB_DATA_DIR": os.path.join(tmp, "data")}
+
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, "-c", CHILD_SCRIPT, pdf_path, str(args.idle_seconds)],
+                cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"预加载: {os.environ.get('EXCELAB_PRELOAD') or '无'}  轮数: {args.runs}  空闲: {args.idle_seconds} s")
+    print(f"首个请求前已加载: {', '.join(runs[-1]['modules_before_first_request']) or '无'}")
+    for key, label in [
+        ("import_ms", "导入 main"),
+        ("health_ms", "首个健康检查响应"),
+        ("first_table_ms", "首个表格请求"),
+        ("first_pdf_ms", "首个 PDF 请求"),
+    ]:
+        values = [run[key] for run in runs]
+        print(f"{label}: 中位数 {statistics.median(values):.0f} ms  最大 {max(values):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
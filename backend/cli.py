@@ -0,0 +1,425 @@
+# cli.py
+"""
+命令行批处理：直接调用 main.py 中的核心函数处理本地目录或通配符匹配的文件，
+不经过 HTTP 上传下载，结果直接写入磁盘。逐文件的任务在进程池中并行执行，
+进度记录在输出目录的清单文件中，中断后重新运行会跳过已完成且输入未变化的文件。
+
+用法示例:
+    python cli.py merge data/*.xlsx -o merged.xlsx --mode outer
+    python cli.py clean inbox/ -o cleaned/ --trim-spaces --remove-invisible-chars
+    python cli.py dedup inbox/ -o deduped/ --column 客户 --logic max --value-column 金额
+    python cli.py pipeline inbox/ -o out/ --steps '[{"op": "clean"}, {"op": "split", "column": "城市"}]'
+    python cli.py pdf-merge reports/ -o merged.pdf --toc
+    python cli.py pdf-to-images reports/ -o images/ --format png --dpi 150
+    python cli.py image-convert photos/ -o converted/ --format webp
+    python cli.py image-convert animations/ -o frames/ --format png --frames all
+    python cli.py images-to-pdf scans/ -o scans.pdf --page-size a4
+"""
+import argparse
+import concurrent.futures
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import zipfile
+
+import main
+
+# 错误由命令行统一输出并记录到进度清单，不再重复打印服务端日志
+main.logger.setLevel(logging.CRITICAL)
+
+TABLE_EXTENSIONS = (".xlsx", ".xls", ".csv")
+PDF_EXTENSIONS = (".pdf",)
+IMAGE_EXTENSIONS = tuple(sorted(main.SUPPORTED_INPUT_FORMATS))
+MANIFEST_NAME = ".excelab_manifest.json"
+
+
+# --- 输入与清单 ---
+
+def expand_inputs(patterns, extensions, recursive: bool = False):
+    """把文件、目录和通配符展开为去重排序后的文件列表，只保留指定扩展名。"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*") if recursive else os.path.join(pattern, "*")
+        matches = glob.glob(pattern, recursive=recursive) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isfile(path) and path.lower().endswith(extensions):
+                paths.append(os.path.abspath(path))
+    return sorted(set(paths))
+
+
+def fingerprint(path: str) -> str:
+    """以大小和修改时间标识输入文件，判断重新运行时是否需要重新处理。"""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class Manifest:
+    """
+    进度清单：记录每个输入的指纹、输出路径和状态。
+    参数变化时清单作废；每完成一个文件立即原子写入，中断后可从断点继续。
+    """
+    def __init__(self, path: str, command: str, options: dict):
+        self.path = path
+        self.options_hash = hashlib.sha256(
+            json.dumps([command, options], sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        self.items = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("options_hash") == self.options_hash:
+                    self.items = data.get("items", {})
+            except (OSError, ValueError):
+                pass  # 清单损坏时从头处理
+
+    def is_done(self, input_path: str, output_path: str) -> bool:
+        item = self.items.get(input_path)
+        return bool(
+            item and item["status"] == "done" and item["fingerprint"] == fingerprint(input_path)
+            and item["output"] == output_path and os.path.exists(output_path)
+        )
+
+    def record(self, input_path: str, output_path: str, status: str, seconds: float, error: str = None) -> None:
+        self.items[input_path] = {
+            "fingerprint": fingerprint(input_path),
+            "output": output_path,
+            "status": status,
+            "seconds": round(seconds, 3),
+            "error": error,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"options_hash": self.options_hash, "items": self.items}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def partial_path(output_path: str) -> str:
+    """输出先写到同目录的临时文件（保留扩展名，供 pandas/Pillow 识别格式），完成后再改名。"""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}.part{ext}"
+
+
+def error_message(e: Exception) -> str:
+    return str(getattr(e, "detail", None) or e)
+
+
+# --- 表格读写 ---
+
+def read_tables(path: str):
+    with open(path, "rb") as f:
+        dataframes = main.parse_table_bytes(f.read(), os.path.basename(path))
+    if not dataframes:
+        raise ValueError("文件为空或无法解析。")
+    return dataframes
+
+
+def write_table(df, output_path: str) -> None:
+    if output_path.endswith(".csv"):
+        # utf-8-sig 便于 Excel 直接打开中文 CSV
+        df.to_csv(output_path, index=False, encoding="utf-8-sig")
+    else:
+        main.write_dataframe_excel(df, output_path)
+
+
+# --- 逐文件任务（在工作进程中执行）---
+
+def process_file(command: str, input_path: str, output_path: str, options: dict) -> None:
+    """处理单个输入文件，结果写入 output_path。"""
+    tmp_path = partial_path(output_path)
+    try:
+        if command == "clean":
+            df = main.clean_dataframe(read_tables(input_path)[0], main.CleanOptions(**options["clean"]))
+            write_table(df, tmp_path)
+        elif command == "dedup":
+            df = main.deduplicate_dataframe(
+                read_tables(input_path)[0], options["column"], main.DeduplicateLogic(options["logic"]),
+                options["value_column"], main.DeduplicateMatch(options["match_mode"]), options["threshold"],
+            )
+            write_table(df, tmp_path)
+        elif command == "pipeline":
+            steps = main.parse_pipeline_steps(options["steps"])
+            df, _ = main.run_pipeline(read_tables(input_path), steps)
+            if steps[-1]["op"] == main.PipelineOp.SPLIT:
+                main.write_split_zip(df, steps[-1]["column"], tmp_path)
+            else:
+                write_table(df, tmp_path)
+        elif command == "pdf-to-images":
+            with open(input_path, "rb") as f:
+                main.render_pdf_to_zip(f.read(), options["format"], options["dpi"], tmp_path)
+        elif command == "image-convert":
+            frames = main.ImageFrames(options["frames"])
+            if frames == main.ImageFrames.ALL:
+                with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as zipf:
+                    main.add_converted_image_to_zip(zipf, input_path, os.path.basename(input_path), options["format"], frames)
+            else:
+                main.convert_image(input_path, os.path.splitext(input_path)[1].lower(), options["format"], tmp_path, frames)
+        else:
+            raise ValueError(f"未知命令: {command}")
+        os.replace(tmp_path, output_path)
+    except Exception as e:
+        # HTTPException 等异常无法在进程间传递，统一转换为只带消息的异常
+        raise RuntimeError(error_message(e)) from None
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def output_path_for(command: str, input_path: str, output_dir: str, options: dict) -> str:
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    if command == "pipeline":
+        steps = json.loads(options["steps"])
+        ext = ".zip" if steps and steps[-1].get("op") == "split" else f".{options['output_format']}"
+        return os.path.join(output_dir, f"{stem}_pipeline{ext}")
+    if command == "pdf-to-images":
+        return os.path.join(output_dir, f"{stem}_images.zip")
+    if command == "image-convert":
+        if options["frames"] == main.ImageFrames.ALL.value:
+            return os.path.join(output_dir, f"{stem}_frames.zip")
+        return os.path.join(output_dir, f"{stem}{options['format']}")
+    suffix = {"clean": "cleaned", "dedup": "deduplicated"}[command]
+    return os.path.join(output_dir, f"{stem}_{suffix}.{options['output_format']}")
+
+
+def run_per_file(command: str, inputs, output_dir: str, options: dict, workers: int, force: bool) -> int:
+    """逐文件处理：跳过已完成的文件，其余在进程池中并行执行；返回失败数。"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME), command, options)
+
+    jobs, used_outputs = [], set()
+    for input_path in inputs:
+        output_path = output_path_for(command, input_path, output_dir, options)
+        # 不同目录下的同名文件加序号区分
+        root, ext = os.path.splitext(output_path)
+        index = 2
+        while output_path in used_outputs:
+            output_path = f"{root}_{index}{ext}"
+            index += 1
+        used_outputs.add(output_path)
+        if not force and manifest.is_done(input_path, output_path):
+            continue
+        jobs.append((input_path, output_path))
+
+    skipped = len(inputs) - len(jobs)
+    print(f"共 {len(inputs)} 个文件，跳过已完成 {skipped} 个，待处理 {len(jobs)} 个（{workers} 个进程）")
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        started = {}
+        futures = {}
+        for input_path, output_path in jobs:
+            futures[pool.submit(process_file, command, input_path, output_path, options)] = (input_path, output_path)
+            started[input_path] = time.perf_counter()
+        for done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            input_path, output_path = futures[future]
+            seconds = time.perf_counter() - started[input_path]
+            try:
+                future.result()
+                manifest.record(input_path, output_path, "done", seconds)
+                print(f"[{done}/{len(jobs)}] {os.path.basename(input_path)} -> {output_path}")
+            except Exception as e:
+                failed += 1
+                manifest.record(input_path, output_path, "error", seconds, error_message(e))
+                print(f"[{done}/{len(jobs)}] {os.path.basename(input_path)} 失败: {error_message(e)}", file=sys.stderr)
+    return failed
+
+
+# --- 多个输入合并为一个输出 ---
+
+def run_merge(inputs, output_path: str, options: dict, workers: int, force: bool) -> int:
+    """表格合并：在进程池中并行解析所有输入，合并后写出一个文件。"""
+    manifest = Manifest(output_path + ".manifest.json", "merge", {**options, "inputs": inputs})
+    if not force and all(manifest.is_done(path, output_path) for path in inputs):
+        print(f"输入未变化，跳过: {output_path}")
+        return 0
+
+    started = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        dataframes = [df for frames in pool.map(read_tables, inputs) for df in frames]
+    merged_df = main.merge_dataframes(dataframes, main.MergeMode(options["mode"]))
+    tmp_path = partial_path(output_path)
+    write_table(merged_df, tmp_path)
+    os.replace(tmp_path, output_path)
+    seconds = time.perf_counter() - started
+    for path in inputs:
+        manifest.record(path, output_path, "done", seconds)
+    print(f"已合并 {len(inputs)} 个文件（{len(dataframes)} 个表格，{len(merged_df)} 行）-> {output_path}")
+    return 0
+
+
+def run_pdf_merge(inputs, output_path: str, options: dict, force: bool) -> int:
+    manifest = Manifest(output_path + ".manifest.json", "pdf-merge", {**options, "inputs": inputs})
+    if not force and all(manifest.is_done(path, output_path) for path in inputs):
+        print(f"输入未变化，跳过: {output_path}")
+        return 0
+
+    started = time.perf_counter()
+    contents = []
+    for path in inputs:
+        with open(path, "rb") as f:
+            contents.append(f.read())
+    merge_options = [name for name, enabled in (("add_toc", options["toc"]), ("add_blank_page", options["blank_page"])) if enabled]
+    tmp_path = partial_path(output_path)
+    main.merge_pdf_contents(contents, [os.path.basename(path) for path in inputs], merge_options, tmp_path)
+    os.replace(tmp_path, output_path)
+    seconds = time.perf_counter() - started
+    for path in inputs:
+        manifest.record(path, output_path, "done", seconds)
+    print(f"已合并 {len(inputs)} 个 PDF -> {output_path}")
+    return 0
+
+
+def run_images_to_pdf(inputs, output_path: str, options: dict, force: bool) -> int:
+    """图片合成 PDF：按文件名顺序逐张插入，内存占用与图片数量无关。"""
+    manifest = Manifest(output_path + ".manifest.json", "images-to-pdf", {**options, "inputs": inputs})
+    if not force and all(manifest.is_done(path, output_path) for path in inputs):
+        print(f"输入未变化，跳过: {output_path}")
+        return 0
+
+    started = time.perf_counter()
+    tmp_path = partial_path(output_path)
+    try:
+        page_count = main.images_to_pdf(
+            [(os.path.basename(path), path) for path in inputs], main.PdfPageSize(options["page_size"]), tmp_path
+        )
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    seconds = time.perf_counter() - started
+    for path in inputs:
+        manifest.record(path, output_path, "done", seconds)
+    print(f"已将 {len(inputs)} 张图片合成为 {page_count} 页 PDF -> {output_path}")
+    return 0
+
+
+# --- 命令行参数 ---
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Excelab 命令行批处理")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("inputs", nargs="+", help="输入文件、目录或通配符")
+    common.add_argument("-o", "--output", required=True, help="输出目录（合并命令为输出文件）")
+    common.add_argument("--recursive", action="store_true", help="递归处理子目录")
+    common.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="并行进程数")
+    common.add_argument("--force", action="store_true", help="忽略进度清单，全部重新处理")
+    table_format = argparse.ArgumentParser(add_help=False)
+    table_format.add_argument("--output-format", choices=["xlsx", "csv"], default="xlsx")
+
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("merge", parents=[common], help="合并多个表格为一个文件（输出格式由扩展名决定）")
+    p.add_argument("--mode", choices=[m.value for m in main.MergeMode], default=main.MergeMode.OUTER.value)
+
+    p = sub.add_parser("clean", parents=[common, table_format], help="逐个清理表格")
+    p.add_argument("--keep-empty-rows", action="store_true")
+    p.add_argument("--keep-empty-cols", action="store_true")
+    p.add_argument("--trim-spaces", action="store_true")
+    p.add_argument("--normalize-spaces", action="store_true")
+    p.add_argument("--remove-invisible-chars", action="store_true")
+
+    p = sub.add_parser("dedup", parents=[common, table_format], help="逐个按列去重")
+    p.add_argument("--column", required=True)
+    p.add_argument("--logic", choices=[l.value for l in main.DeduplicateLogic], default=main.DeduplicateLogic.RANDOM.value)
+    p.add_argument("--value-column")
+    p.add_argument("--match-mode", choices=[m.value for m in main.DeduplicateMatch], default=main.DeduplicateMatch.EXACT.value)
+    p.add_argument("--threshold", type=float, default=0.9)
+
+    p = sub.add_parser("pipeline", parents=[common, table_format], help="逐个执行处理流水线（步骤格式同 /api/pipeline）")
+    p.add_argument("--steps", required=True, help="JSON 数组，或 @文件路径")
+
+    p = sub.add_parser("pdf-merge", parents=[common], help="合并多个 PDF 为一个文件")
+    p.add_argument("--toc", action="store_true", help="添加目录页")
+    p.add_argument("--blank-page", action="store_true", help="文件之间插入空白页")
+
+    p = sub.add_parser("pdf-to-images", parents=[common], help="逐个把 PDF 渲染为图片（每个 PDF 一个 ZIP）")
+    p.add_argument("--format", choices=["png", "jpeg"], default="png")
+    p.add_argument("--dpi", type=int, default=150)
+
+    p = sub.add_parser("image-convert", parents=[common], help="逐个转换图片格式")
+    p.add_argument("--format", required=True, choices=sorted(ext.lstrip(".") for ext in main.FORMAT_MAP))
+    p.add_argument(
+        "--frames", choices=[f.value for f in main.ImageFrames], default=main.ImageFrames.FIRST.value,
+        help="多帧图片的处理方式：first 只转换第一帧，all 每帧一个文件（每张图片一个 ZIP），animated 保存为动画"
+    )
+
+    p = sub.add_parser("images-to-pdf", parents=[common], help="把多张图片按文件名顺序合成为一个 PDF")
+    p.add_argument("--page-size", choices=[s.value for s in main.PdfPageSize], default=main.PdfPageSize.IMAGE.value)
+    return parser
+
+
+def main_cli(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    command = args.command
+    extensions = {
+        "pdf-merge": PDF_EXTENSIONS, "pdf-to-images": PDF_EXTENSIONS,
+        "image-convert": IMAGE_EXTENSIONS, "images-to-pdf": IMAGE_EXTENSIONS,
+    }.get(command, TABLE_EXTENSIONS)
+    inputs = expand_inputs(args.inputs, extensions, args.recursive)
+    if not inputs:
+        print("没有找到可处理的输入文件。", file=sys.stderr)
+        return 2
+    output = os.path.abspath(args.output)
+    workers = max(1, args.workers)
+
+    try:
+        if command == "merge":
+            if not output.endswith((".xlsx", ".csv")):
+                print("合并输出文件的扩展名必须是 .xlsx 或 .csv。", file=sys.stderr)
+                return 2
+            return 1 if run_merge(inputs, output, {"mode": args.mode}, workers, args.force) else 0
+        if command == "pdf-merge":
+            if len(inputs) < 2:
+                print("至少需要两个 PDF 文件才能合并。", file=sys.stderr)
+                return 2
+            return 1 if run_pdf_merge(inputs, output, {"toc": args.toc, "blank_page": args.blank_page}, args.force) else 0
+        if command == "images-to-pdf":
+            if not output.lower().endswith(".pdf"):
+                print("输出文件的扩展名必须是 .pdf。", file=sys.stderr)
+                return 2
+            return 1 if run_images_to_pdf(inputs, output, {"page_size": args.page_size}, args.force) else 0
+
+        if command == "clean":
+            options = {"clean": {
+                "remove_empty_rows": not args.keep_empty_rows,
+                "remove_empty_cols": not args.keep_empty_cols,
+                "trim_spaces": args.trim_spaces,
+                "normalize_spaces": args.normalize_spaces,
+                "remove_invisible_chars": args.remove_invisible_chars,
+            }}
+        elif command == "dedup":
+            options = {
+                "column": args.column, "logic": args.logic, "value_column": args.value_column,
+                "match_mode": args.match_mode, "threshold": args.threshold,
+            }
+        elif command == "pipeline":
+            steps = args.steps
+            if steps.startswith("@"):
+                with open(steps[1:], "r", encoding="utf-8") as f:
+                    steps = f.read()
+            main.parse_pipeline_steps(steps)  # 提前校验，避免每个文件重复报错
+            options = {"steps": steps}
+        elif command == "pdf-to-images":
+            options = {"format": args.format, "dpi": args.dpi}
+        else:
+            options = {"format": "." + args.format, "frames": args.frames}
+            if args.frames == main.ImageFrames.ANIMATED.value and main.FORMAT_MAP[options["format"]] not in main.ANIMATED_OUTPUT_FORMATS:
+                print(f"{args.format} 格式不支持动画，请选择 gif、webp、png 或 tiff。", file=sys.stderr)
+                return 2
+        if command in ("clean", "dedup", "pipeline"):
+            options["output_format"] = args.output_format
+        failed = run_per_file(command, inputs, output, options, workers, args.force)
+        if failed:
+            print(f"{failed} 个文件处理失败，详见 {os.path.join(output, MANIFEST_NAME)}", file=sys.stderr)
+        return 1 if failed else 0
+    except Exception as e:
+        print(f"处理失败: {error_message(e)}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,76 @@
+# loadtest.py
+"""
+简单压测脚本：对运行中的后端并发发送表格处理请求，输出吞吐量和延迟分位数。
+用于比较不同工作进程数下的吞吐量扩展情况（需要安装 httpx）。
+
+用法:
+    python serve.py --workers 1 --port 8001 &
+    python loadtest.py --url http://127.0.0.1:8001 --concurrency 8 --duration 30
+"""
+import argparse
+import asyncio
+import io
+import random
+import statistics
+import time
+
+import httpx
+
+
+def build_csv(rows: int, seed: int) -> bytes:
+    """生成测试用 CSV；每个请求内容不同，避免命中结果缓存。"""
+    rng = random.Random(seed)
+    buffer = io.StringIO()
+    buffer.write("id,name,city,amount\n")
+    for i in range(rows):
+        buffer.write(f"{i}, 客户{rng.randint(0, rows)} ,{rng.choice(['北京', '上海', '广州'])},{rng.random() * 1000:.2f}\n")
+    return buffer.getvalue().encode("utf-8")
+
+
+async def worker(client: httpx.AsyncClient, endpoint: str, rows: int, deadline: float, latencies: list, errors: list):
+    while time.monotonic() < deadline:
+        content = build_csv(rows, random.getrandbits(32))
+        started = time.monotonic()
+        try:
+            response = await client.post(
+                endpoint,
+                files={"file": ("loadtest.csv", content, "text/csv")},
+                data={"trim_spaces": "true"},
+            )
+            if response.status_code == 200:
+                latencies.append(time.monotonic() - started)
+            else:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+
+
+async def run(args):
+    latencies, errors = [], []
+    deadline = time.monotonic() + args.duration
+    async with httpx.AsyncClient(base_url=args.url, timeout=120) as client:
+        await asyncio.gather(*[
+            worker(client, args.endpoint, args.rows, deadline, latencies, errors)
+            for _ in range(args.concurrency)
+        ])
+
+    print(f"请求数: {len(latencies)}  失败: {len(errors)} {sorted(set(map(str, errors)))}")
+    if latencies:
+        latencies.sort()
+        print(f"吞吐量: {len(latencies) / args.duration:.2f} req/s")
+        print(f"延迟 p50: {statistics.median(latencies) * 1000:.0f} ms  "
+              f"p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Excelab 后端压测")
+    parser.add_argument("--url", default="http://127.0.0.1:8001")
+    parser.add_argument("--endpoint", default="/api/clean/preview")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
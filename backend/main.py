@@ -1,42 +1,137 @@
 # main.py
-import pandas as pd
+from __future__ import annotations  # 类型注解不在定义时求值，pd.DataFrame 等注解不会触发延迟导入
+
+import time
+_IMPORT_STARTED = time.perf_counter()  # 模块导入计时起点（含 FastAPI 等依赖）
+
 import logging
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, status, Query, Request
-from fastapi.responses import StreamingResponse, JSONResponse # 添加 JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, Response, FileResponse # 添加 JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from io import BytesIO
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional, Tuple
 from enum import Enum
-from functools import reduce
-from PIL import Image
 import json
 import zipfile
 import tempfile
-import fitz  # PyMuPDF
 import os
 import sys
 import re
 import urllib.parse
 import sqlite3
-from datetime import datetime, timedelta
-
-# 初始化数据库
-def init_db():
-    conn = sqlite3.connect("heart.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS heart_clicks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ip TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-init_db()
+import hashlib
+import gzip
+import threading
+import contextlib
+import contextvars
+import cProfile
+import pstats
+import tracemalloc
+import hmac
+import asyncio
+import math
+import uuid
+import shutil
+import importlib
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from email.utils import formatdate, parsedate_to_datetime
+from collections import Counter, OrderedDict, deque
+import difflib
+from datetime import datetime, timedelta, date
+from starlette.datastructures import Headers, MutableHeaders
+
+# 可选依赖：orjson 提供更快的 JSON 编码，brotli 提供 br 压缩；未安装时自动回退
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+# 跨进程文件锁只在 POSIX 系统可用；Windows 下单进程运行，无需加锁
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# --- 延迟导入 ---
+# pandas、PyMuPDF、Pillow 等重型依赖按子系统延迟导入：只处理 PDF 的请求不必加载 pandas，
+# 工作进程重启时也无需等待全部依赖导入完成。可通过 EXCELAB_PRELOAD 在启动后于后台预加载。
+
+# 子系统 -> 依赖模块（按导入顺序）
+LAZY_SUBSYSTEMS = {
+    "table": ("numpy", "pandas", "openpyxl", "pyarrow"),
+    "pdf": ("fitz",),
+    "image": ("PIL.Image", "PIL.ImageOps", "PIL.ImageSequence"),
+}
+# 已导入的模块及各自耗时（毫秒）
+IMPORT_TIMINGS = {}
+
+def import_timed(name: str):
+    """导入模块并记录首次导入耗时；未安装的可选依赖（如 pyarrow）返回 None。"""
+    if name in IMPORT_TIMINGS:
+        return sys.modules.get(name)
+    started = time.perf_counter()
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        return None
+    IMPORT_TIMINGS.setdefault(name, round((time.perf_counter() - started) * 1000, 1))
+    return module
+
+class LazyModule:
+    """模块代理：首次访问属性时才导入真正的模块。"""
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            module = import_timed(self._name)
+            if module is None:
+                raise ImportError(f"缺少依赖模块 {self._name}")
+            self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "已加载" if self._module is not None else "未加载"
+        return f"<LazyModule {self._name} ({state})>"
+
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+fitz = LazyModule("fitz")  # PyMuPDF
+Image = LazyModule("PIL.Image")
+ImageOps = LazyModule("PIL.ImageOps")
+ImageSequence = LazyModule("PIL.ImageSequence")
+openpyxl = LazyModule("openpyxl")
+
+def preload_subsystems(names: Iterable[str]) -> None:
+    """按子系统预加载重型依赖，供启动后的后台线程调用。"""
+    for name in names:
+        modules = LAZY_SUBSYSTEMS.get(name)
+        if modules is None:
+            logger.warning(f"未知的预加载子系统: {name}")
+            continue
+        started = time.perf_counter()
+        for module_name in modules:
+            import_timed(module_name)
+        logger.info(f"已预加载 {name} 子系统，耗时 {(time.perf_counter() - started) * 1000:.0f} ms")
+
+def parse_preload_setting(value: str) -> List[str]:
+    """解析 EXCELAB_PRELOAD：逗号分隔的子系统名，或 all 表示全部。"""
+    names = [name.strip().lower() for name in (value or "").split(",") if name.strip()]
+    if "all" in names:
+        return list(LAZY_SUBSYSTEMS)
+    return names
 
 # --- 配置与模型定义 ---
 logging.basicConfig(level=logging.INFO)
@@ -55,6 +150,83 @@ FORMAT_MAP = {
     ".tif": "TIFF",
     ".webp": "WEBP"
 }
+# 可以保存多帧（动画或多页）的输出格式
+ANIMATED_OUTPUT_FORMATS = {"GIF", "WEBP", "PNG", "TIFF"}
+# EXIF 中的图像方向标签
+EXIF_ORIENTATION_TAG = 0x0112
+# 图片合成 PDF：每插入多少页增量保存一次并重新打开文档，内存占用与图片总数无关
+IMAGES_TO_PDF_FLUSH_PAGES = 50
+# 图片没有记录 DPI 时按此换算页面尺寸；A4 页面的边距（点）
+IMAGES_TO_PDF_DEFAULT_DPI = 96
+IMAGES_TO_PDF_A4_MARGIN = 20
+
+# 服务端持久化数据目录（增量合并结果等）
+DATA_DIR = os.environ.get("EXCELAB_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+# 点赞计数数据库，放在数据目录中（不再依赖启动时的工作目录），多个工作进程共享
+HEART_DB_PATH = os.environ.get("EXCELAB_HEART_DB", os.path.join(DATA_DIR, "heart.db"))
+# 增量合并：每个用户令牌一个子目录，保存已合并数据（Parquet）和输入文件清单
+INCREMENTAL_MERGE_DIR = os.path.join(DATA_DIR, "incremental_merge")
+# 分页预览：解析后的表格以 Parquet 缓存在此目录，按内容哈希命名
+TABLE_CACHE_DIR = os.path.join(DATA_DIR, "tables")
+# 内存中最多保留的已加载表格数和排序/筛选结果数
+TABLE_CACHE_MAX_FRAMES = 8
+TABLE_CACHE_MAX_VIEWS = 64
+# 表格缓存保留时间（秒，按最近使用时间计）和磁盘总大小上限（字节），与结果文件一起定期清理
+TABLE_CACHE_TTL_SECONDS = int(os.environ.get("EXCELAB_TABLE_CACHE_TTL_SECONDS", 24 * 3600))
+TABLE_CACHE_MAX_BYTES = int(os.environ.get("EXCELAB_TABLE_CACHE_MAX_BYTES", 1024 ** 3))
+# 单页最多返回的行数
+TABLE_PAGE_MAX_ROWS = 1000
+# 下载结果落盘目录：支持 Content-Length、ETag、断点续传和条件请求
+RESULT_STORE_DIR = os.path.join(DATA_DIR, "results")
+# 结果保留时间（秒），过期后在下次写入时清理
+RESULT_TTL_SECONDS = int(os.environ.get("EXCELAB_RESULT_TTL_SECONDS", 24 * 3600))
+# 可压缩的结果类型，落盘时额外保存一份 gzip 版本
+COMPRESSIBLE_MEDIA_TYPES = {"text/csv", "application/json", "text/plain"}
+# 结果缓存：相同输入和参数的请求直接返回已保存的结果，索引和命中计数保存在 SQLite 中
+RESULT_CACHE_DB = os.path.join(DATA_DIR, "result_cache.db")
+# 缓存结果总大小上限（字节），超出时按最近最少使用淘汰
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("EXCELAB_RESULT_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# 准入控制：每个进程同时处理的重型请求的内存预算、并发上限和排队限制
+ADMISSION_MEMORY_BUDGET = int(os.environ.get("EXCELAB_MEMORY_BUDGET_MB", 1024)) * 1024 ** 2
+ADMISSION_MAX_CONCURRENT = int(os.environ.get("EXCELAB_MAX_HEAVY_REQUESTS", 4))
+ADMISSION_MAX_QUEUE = int(os.environ.get("EXCELAB_MAX_QUEUED_REQUESTS", 16))
+# 排队超过此时间（秒）仍未获得预算则返回 429
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("EXCELAB_QUEUE_TIMEOUT_SECONDS", 30))
+# 重型端点（路径前缀）-> 上传大小到处理时内存占用的估算放大系数
+# 表格解析为 DataFrame 通常膨胀 5-10 倍；图片解码后远大于压缩文件
+HEAVY_ENDPOINT_COST_FACTORS = {
+    "/api/merge": 10,
+    "/api/split": 10,
+    "/api/clean": 10,
+    "/api/deduplicate": 10,
+    "/api/join": 10,
+    "/api/aggregate": 4,  # CSV 分块读取，内存与分组数相关
+    "/api/pipeline": 10,
+    "/api/table": 10,
+    "/api/pdf-to-images": 4,
+    "/api/pdfmerge": 4,
+    "/api/pdf": 2,  # 页面操作在磁盘文件上进行，只有压缩时重写图片占用较多内存
+    "/api/pdf-to-table": 2,  # 提取在子进程中进行，结果流式写入
+    "/api/image_convert": 20,
+    "/api/images-to-pdf": 2,  # 逐张插入并分批写盘，内存与图片数量无关
+}
+# 每个重型请求的基础开销，以及缺少 Content-Length 时的默认估算（字节）
+ADMISSION_BASE_COST = 16 * 1024 ** 2
+ADMISSION_DEFAULT_COST = 256 * 1024 ** 2
+# 管理员令牌（请求头 X-Admin-Token），用于按需性能剖析；未设置时剖析功能关闭
+ADMIN_TOKEN = os.environ.get("EXCELAB_ADMIN_TOKEN", "")
+# 性能剖析结果目录：每个被剖析的请求一个子目录（cProfile 统计、tracemalloc 快照和摘要）
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
+# 最多保留的剖析结果数，超出时删除最早的
+PROFILE_MAX_KEEP = int(os.environ.get("EXCELAB_PROFILE_MAX_KEEP", 50))
+# tracemalloc 记录的调用栈深度：1 层开销最小，需要按调用链分析快照时可调大
+PROFILE_TRACEMALLOC_FRAMES = int(os.environ.get("EXCELAB_PROFILE_TRACEMALLOC_FRAMES", 1))
+# 采样模式的采样间隔（秒）
+PROFILE_SAMPLE_INTERVAL = 0.005
+# 摘要中列出的热点函数、内存分配位置数
+PROFILE_TOP_ENTRIES = 30
+# 用户令牌只允许安全字符，避免路径穿越
+MERGE_TOKEN_PATTERN = re.compile(r"^[A-Za-z0-9_\-]{8,64}$")
 
 class MergeMode(str, Enum):
     OUTER = "outer"
@@ -64,18 +236,657 @@ class CleanOptions(BaseModel):
     remove_empty_rows: bool = True
     remove_empty_cols: bool = True
     trim_spaces: bool = False
+    normalize_spaces: bool = False       # 全角空格、不间断空格等统一为普通空格
+    remove_invisible_chars: bool = False # 去除零宽字符、BOM 等不可见字符
 
 class DeduplicateLogic(str, Enum):
     RANDOM = "random"
     MAX = "max"
     MIN = "min"
 
+class DeduplicateMatch(str, Enum):
+    EXACT = "exact"            # 原值完全相同
+    NORMALIZED = "normalized"  # 全角/半角、空白、大小写规范化后相同
+    FUZZY = "fuzzy"            # 规范化后相似度达到阈值
+
+class PreviewLayout(str, Enum):
+    RECORDS = "records"  # 每行一个对象 [{"列": 值}, ...]
+    COLUMNS = "columns"  # 每列一个数组 [[第1列的值...], ...]，宽表体积更小
+
+class JoinHow(str, Enum):
+    INNER = "inner"
+    LEFT = "left"
+    ANTI = "anti"  # 仅保留左表中未匹配到的行
+
+class ImageFrames(str, Enum):
+    FIRST = "first"        # 只转换第一帧
+    ALL = "all"            # 每一帧输出为单独的文件
+    ANIMATED = "animated"  # 全部帧保存为一个动画或多页文件（GIF、WebP、PNG、TIFF）
+
+class PdfPageSize(str, Enum):
+    IMAGE = "image"  # 页面与图片同尺寸（按图片的 DPI 换算）
+    A4 = "a4"        # A4 页面，横竖随图片方向，图片等比缩放居中
+
+class AggFunc(str, Enum):
+    SUM = "sum"
+    COUNT = "count"
+    MEAN = "mean"
+    MIN = "min"
+    MAX = "max"
+    NUNIQUE = "nunique"
+
+# --- JSON 响应与压缩 ---
+
+def _json_default(obj):
+    """标准库 json 回退路径下处理 NumPy 标量、时间等类型。"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (datetime, date, pd.Timestamp)):
+        return None if pd.isna(obj) else obj.isoformat()
+    return str(obj)
+
+class FastJSONResponse(JSONResponse):
+    """
+    使用 orjson 编码的 JSON 响应：原生支持 NumPy 标量/数组和 datetime，NaN 输出为 null。
+    未安装 orjson 时回退到标准库 json。
+    """
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(
+                content,
+                default=_json_default,
+                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            )
+        return json.dumps(
+            content, ensure_ascii=False, separators=(",", ":"), default=_json_default
+        ).encode("utf-8")
+
+class JSONCompressionMiddleware:
+    """
+    只压缩 JSON 响应：客户端支持时优先 br（需安装 brotli），否则 gzip。
+    Excel/ZIP/PDF 等本身已压缩的下载响应原样透传，不再浪费 CPU。
+    超过 offload_size 的响应体在线程池中压缩，不阻塞事件循环。
+    """
+    def __init__(self, app, minimum_size: int = 1024, offload_size: int = 256 * 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+
+    @staticmethod
+    def compress(body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=4)
+        return gzip.compress(body, compresslevel=6)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        if brotli is not None and "br" in accept_encoding:
+            encoding = "br"
+        elif "gzip" in accept_encoding:
+            encoding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        body_parts = []
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if headers.get("content-type", "").startswith("application/json") and "content-encoding" not in headers:
+                    start_message = message  # 先缓存，等拿到完整响应体再决定是否压缩
+                    return
+            elif message["type"] == "http.response.body" and start_message is not None:
+                body_parts.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                body = b"".join(body_parts)
+                headers = MutableHeaders(raw=start_message["headers"])
+                if len(body) >= self.minimum_size:
+                    if len(body) >= self.offload_size:
+                        body = await run_in_threadpool(self.compress, body, encoding)
+                    else:
+                        body = self.compress(body, encoding)
+                    headers["Content-Encoding"] = encoding
+                    headers.add_vary_header("Accept-Encoding")
+                headers["Content-Length"] = str(len(body))
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+# --- 准入控制 ---
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    按估算内存成本控制重型请求：预算和并发都有余量时立即放行，否则按先后顺序排队，
+    队列已满或等待超时则拒绝。单个超出总预算的请求只在没有其他重型请求时执行。
+    """
+    def __init__(self, memory_budget: int, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.memory_budget = memory_budget
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.used = 0
+        self.active = 0
+        self._waiters = deque()  # (cost, future)
+        self._avg_duration = 5.0  # 最近重型请求耗时的滑动平均（秒），用于估算 Retry-After
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def _fits(self, cost: int) -> bool:
+        if self.active >= self.max_concurrent:
+            return False
+        return self.active == 0 or self.used + cost <= self.memory_budget
+
+    def retry_after(self) -> int:
+        waves = (len(self._waiters) + self.active) / max(self.max_concurrent, 1)
+        return max(1, math.ceil(self._avg_duration * max(waves, 1)))
+
+    async def acquire(self, cost: int) -> None:
+        if not self._waiters and self._fits(cost):
+            self._grant(cost)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (cost, future)
+        self._waiters.append(waiter)
+        self.queued += 1
+        granted = False
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+            granted = True
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise AdmissionRejected(self.retry_after())
+        finally:
+            # 超时或请求被取消（如客户端断开）时离开队列；若此前已被放行，把名额交给下一个排队的请求
+            if not granted:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif future.done() and not future.cancelled():
+                    self._return(cost)
+
+    def _grant(self, cost: int) -> None:
+        self.used += cost
+        self.active += 1
+        self.admitted += 1
+
+    def release(self, cost: int, duration: float) -> None:
+        self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+        self._return(cost)
+
+    def _return(self, cost: int) -> None:
+        self.used -= cost
+        self.active -= 1
+        # 按顺序唤醒排在最前面且预算足够的请求
+        while self._waiters and self._fits(self._waiters[0][0]):
+            cost, future = self._waiters.popleft()
+            if not future.done():
+                self._grant(cost)
+                future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "memory_budget": self.memory_budget,
+            "memory_in_use": self.used,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+        }
+
+admission = AdmissionController(
+    ADMISSION_MEMORY_BUDGET, ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT
+)
+
+def estimate_request_cost(path: str, headers: Headers) -> Optional[int]:
+    """估算重型请求的内存成本，非重型请求返回 None（走轻量通道，不受准入限制）。"""
+    for prefix, factor in HEAVY_ENDPOINT_COST_FACTORS.items():
+        if path == prefix or path.startswith(prefix + "/"):
+            content_length = headers.get("content-length")
+            if content_length and content_length.isdigit():
+                return ADMISSION_BASE_COST + int(content_length) * factor
+            return ADMISSION_DEFAULT_COST
+    return None
+
+class AdmissionMiddleware:
+    """
+    重型端点的 POST 请求在读取请求体之前先申请预算；健康检查、列名、统计等轻量请求直接放行。
+    """
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        cost = estimate_request_cost(scope["path"], Headers(scope=scope))
+        if cost is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(cost)
+        except AdmissionRejected as e:
+            logger.warning(f"服务器繁忙，拒绝请求 {scope['path']}（估算 {cost // 1024 ** 2} MB）")
+            response = FastJSONResponse(
+                status_code=429,
+                content={"detail": "服务器繁忙，请稍后重试。"},
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(cost, time.monotonic() - started)
+
+# --- 按需性能剖析 ---
+# 管理员在请求上加 X-Profile 请求头（或 profile 查询参数）并携带 X-Admin-Token，
+# 该请求的解析、转换、序列化等阶段在剖析器下执行，同时用 tracemalloc 记录内存分配，
+# 结果保存在 PROFILE_DIR 中，响应头 X-Profile-Url 指向 /api/profiles/{profile_id}。
+# 标记的值为逗号分隔的选项：cprofile（精确调用统计，开销较大）或 sample（定时采样调用栈，开销小），
+# memory（tracemalloc，开销最大，可能使处理慢数倍）；1/true 表示 cprofile,memory。
+
+_current_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "excelab_profile", default=None
+)
+_profile_thread_state = threading.local()
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+def is_admin_token(value: Optional[str]) -> bool:
+    """校验管理员令牌；未配置 EXCELAB_ADMIN_TOKEN 时一律拒绝。"""
+    return bool(ADMIN_TOKEN) and bool(value) and hmac.compare_digest(value.encode(), ADMIN_TOKEN.encode())
+
+def require_admin(request: Request) -> None:
+    if not is_admin_token(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=403, detail="需要管理员令牌。")
+
+def _acquire_tracemalloc() -> None:
+    """tracemalloc 是进程级的：第一个剖析请求开始时启动，最后一个结束时停止（外部已启动的不停止）。"""
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+def _release_tracemalloc() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"  # 与 pstats 的函数名格式一致
+
+class RequestProfile:
+    """
+    一个被剖析请求的数据：各阶段的耗时、内存变化，以及 cProfile 统计或采样得到的调用栈。
+    同时剖析多个请求时 tracemalloc 的数据相互叠加，排查时应单独发送被剖析的请求。
+    """
+    def __init__(self, method: str, path: str, mode: Optional[str], trace_memory: bool):
+        self.profile_id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.mode = mode
+        self.trace_memory = trace_memory
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.stages = []
+        self._profilers = []
+        self._lock = threading.Lock()
+        # 采样模式：正在执行阶段的线程 -> 阶段名，以及按 "阶段;调用栈" 累计的采样时间（微秒）
+        self._sampled_threads = {}
+        self._samples = Counter()
+        self._sampler = None
+        self._stop_sampling = threading.Event()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        # 同一线程中嵌套的阶段只计时：cProfile 不能在一个线程上同时启用两个
+        nested = getattr(_profile_thread_state, "active", False)
+        profiler = cProfile.Profile() if self.mode == "cprofile" and not nested else None
+        memory_before = tracemalloc.get_traced_memory()[0]
+        if not nested:
+            _profile_thread_state.active = True
+            if self.trace_memory:
+                tracemalloc.reset_peak()
+            if self.mode == "sample":
+                self._start_sampling(name)
+        started = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            if not nested:
+                _profile_thread_state.active = False
+                with self._lock:
+                    self._sampled_threads.pop(threading.get_ident(), None)
+            record = {
+                "name": name,
+                "offset_ms": round((started - self._started) * 1000, 1),
+                "ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+            if self.trace_memory:
+                memory_after, memory_peak = tracemalloc.get_traced_memory()
+                record["memory_delta_bytes"] = memory_after - memory_before
+                if not nested:
+                    record["memory_peak_bytes"] = max(memory_peak - memory_before, 0)
+            with self._lock:
+                self.stages.append(record)
+                if profiler:
+                    self._profilers.append(profiler)
+
+    def _start_sampling(self, stage_name: str) -> None:
+        with self._lock:
+            self._sampled_threads[threading.get_ident()] = stage_name
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name="excelab-profile-sampler", daemon=True)
+                self._sampler.start()
+
+    def _sample_loop(self) -> None:
+        # 采样线程需要等待 GIL，实际间隔常大于设定值，每个样本按距上次采样的实际时间计权
+        last = time.perf_counter()
+        while not self._stop_sampling.wait(PROFILE_SAMPLE_INTERVAL):
+            now = time.perf_counter()
+            weight = round((now - last) * 1_000_000)
+            last = now
+            with self._lock:
+                targets = list(self._sampled_threads.items())
+            if not targets:
+                continue
+            frames = sys._current_frames()
+            for thread_id, stage_name in targets:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    self._samples[stage_name + ";" + ";".join(reversed(stack))] += weight
+
+    def _sampled_top_functions(self) -> List[dict]:
+        """由采样结果统计每个函数位于栈顶（自身耗时）和出现在栈中（累计耗时）的时间。"""
+        self_time, total_time = Counter(), Counter()
+        for stack, weight in self._samples.items():
+            functions = stack.split(";")[1:]
+            self_time[functions[-1]] += weight
+            for function in set(functions):
+                total_time[function] += weight
+        return [
+            {
+                "function": function,
+                "tottime_ms": round(self_time[function] / 1000, 1),
+                "cumtime_ms": round(weight / 1000, 1),
+            }
+            for function, weight in total_time.most_common(PROFILE_TOP_ENTRIES)
+        ]
+
+    def save(self, status_code: int, server_timing: Optional[str]) -> None:
+        """
+        写出剖析数据（cProfile 为 pstats 格式的 profile.prof，采样为火焰图工具可读的折叠栈 stacks.txt，
+        值为微秒）、tracemalloc 快照和摘要 JSON，并清理最早的剖析结果。
+        """
+        if self._sampler is not None:
+            self._stop_sampling.set()
+            self._sampler.join()
+        total_ms = round((time.perf_counter() - self._started) * 1000, 1)
+        profile_dir = os.path.join(PROFILE_DIR, self.profile_id)
+        os.makedirs(profile_dir, exist_ok=True)
+
+        top_functions = []
+        if self._profilers:
+            stats = pstats.Stats(self._profilers[0])
+            for profiler in self._profilers[1:]:
+                stats.add(profiler)
+            stats.dump_stats(os.path.join(profile_dir, "profile.prof"))
+            stats.sort_stats("cumulative")
+            for func in stats.fcn_list[:PROFILE_TOP_ENTRIES]:
+                primitive_calls, calls, total_time, cumulative_time, _ = stats.stats[func]
+                top_functions.append({
+                    "function": pstats.func_std_string(func),
+                    "calls": calls,
+                    "primitive_calls": primitive_calls,
+                    "tottime_ms": round(total_time * 1000, 2),
+                    "cumtime_ms": round(cumulative_time * 1000, 2),
+                })
+        elif self._samples:
+            with open(os.path.join(profile_dir, "stacks.txt"), "w", encoding="utf-8") as f:
+                for stack, count in self._samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            top_functions = self._sampled_top_functions()
+        top_allocations = []
+        if self.trace_memory:
+            # 快照中是请求结束时仍未释放的内存（含本请求缓存的数据），峰值见各阶段的 memory_peak_bytes
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            snapshot.dump(os.path.join(profile_dir, "allocations.tracemalloc"))
+            top_allocations = [
+                {"location": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:PROFILE_TOP_ENTRIES]
+            ]
+
+        summary = {
+            "profile_id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "mode": self.mode,
+            "trace_memory": self.trace_memory,
+            "status": status_code,
+            "started_at": self.started_at,
+            "total_ms": total_ms,
+            "server_timing": server_timing,
+            "stages": sorted(self.stages, key=lambda stage: stage["offset_ms"]),
+            "memory_peak_bytes": (
+                max((stage.get("memory_peak_bytes", 0) for stage in self.stages), default=0) if self.trace_memory else None
+            ),
+            "top_functions": top_functions,
+            "top_allocations": top_allocations,
+            "files": [name for name in PROFILE_FILES if os.path.exists(os.path.join(profile_dir, name))],
+        }
+        tmp_path = os.path.join(profile_dir, "summary.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(profile_dir, "summary.json"))
+        cleanup_old_profiles()
+
+# 可下载的剖析原始数据文件
+PROFILE_FILES = ("profile.prof", "stacks.txt", "allocations.tracemalloc")
+
+def cleanup_old_profiles() -> None:
+    """只保留最近 PROFILE_MAX_KEEP 个剖析结果。"""
+    try:
+        entries = [entry for entry in os.scandir(PROFILE_DIR) if entry.is_dir()]
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in entries[PROFILE_MAX_KEEP:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+def profile_stage(name: str):
+    """
+    标记请求处理的一个阶段（parse/transform/serialize/render 等）；
+    当前请求未开启剖析时不做任何事，批处理命令行等非请求场景同样可以调用。
+    """
+    profile = _current_profile.get()
+    return profile.stage(name) if profile else contextlib.nullcontext()
+
+def _run_profiled(name: str, func, *args, **kwargs):
+    with profile_stage(name):
+        return func(*args, **kwargs)
+
+async def run_stage(name: str, func, *args, **kwargs):
+    """在线程池中执行一个处理阶段（线程池继承请求的上下文，剖析状态随之传递）。"""
+    return await run_in_threadpool(_run_profiled, name, func, *args, **kwargs)
+
+def requested_profile_options(scope) -> Optional[Tuple[Optional[str], bool]]:
+    """解析剖析标记，返回 (CPU 剖析方式, 是否跟踪内存)；未要求剖析时返回 None。"""
+    value = Headers(scope=scope).get("x-profile")
+    if value is None:
+        query = urllib.parse.parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        value = query.get("profile", [""])[-1]
+    options = {item.strip().lower() for item in value.split(",") if item.strip()}
+    if options & {"1", "true"}:
+        options |= {"cprofile", "memory"}
+    mode = "sample" if "sample" in options else "cprofile" if "cprofile" in options else None
+    trace_memory = "memory" in options
+    if mode is None and not trace_memory:
+        return None
+    return mode, trace_memory
+
+class ProfilingMiddleware:
+    """
+    按需剖析单个请求：未带剖析标记的请求直接放行，带标记但管理员令牌无效的请求返回 403。
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        options = requested_profile_options(scope) if scope["type"] == "http" else None
+        if options is None:
+            await self.app(scope, receive, send)
+            return
+        if not is_admin_token(Headers(scope=scope).get("x-admin-token")):
+            response = FastJSONResponse(status_code=403, content={"detail": "性能剖析需要管理员令牌。"})
+            await response(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], *options)
+        response_info = {"status": 500, "server_timing": None}
+
+        async def send_with_profile_headers(message):
+            if message["type"] == "http.response.start":
+                response_info["status"] = message["status"]
+                headers = MutableHeaders(scope=message)
+                response_info["server_timing"] = headers.get("server-timing")
+                headers["X-Profile-Id"] = profile.profile_id
+                headers["X-Profile-Url"] = f"/api/profiles/{profile.profile_id}"
+            await send(message)
+
+        if profile.trace_memory:
+            _acquire_tracemalloc()
+        context_token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_headers)
+        finally:
+            _current_profile.reset(context_token)
+            try:
+                await run_in_threadpool(profile.save, response_info["status"], response_info["server_timing"])
+                logger.info(f"已保存请求 {profile.method} {profile.path} 的性能剖析 {profile.profile_id}")
+            except Exception as e:
+                logger.error(f"保存性能剖析时出错: {e}", exc_info=True)
+            finally:
+                if profile.trace_memory:
+                    _release_tracemalloc()
+
+# --- 共享状态 ---
+
+def connect_db(path: str) -> sqlite3.Connection:
+    """
+    打开 SQLite 连接：WAL 模式允许多个工作进程同时读写，
+    写冲突时最多等待 30 秒而不是立即报 database is locked。
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+@contextlib.contextmanager
+def interprocess_lock(lock_path: str):
+    """跨进程文件锁，保护多个工作进程对同一份磁盘数据的读-改-写。"""
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# 初始化数据库
+def init_db():
+    # 兼容旧版本：之前 heart.db 创建在启动时的工作目录中
+    legacy_path = os.path.abspath("heart.db")
+    if not os.path.exists(HEART_DB_PATH) and os.path.exists(legacy_path) and legacy_path != os.path.abspath(HEART_DB_PATH):
+        os.makedirs(os.path.dirname(HEART_DB_PATH), exist_ok=True)
+        shutil.copy2(legacy_path, HEART_DB_PATH)
+        logger.info(f"已将 {legacy_path} 迁移到 {HEART_DB_PATH}")
+    conn = connect_db(HEART_DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS heart_clicks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ip TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+    conn.close()
+
+# 启动后在后台预加载的子系统（table/pdf/image/all），默认不预加载
+PRELOAD_SUBSYSTEMS = parse_preload_setting(os.environ.get("EXCELAB_PRELOAD", ""))
+# 启动耗时统计，由 /api/startup/stats 返回
+STARTUP_STATS = {}
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用启动钩子：初始化数据库，并按配置在后台线程中预加载重型依赖，不阻塞服务就绪。"""
+    STARTUP_STATS["import_ms"] = round((_MODULE_IMPORTED - _IMPORT_STARTED) * 1000, 1)
+    init_db()
+    if PRELOAD_SUBSYSTEMS:
+        threading.Thread(
+            target=preload_subsystems, args=(PRELOAD_SUBSYSTEMS,), name="excelab-preload", daemon=True
+        ).start()
+    STARTUP_STATS["ready_ms"] = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+    logger.info(f"服务就绪：模块导入 {STARTUP_STATS['import_ms']} ms，启动完成 {STARTUP_STATS['ready_ms']} ms")
+    yield
+    shutdown_pdf_process_pool()
+
 # --- FastAPI 应用实例 ---
 app = FastAPI(
     title="Excelab Pro - Backend",
     description="为表格处理工具提供核心API服务。",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
 )
 
+# 剖析在准入控制之内，只记录请求实际执行的部分，不含排队时间
+app.add_middleware(ProfilingMiddleware)
+# 准入控制放在 CORS 之内，429 响应同样带有跨域头
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
 # --- 配置CORS (跨域资源共享) ---
 app.add_middleware(
     CORSMiddleware,
@@ -83,7 +894,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 允许前端读取下载文件名和结果地址（断点续传时使用）
+    expose_headers=["Content-Disposition", "X-Result-Id", "X-Result-Url", "X-Cache", "Server-Timing", "X-Profile-Id", "X-Profile-Url"],
 )
+app.add_middleware(JSONCompressionMiddleware)
 
 # --- 辅助函数 ---
 
@@ -100,56 +914,79 @@ def sanitize_filename(filename: str, replacement: str = "_") -> str:
         filename = "file"
     return filename
 
+def parse_table_bytes(raw: bytes, filename: str) -> List[pd.DataFrame]:
+    """将单个表格文件的字节内容解析为 DataFrame 列表（Excel 每个非空 sheet 一个）。"""
+    content = BytesIO(raw)
+    display_name = filename
+    filename = sanitize_filename(filename).lower()
+    dataframes = []
+    try:
+        if filename.endswith((".xlsx", ".xls")):
+            excel_file = pd.ExcelFile(content, engine='openpyxl')
+            for sheet_name in excel_file.sheet_names:
+                df = excel_file.parse(sheet_name)
+                if not df.empty:
+                    dataframes.append(df)
+        elif filename.endswith(".csv"):
+            try:
+                df = pd.read_csv(content)
+            except UnicodeDecodeError:
+                content.seek(0)
+                df = pd.read_csv(content, encoding='gbk')
+            if not df.empty:
+                dataframes.append(df)
+    except Exception as e:
+        logger.error(f"读取文件 {display_name} 时出错: {e}",exc_info=True)
+        raise HTTPException(status_code=400, detail=f"无法解析文件 {display_name}: {str(e)}")
+    return dataframes
+
 async def process_uploaded_files(files: List[UploadFile]) -> List[pd.DataFrame]:
     """读取并解析上传的文件为 pandas DataFrame 列表。"""
     dataframes = []
     for file in files:
-
-        # 文件名清理，防止非法字符
-        clean_filename = sanitize_filename(file.filename)
-
-        content = BytesIO(await file.read())
-        filename = clean_filename.lower()
-        df = None
-        try:
-            if filename.endswith((".xlsx", ".xls")):
-                excel_file = pd.ExcelFile(content, engine='openpyxl')
-                for sheet_name in excel_file.sheet_names:
-                    df = excel_file.parse(sheet_name)
-                    if not df.empty:
-                        dataframes.append(df)
-            elif filename.endswith(".csv"):
-                try:
-                    df = pd.read_csv(content)
-                except UnicodeDecodeError:
-                    content.seek(0)
-                    df = pd.read_csv(content, encoding='gbk')
-                if not df.empty:
-                    dataframes.append(df)
-        except Exception as e:
-            logger.error(f"读取文件 {file.filename} 时出错: {e}",exc_info=True)
-            raise HTTPException(status_code=400, detail=f"无法解析文件 {file.filename}: {str(e)}")
+        dataframes.extend(await run_stage("parse", parse_table_bytes, await file.read(), file.filename))
     if not dataframes:
         raise HTTPException(status_code=400, detail="上传的文件均无法解析或内容为空。")
     return dataframes
 
-def merge_dataframes(dataframes: List[pd.DataFrame], mode: MergeMode) -> pd.DataFrame:
-    """根据指定模式合并 DataFrame 列表。"""
+async def read_single_table(file: UploadFile) -> pd.DataFrame:
+    """读取单个上传文件的第一个非空表格，失败时抛出 400。"""
+    dataframes = await run_stage("parse", parse_table_bytes, await file.read(), file.filename)
+    if not dataframes:
+        raise HTTPException(status_code=400, detail=f"文件 {file.filename} 为空或无法解析。")
+    return dataframes[0]
+
+def parse_column_list(value: Optional[str]) -> List[str]:
+    """解析列名列表参数：支持 JSON 数组（列名含逗号时使用）或逗号分隔字符串。"""
+    if not value or not value.strip():
+        return []
+    value = value.strip()
+    if value.startswith("["):
+        try:
+            return [str(col) for col in json.loads(value)]
+        except json.JSONDecodeError as e:
+            raise ValueError(f"列名列表格式无效: {e}")
+    return [col.strip() for col in value.split(",") if col.strip()]
+
+def concat_dataframes(dataframes: List[pd.DataFrame], mode: MergeMode) -> pd.DataFrame:
+    """
+    按指定模式拼接 DataFrame 列表，保留原始数据类型（空值仍为 NaN），
+    供流水线等还要继续处理数据的场景使用。
+    """
+    if not dataframes:
+        raise ValueError("没有数据帧可供合并。")
     if mode == MergeMode.OUTER:
-        merged_df = pd.concat(dataframes, ignore_index=True, sort=False) # sort=False to avoid FutureWarning
-    else: # INNER
-        if not dataframes:
-             raise ValueError("没有数据帧可供合并。")
-        common_columns = list(reduce(lambda x, y: x.intersection(y), [set(df.columns) for df in dataframes]))
-        if not common_columns:
-            raise ValueError("所选文件之间没有任何共同的字段。")
-        # 只保留共同列并合并
-        filtered_dfs = [df[common_columns] for df in dataframes]
-        merged_df = pd.concat(filtered_dfs, ignore_index=True)
-
-    # 处理数据类型以便JSON序列化
-    merged_df = prepare_dataframe_for_json_serialization(merged_df)
-    return merged_df
+        return pd.concat(dataframes, ignore_index=True, sort=False) # sort=False to avoid FutureWarning
+    # INNER：只保留共同列（按第一个表的列顺序）并合并
+    common_columns = [col for col in dataframes[0].columns
+                      if all(col in df.columns for df in dataframes[1:])]
+    if not common_columns:
+        raise ValueError("所选文件之间没有任何共同的字段。")
+    return pd.concat([df[common_columns] for df in dataframes], ignore_index=True)
+
+def merge_dataframes(dataframes: List[pd.DataFrame], mode: MergeMode) -> pd.DataFrame:
+    """根据指定模式合并 DataFrame 列表，并处理数据类型以便输出。"""
+    return prepare_dataframe_for_json_serialization(concat_dataframes(dataframes, mode))
 
 def prepare_dataframe_for_json_serialization(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -173,6 +1010,13 @@ def prepare_dataframe_for_json_serialization(df: pd.DataFrame) -> pd.DataFrame:
     
     return df_copy
 
+def dataframe_to_preview_data(df: pd.DataFrame, layout: PreviewLayout = PreviewLayout.RECORDS):
+    """将预览用的 DataFrame 转为 JSON 数据：按行的对象列表，或按列的数组列表。"""
+    processed = prepare_dataframe_for_json_serialization(df)
+    if layout == PreviewLayout.COLUMNS:
+        return [processed.iloc[:, i].tolist() for i in range(processed.shape[1])]
+    return processed.to_dict(orient='records')
+
 def convert_datetime_smart(dt):
     """
     智能转换单个datetime对象，保持原有格式习惯
@@ -210,6 +1054,12 @@ def convert_datetime_smart(dt):
 def dataframe_to_excel_bytes(df: pd.DataFrame) -> BytesIO:
     """将 DataFrame 转换为 Excel 字节流。"""
     output = BytesIO()
+    write_dataframe_excel(df, output)
+    output.seek(0)
+    return output
+
+def write_dataframe_excel(df: pd.DataFrame, output) -> None:
+    """将 DataFrame 写为 Excel（output 为文件路径或字节流），超过 100 万行时拆分到多个 sheet。"""
     max_rows_per_sheet = 1_000_000
 
     if len(df) <= max_rows_per_sheet:
@@ -226,31 +1076,284 @@ def dataframe_to_excel_bytes(df: pd.DataFrame) -> BytesIO:
                 df.iloc[start_idx:end_idx].to_excel(
                     writer, index=False, sheet_name=sheet_name
                 )
-    output.seek(0)
-    return output
 
-def clean_dataframe(df: pd.DataFrame, options: CleanOptions) -> pd.DataFrame:
-    """根据选项清理 DataFrame。"""
-    cleaned_df = df.copy()
-    
+# 不可见字符：零宽空格/连接符、方向标记、BOM、软连字符
+INVISIBLE_CHARS_PATTERN = "[\u200b-\u200f\u2060\ufeff\u00ad]"
+# 需要统一为普通空格的特殊空白：全角空格、不间断空格、各种宽度的排版空格
+SPECIAL_SPACES_PATTERN = "[\u3000\u00a0\u2002-\u200a\u202f]"
+
+def _is_text_column(series: pd.Series) -> bool:
+    return series.dtype == object or isinstance(series.dtype, pd.StringDtype)
+
+def clean_dataframe_with_stats(df: pd.DataFrame, options: CleanOptions):
+    """
+    按选项清理 DataFrame，并在同一次遍历中收集每列的统计信息。
+    只含空白的字符串视为空值参与空行/空列判断。
+
+    Returns:
+        (清理后的DataFrame, 每列统计信息列表)
+    """
+    cleaned_columns = []
+    empty_masks = []
+    column_stats = []
+
+    for position in range(df.shape[1]):
+        series = df.iloc[:, position]
+        null_mask = series.isna()
+        stats = {
+            "column": str(df.columns[position]),
+            "dtype": str(series.dtype),
+            "null_cells": int(null_mask.sum()),
+            "blank_cells": 0,
+            "trimmed_cells": 0,
+            "invisible_cells": 0,
+            "type_mismatch_cells": 0,
+        }
+        empty_mask = null_mask
+
+        if _is_text_column(series):
+            # 只处理字符串单元格，数字、布尔、时间等其他类型保持原样
+            # （object 列可能全是非字符串，不能直接使用 .str 访问器）
+            if isinstance(series.dtype, pd.StringDtype):
+                str_mask = series.notna()
+            else:
+                str_mask = series.map(lambda v: isinstance(v, str)).astype(bool)
+            text = series[str_mask].astype(str)
+            new_text = text
+            if options.remove_invisible_chars:
+                new_text = new_text.str.replace(INVISIBLE_CHARS_PATTERN, "", regex=True)
+                stats["invisible_cells"] = int((new_text.str.len() != text.str.len()).sum())
+            if options.normalize_spaces:
+                new_text = new_text.str.replace(SPECIAL_SPACES_PATTERN, " ", regex=True)
+            stripped = new_text.str.strip()
+            blank = stripped == ""
+            stats["blank_cells"] = int(blank.sum())
+            if options.trim_spaces:
+                stats["trimmed_cells"] = int(((stripped != new_text) & ~blank).sum())
+                new_text = stripped.mask(blank)
+
+            if new_text is not text:
+                series = series.copy()
+                series[str_mask] = new_text
+            empty_mask = null_mask.copy()
+            empty_mask[str_mask] = blank
+
+            # 与列中最常见类型不一致的非空单元格数（如数字列中混入文本），字符串类型列无需检查
+            if df.iloc[:, position].dtype == object:
+                type_counts = df.iloc[:, position][~null_mask].map(type).value_counts()
+                if len(type_counts) > 1:
+                    stats["type_mismatch_cells"] = int(type_counts.sum() - type_counts.iloc[0])
+
+        cleaned_columns.append(series)
+        empty_masks.append(empty_mask)
+        column_stats.append(stats)
+
+    cleaned_df = pd.concat(cleaned_columns, axis=1) if cleaned_columns else df.copy()
+    empty = pd.concat(empty_masks, axis=1) if empty_masks else pd.DataFrame(index=df.index)
+
+    row_keep = ~empty.all(axis=1).values if options.remove_empty_rows else np.ones(len(df), dtype=bool)
+    col_keep = ~empty[row_keep].all(axis=0).values if options.remove_empty_cols else np.ones(df.shape[1], dtype=bool)
+    for stats, keep in zip(column_stats, col_keep):
+        stats["removed"] = not keep
+
+    cleaned_df = cleaned_df.iloc[row_keep, col_keep]
     if options.remove_empty_rows:
-        # 删除所有列都为空的行
-        cleaned_df.dropna(how='all', inplace=True)
         # 重置索引
-        cleaned_df.reset_index(drop=True, inplace=True)
+        cleaned_df = cleaned_df.reset_index(drop=True)
+    return cleaned_df, column_stats
+
+def clean_dataframe(df: pd.DataFrame, options: CleanOptions) -> pd.DataFrame:
+    """根据选项清理 DataFrame。"""
+    cleaned_df, _ = clean_dataframe_with_stats(df, options)
+    return cleaned_df
+
+# 模糊去重时在每个分块内与后续多少个排序相邻的值比较（排序邻域窗口）
+FUZZY_DEDUP_WINDOW = 20
+# 分块键长度：按前缀、后缀各分一次块，分别覆盖后半段和前半段的差异
+FUZZY_DEDUP_BLOCK_KEY_LENGTH = 3
+# 使用 rapidfuzz 时：不超过此大小的分块做全量矩阵比较，更大的分块按排序后的窗口分段比较
+FUZZY_DEDUP_FULL_BLOCK_SIZE = 256
+FUZZY_DEDUP_CHUNK_SIZE = 128
+FUZZY_DEDUP_CHUNK_WINDOW = 64
+# 去重时临时保存簇编号的列名
+DEDUP_CLUSTER_COLUMN = "__dedup_cluster__"
+
+def normalize_text_series(series: pd.Series) -> pd.Series:
+    """
+    向量化的文本规范化：Unicode NFKC（全角转半角）、空白折叠、去首尾空白、忽略大小写。
+    只含空白的值规范化为空字符串，与精确匹配一样作为单独的一组；空值保持为空值。
+    """
+    normalized = series.astype(str).where(series.notna())
+    return (
+        normalized.str.normalize("NFKC")
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .str.casefold()
+    )
 
-    if options.remove_empty_cols:
-        # 删除所有行都为空的列
-        cleaned_df.dropna(axis=1, how='all', inplace=True)
+def _union_pairs(parent: np.ndarray, left, right) -> None:
+    """把匹配的值对合并到同一簇（并查集，簇根取最小编号）。"""
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
 
-    if options.trim_spaces:
-        # 只对字符串列进行 strip 操作
-        string_columns = cleaned_df.select_dtypes(include=['object']).columns
-        cleaned_df[string_columns] = cleaned_df[string_columns].apply(lambda x: x.str.strip() if x.dtype == "object" else x)
+    for i, j in zip(left, right):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
 
-    return cleaned_df
+def _fuzzy_cluster_values(values: List[str], threshold: float) -> np.ndarray:
+    """
+    对去重后的规范化值做模糊聚类，返回每个值所属簇的编号。
+    安装了 rapidfuzz 时按块向量化比较，否则回退到 difflib 逐对比较。
+    """
+    process = import_timed("rapidfuzz.process")
+    if process is None:
+        parent = _fuzzy_cluster_difflib(values, threshold)
+    else:
+        parent = _fuzzy_cluster_rapidfuzz(values, threshold, process)
+    # 路径压缩到最终的簇根
+    for i in range(len(parent)):
+        parent[i] = parent[parent[i]]
+    return parent
+
+def _fuzzy_cluster_rapidfuzz(values: List[str], threshold: float, process) -> np.ndarray:
+    """
+    分块键为前缀（再按后缀各一遍）加长度分桶：相似度达到阈值的两个值长度比不低于 t/(2-t)，
+    按此比例几何分桶后只可能落在同一桶或相邻桶，块内和相邻桶之间用 rapidfuzz.process.cdist 批量计算相似度。
+    """
+    fuzz = import_timed("rapidfuzz.fuzz")
+    n = len(values)
+    parent = np.arange(n)
+    if n < 2:
+        return parent
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=n)
+    min_length_ratio = threshold / (2 - threshold)
+    if min_length_ratio < 1:
+        buckets = np.floor(np.log(np.maximum(lengths, 1)) / -np.log(min_length_ratio)).astype(np.int64)
+    else:
+        buckets = lengths
+    cutoff = threshold * 100
+    k = FUZZY_DEDUP_BLOCK_KEY_LENGTH
+    value_array = np.array(values, dtype=object)
+
+    def compare(members: np.ndarray):
+        """比较一组候选值，返回相似度达到阈值的值对。"""
+        if len(members) <= FUZZY_DEDUP_FULL_BLOCK_SIZE:
+            block = value_array[members].tolist()
+            scores = process.cdist(block, block, scorer=fuzz.ratio, score_cutoff=cutoff, dtype=np.uint8, workers=-1)
+            rows, cols = np.nonzero(np.triu(scores, 1))
+            return members[rows], members[cols]
+        # 大块按值排序，每段只与其后 FUZZY_DEDUP_CHUNK_WINDOW 个值比较
+        members = members[np.argsort(value_array[members])]
+        lefts, rights = [], []
+        for start in range(0, len(members), FUZZY_DEDUP_CHUNK_SIZE):
+            row_members = members[start:start + FUZZY_DEDUP_CHUNK_SIZE]
+            col_members = members[start:start + FUZZY_DEDUP_CHUNK_SIZE + FUZZY_DEDUP_CHUNK_WINDOW]
+            scores = process.cdist(
+                value_array[row_members].tolist(), value_array[col_members].tolist(),
+                scorer=fuzz.ratio, score_cutoff=cutoff, dtype=np.uint8, workers=-1
+            )
+            rows, cols = np.nonzero(np.triu(scores, 1))
+            lefts.append(row_members[rows])
+            rights.append(col_members[cols])
+        return np.concatenate(lefts), np.concatenate(rights)
+
+    for block_key in (lambda v: v[:k], lambda v: v[-k:]):
+        groups = pd.DataFrame({"key": [block_key(v) for v in values], "bucket": buckets}).groupby(["key", "bucket"]).indices
+        for (key, bucket), members in groups.items():
+            neighbors = groups.get((key, bucket + 1))
+            if neighbors is not None:
+                members = np.concatenate([members, neighbors])
+            if len(members) < 2:
+                continue
+            left, right = compare(members)
+            if len(left):
+                _union_pairs(parent, left, right)
+    return parent
+
+def _fuzzy_cluster_difflib(values: List[str], threshold: float) -> np.ndarray:
+    """
+    未安装 rapidfuzz 时的回退实现：前缀/后缀分块加排序邻域窗口，用 difflib 逐对比较。
+    """
+    parent = np.arange(len(values))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    lengths = np.array([len(v) for v in values])
+    k = FUZZY_DEDUP_BLOCK_KEY_LENGTH
+    for block_key, sort_key in ((lambda v: v[:k], lambda v: v), (lambda v: v[-k:], lambda v: v[::-1])):
+        blocks = {}
+        for i, value in enumerate(values):
+            blocks.setdefault(block_key(value), []).append(i)
+        for members in blocks.values():
+            if len(members) < 2:
+                continue
+            members.sort(key=lambda i: sort_key(values[i]))
+            for pos, i in enumerate(members):
+                # SequenceMatcher 缓存 seq2 的分析结果，固定值放在 seq2
+                matcher = difflib.SequenceMatcher(None, b=values[i], autojunk=False)
+                for j in members[pos + 1:pos + 1 + FUZZY_DEDUP_WINDOW]:
+                    # 长度差过大时相似度上限已低于阈值，直接跳过
+                    if 2 * min(lengths[i], lengths[j]) < threshold * (lengths[i] + lengths[j]):
+                        continue
+                    root_i, root_j = find(i), find(j)
+                    if root_i == root_j:
+                        continue
+                    matcher.set_seq1(values[j])
+                    if matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold:
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    return parent
+
+def build_dedup_clusters(series: pd.Series, match_mode: DeduplicateMatch, similarity_threshold: float = 0.9) -> pd.Series:
+    """
+    为去重列的每一行计算簇编号，同一簇视为重复；空值的簇编号为 NaN。
+    """
+    if not 0 < similarity_threshold <= 1:
+        raise ValueError("相似度阈值必须在 0 到 1 之间")
+    if match_mode == DeduplicateMatch.EXACT:
+        codes, _ = pd.factorize(series)
+    else:
+        normalized = normalize_text_series(series)
+        codes, uniques = pd.factorize(normalized)
+        if match_mode == DeduplicateMatch.FUZZY and similarity_threshold < 1:
+            # 只对唯一值做模糊比较，再映射回每一行
+            value_roots = _fuzzy_cluster_values(list(uniques), similarity_threshold)
+            codes = np.where(codes >= 0, value_roots[np.maximum(codes, 0)], -1)
+    return pd.Series(codes, index=series.index).where(codes >= 0)
+
+def summarize_dedup_clusters(df: pd.DataFrame, deduplicate_column: str, clusters: pd.Series, top_n: int = 10) -> dict:
+    """统计重复簇的规模分布，并列出最大的若干簇及其包含的不同写法。"""
+    sizes = clusters.value_counts()
+    duplicate_sizes = sizes[sizes > 1]
+    largest = []
+    for cluster_id, size in duplicate_sizes.head(top_n).items():
+        variants = df.loc[clusters == cluster_id, deduplicate_column].drop_duplicates().head(5)
+        largest.append({"size": int(size), "variants": [str(v) for v in variants]})
+    return {
+        "cluster_count": len(sizes),
+        "duplicate_clusters": len(duplicate_sizes),
+        "duplicate_rows": int(duplicate_sizes.sum() - len(duplicate_sizes)),
+        "size_distribution": {str(size): int(count) for size, count in duplicate_sizes.value_counts().sort_index().items()},
+        "largest_clusters": largest
+    }
 
-def deduplicate_dataframe(df: pd.DataFrame, deduplicate_column: str, logic: DeduplicateLogic, value_column: Optional[str] = None) -> pd.DataFrame:
+def deduplicate_dataframe(
+    df: pd.DataFrame,
+    deduplicate_column: str,
+    logic: DeduplicateLogic,
+    value_column: Optional[str] = None,
+    match_mode: DeduplicateMatch = DeduplicateMatch.EXACT,
+    similarity_threshold: float = 0.9,
+    clusters: Optional[pd.Series] = None
+) -> pd.DataFrame:
     """
     根据指定列和逻辑对DataFrame进行去重
     
@@ -259,6 +1362,9 @@ def deduplicate_dataframe(df: pd.DataFrame, deduplicate_column: str, logic: Dedu
         deduplicate_column: 去重依据列
         logic: 去重逻辑 (random, max, min)
         value_column: 比较值列 (用于max/min逻辑)
+        match_mode: 重复判定方式 (exact, normalized, fuzzy)
+        similarity_threshold: fuzzy 模式的相似度阈值 (0-1)
+        clusters: 已计算好的簇编号（预览时复用，避免重复计算）
     
     Returns:
         去重后的DataFrame
@@ -271,46 +1377,696 @@ def deduplicate_dataframe(df: pd.DataFrame, deduplicate_column: str, logic: Dedu
     
     if value_column and value_column not in df.columns:
         raise ValueError(f"比较值列 '{value_column}' 在数据中不存在")
+
+    # 非精确匹配时按簇编号分组
+    if match_mode == DeduplicateMatch.EXACT and clusters is None:
+        work_df = df
+        key_column = deduplicate_column
+    else:
+        if clusters is None:
+            clusters = build_dedup_clusters(df[deduplicate_column], match_mode, similarity_threshold)
+        work_df = df.assign(**{DEDUP_CLUSTER_COLUMN: clusters.values})
+        key_column = DEDUP_CLUSTER_COLUMN
     
     # 根据去重逻辑进行分组处理
     if logic == DeduplicateLogic.RANDOM:
-        # 随机保留重复项中的一行
-        deduplicated_df = df.groupby(deduplicate_column, as_index=False).apply(
-            lambda x: x.sample(1) if len(x) > 1 else x
-        ).reset_index(drop=True)
+        # 随机保留重复项中的一行：打乱后保留每组第一行，再按原始顺序排列
+        keyed_df = work_df[work_df[key_column].notna()]
+        deduplicated_df = keyed_df.sample(frac=1).drop_duplicates(subset=key_column).sort_index()
         
     elif logic == DeduplicateLogic.MAX:
         # 保留比较值最大的行
-        deduplicated_df = df.loc[df.groupby(deduplicate_column)[value_column].idxmax()]
+        deduplicated_df = work_df.loc[work_df.groupby(key_column)[value_column].idxmax()]
         
     elif logic == DeduplicateLogic.MIN:
         # 保留比较值最小的行
-        deduplicated_df = df.loc[df.groupby(deduplicate_column)[value_column].idxmin()]
+        deduplicated_df = work_df.loc[work_df.groupby(key_column)[value_column].idxmin()]
         
     else:
         raise ValueError(f"不支持的去重逻辑: {logic}")
     
+    if key_column == DEDUP_CLUSTER_COLUMN:
+        deduplicated_df = deduplicated_df.drop(columns=DEDUP_CLUSTER_COLUMN)
     # 重置索引
     deduplicated_df.reset_index(drop=True, inplace=True)
     return deduplicated_df
 
+# 分块聚合时每块读取的 CSV 行数
+AGGREGATE_CSV_CHUNK_ROWS = 200_000
+
+def iter_upload_table_chunks(file: UploadFile, chunk_rows: int = AGGREGATE_CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    按块读取上传的表格：CSV 直接从上传的临时文件流式分块读取，不整体载入内存；
+    Excel 无法分块，整体解析第一个非空 sheet 作为唯一一块。
+    """
+    filename = sanitize_filename(file.filename).lower()
+    if filename.endswith(".csv"):
+        for encoding in ("utf-8", "gbk"):
+            file.file.seek(0)
+            try:
+                yield from pd.read_csv(file.file, chunksize=chunk_rows, encoding=encoding)
+                return
+            except UnicodeDecodeError:
+                if encoding == "gbk":
+                    raise
+                # 与其他端点一致：UTF-8 解码失败时整体改用 GBK 重读
+                logger.info(f"文件 {file.filename} 不是 UTF-8 编码，改用 GBK 重新读取")
+                continue
+    else:
+        file.file.seek(0)
+        dataframes = parse_table_bytes(file.file.read(), file.filename)
+        if not dataframes:
+            raise HTTPException(status_code=400, detail=f"文件 {file.filename} 为空或无法解析。")
+        yield dataframes[0]
+
+# 每种聚合函数需要的部分聚合（mean 拆成数值 sum 与数值 count 两部分；
+# sum 也带上数值 count，没有任何数字的分组结果为空而不是 0）
+_PARTIAL_AGG = {
+    AggFunc.SUM: ["sum", "ncount"],
+    AggFunc.COUNT: ["count"],
+    AggFunc.MEAN: ["sum", "ncount"],
+    AggFunc.MIN: ["min"],
+    AggFunc.MAX: ["max"],
+}
+# 部分聚合 -> (使用的值列：原列 / 数值化后的列 / 可比较的列, 块内聚合函数, 块间合并函数)
+_PARTIAL_SPEC = {
+    "sum": ("num", "sum", "sum"),
+    "ncount": ("num", "count", "sum"),
+    "count": (None, "count", "sum"),
+    "min": ("cmp", "min", "min"),
+    "max": ("cmp", "max", "max"),
+}
+
+def _comparable_values(series: pd.Series) -> pd.Series:
+    """min/max 使用的值：数字和日期列保持原样，其他列转为数字（无法转换的视为空），避免数字与文本混合比较。"""
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_numeric(series, errors="coerce")
+
+def parse_agg_funcs(value: Optional[str]) -> List[AggFunc]:
+    """解析聚合函数列表参数，例如 "sum,mean"。"""
+    funcs = []
+    for name in parse_column_list(value):
+        try:
+            funcs.append(AggFunc(name.lower()))
+        except ValueError:
+            raise ValueError(f"不支持的聚合函数: {name}")
+    return funcs
+
+def aggregate_chunks(
+    chunks: Iterable[pd.DataFrame],
+    group_by: List[str],
+    value_columns: List[str],
+    funcs: List[AggFunc],
+    pivot_column: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    对一系列数据块做分组聚合：每块先做向量化的部分聚合，再与累计结果合并，
+    内存占用只与分组数量有关。nunique 通过累计去重后的 (分组, 值) 对实现。
+
+    Args:
+        chunks: 数据块迭代器（单个 DataFrame 时传入 [df]）
+        group_by: 分组列
+        value_columns: 被聚合的值列
+        funcs: 聚合函数列表，对每个值列都执行
+        pivot_column: 透视列，其取值展开为结果的列
+
+    Returns:
+        聚合后的DataFrame，分组列在前，指标列命名为 "值列_函数"
+    """
+    if not group_by:
+        raise ValueError("至少需要指定一个分组列")
+    if not value_columns:
+        raise ValueError("至少需要指定一个值列")
+    if not funcs:
+        raise ValueError("至少需要指定一个聚合函数")
+
+    keys = group_by + ([pivot_column] if pivot_column else [])
+    partial_specs = sorted({(col, part) for col in value_columns for func in funcs
+                            if func != AggFunc.NUNIQUE for part in _PARTIAL_AGG[func]})
+    derived_columns = {(col, _PARTIAL_SPEC[part][0]) for col, part in partial_specs if _PARTIAL_SPEC[part][0]}
+
+    running = None
+    unique_pairs = {col: None for col in value_columns} if AggFunc.NUNIQUE in funcs else {}
+    checked = False
+    for chunk in chunks:
+        if not checked:
+            missing = [col for col in keys + value_columns if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"列 {', '.join(map(str, missing))} 在数据中不存在")
+            checked = True
+
+        if partial_specs:
+            # sum/mean 只对能转成数字的值计算，其余视为空；min/max 在文本列上同样按数字比较
+            work = chunk[keys + value_columns].copy()
+            for col, kind in derived_columns:
+                if kind == "num":
+                    work[f"{col}\x1fnum"] = pd.to_numeric(chunk[col], errors="coerce")
+                else:
+                    work[f"{col}\x1fcmp"] = _comparable_values(chunk[col])
+            partial = work.groupby(keys, sort=False, dropna=False).agg(**{
+                f"{col}\x1f{part}": (
+                    f"{col}\x1f{_PARTIAL_SPEC[part][0]}" if _PARTIAL_SPEC[part][0] else col, _PARTIAL_SPEC[part][1]
+                )
+                for col, part in partial_specs
+            })
+            if running is None:
+                running = partial
+            else:
+                combine = {f"{col}\x1f{part}": _PARTIAL_SPEC[part][2] for col, part in partial_specs}
+                running = pd.concat([running, partial]).groupby(
+                    level=list(range(len(keys))), sort=False, dropna=False
+                ).agg(combine)
+
+        for col in unique_pairs:
+            pairs = chunk[keys + [col]].drop_duplicates()
+            if unique_pairs[col] is not None:
+                pairs = pd.concat([unique_pairs[col], pairs]).drop_duplicates()
+            unique_pairs[col] = pairs
+
+    if not checked:
+        raise ValueError("文件为空或无法解析。")
+
+    metrics = {}
+    for col in value_columns:
+        for func in funcs:
+            name = f"{col}_{func.value}"
+            if func == AggFunc.NUNIQUE:
+                metrics[name] = unique_pairs[col].groupby(keys, sort=False, dropna=False)[col].nunique()
+            elif func in (AggFunc.SUM, AggFunc.MEAN):
+                counts = running[f"{col}\x1fncount"]
+                sums = running[f"{col}\x1fsum"].where(counts > 0)
+                metrics[name] = sums if func == AggFunc.SUM else sums / counts.where(counts > 0)
+            else:
+                metrics[name] = running[f"{col}\x1f{_PARTIAL_AGG[func][0]}"]
+    result = pd.DataFrame(metrics)
+
+    if pivot_column:
+        result = result.unstack(pivot_column)
+        if len(metrics) == 1:
+            result.columns = [str(pivot_value) for _, pivot_value in result.columns]
+        else:
+            result.columns = [f"{pivot_value}_{metric}" for metric, pivot_value in result.columns]
+
+    return result.reset_index()
+
+# 多列组合键的分隔符（不会出现在正常单元格内容中）
+JOIN_KEY_SEPARATOR = "\x1f"
+
+def _normalize_key_series(series: pd.Series, trim: bool, casefold: bool) -> pd.Series:
+    """将单个关联列规范化为字符串键，空值保持为 NaN（不参与匹配）。"""
+    values = series
+    if pd.api.types.is_float_dtype(values):
+        # Excel 常把整数读成浮点数，1.0 与 CSV 中的 "1" 应视为同一个键
+        non_null = values.dropna()
+        if len(non_null) and (non_null % 1 == 0).all():
+            values = values.astype("Int64")
+    keys = values.astype(str).where(series.notna())
+    if trim:
+        keys = keys.str.strip()
+    if casefold:
+        keys = keys.str.casefold()
+    if trim:
+        keys = keys.mask(keys == "")
+    return keys
+
+def build_join_key(df: pd.DataFrame, columns: List[str], trim: bool, casefold: bool) -> pd.Series:
+    """由一个或多个关联列构造单一字符串键，任一列为空的行键为 NaN。"""
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"关联列 {', '.join(map(str, missing))} 在数据中不存在")
+    parts = [_normalize_key_series(df[col], trim, casefold) for col in columns]
+    key = parts[0]
+    for part in parts[1:]:
+        key = key + JOIN_KEY_SEPARATOR + part  # 任一部分为 NaN 时结果为 NaN
+    return key
+
+def join_dataframes(
+    left: pd.DataFrame,
+    right: pd.DataFrame,
+    left_on: List[str],
+    right_on: List[str],
+    how: JoinHow,
+    trim: bool = True,
+    casefold: bool = False,
+    first_match_only: bool = True
+) -> pd.DataFrame:
+    """
+    按关联列对两个表做哈希关联（类似 VLOOKUP）。
+
+    Args:
+        left: 主表
+        right: 查找表
+        left_on / right_on: 两侧关联列，数量需一致
+        how: 关联方式 (inner, left, anti)
+        trim: 关联前去掉键两端空白
+        casefold: 关联前忽略大小写
+        first_match_only: 查找表中同一键有多行时只取第一行（VLOOKUP 行为），否则展开所有匹配
+
+    Returns:
+        关联后的DataFrame
+    """
+    if not left_on or len(left_on) != len(right_on):
+        raise ValueError("左右两表的关联列数量必须一致且不能为空")
+
+    left_key = build_join_key(left, left_on, trim, casefold)
+    right_key = build_join_key(right, right_on, trim, casefold)
+
+    if how == JoinHow.ANTI:
+        # 哈希集合建立在查找表的唯一键上，主表逐行探测
+        matched = left_key.isin(pd.Index(right_key.dropna().unique()))
+        return left[~matched.values].reset_index(drop=True)
+
+    # 查找表中与主表重名的列加后缀，关联列本身不重复输出
+    value_columns = [col for col in right.columns if col not in right_on]
+    rename_map = {col: f"{col}_right" for col in value_columns if col in left.columns}
+    right_values = right[value_columns].rename(columns=rename_map)
+
+    if first_match_only:
+        # 哈希索引建立在行数较少的一侧，另一侧逐行探测，得到主表每行对应的查找表首个匹配行号
+        # 未匹配的行取行号 -1，reindex 后得到空值
+        if len(right) <= len(left):
+            first_rows = right_key.reset_index(drop=True).dropna().drop_duplicates(keep="first")
+            positions = pd.Index(first_rows.values).get_indexer(left_key.values)
+            # 末尾追加 -1，未匹配（-1）恰好取到它
+            row_ids = np.append(first_rows.index.values, -1)[positions]
+        else:
+            # 查找表更大：对主表的键建索引，查找表探测后按键取最早出现的行
+            left_codes, left_uniques = pd.factorize(left_key.values)
+            right_codes = pd.Index(left_uniques).get_indexer(right_key.values)
+            found = np.flatnonzero(right_codes >= 0)
+            codes, first_found = np.unique(right_codes[found], return_index=True)
+            first_row_by_code = np.full(len(left_uniques) + 1, -1)
+            first_row_by_code[codes] = found[first_found]
+            row_ids = first_row_by_code[left_codes]
+        matched = row_ids >= 0
+        right_part = right_values.reset_index(drop=True).reindex(row_ids).reset_index(drop=True)
+        left_part = left.reset_index(drop=True)
+        if how == JoinHow.INNER:
+            left_part = left_part[matched].reset_index(drop=True)
+            right_part = right_part[matched].reset_index(drop=True)
+        return pd.concat([left_part, right_part], axis=1)
+
+    # 多对多关联：交给 pandas 的哈希关联实现，使用规范化后的键
+    joined = pd.merge(
+        left.assign(__join_key__=left_key.values),
+        right_values.assign(__join_key__=right_key.values).dropna(subset=["__join_key__"]),
+        on="__join_key__",
+        how=how.value,
+        sort=False
+    )
+    return joined.drop(columns="__join_key__")
+
+def join_match_statistics(
+    left: pd.DataFrame,
+    right: pd.DataFrame,
+    left_on: List[str],
+    right_on: List[str],
+    trim: bool = True,
+    casefold: bool = False
+) -> dict:
+    """只在关联键上计算匹配统计，不构造关联结果。"""
+    left_key = build_join_key(left, left_on, trim, casefold)
+    right_key = build_join_key(right, right_on, trim, casefold)
+    left_unique = pd.Index(left_key.dropna().unique())
+    right_unique = pd.Index(right_key.dropna().unique())
+
+    # 哈希集合建立在唯一键较少的一侧，用另一侧去探测
+    if len(right_unique) <= len(left_unique):
+        matched_keys = left_unique[left_unique.isin(right_unique)]
+    else:
+        matched_keys = right_unique[right_unique.isin(left_unique)]
+
+    matched_left_rows = int(left_key.isin(matched_keys).sum())
+    right_counts = right_key.value_counts()
+    return {
+        "left_rows": len(left),
+        "right_rows": len(right),
+        "left_unique_keys": len(left_unique),
+        "right_unique_keys": len(right_unique),
+        "matched_keys": len(matched_keys),
+        "matched_left_rows": matched_left_rows,
+        "unmatched_left_rows": len(left) - matched_left_rows,
+        "left_empty_keys": int(left_key.isna().sum()),
+        "right_duplicate_keys": int((right_counts > 1).sum()),
+        "match_rate": round(matched_left_rows / len(left) * 100, 2) if len(left) > 0 else 0
+    }
+
+# --- 结果存储 ---
+
+_last_result_cleanup = 0.0
+
+def content_disposition(filename: str, ascii_fallback: Optional[str] = None) -> str:
+    """构造下载文件名头：非 ASCII 文件名同时提供 ASCII 回退名和 RFC 5987 编码名。"""
+    if filename.isascii():
+        return f"attachment; filename={filename}"
+    fallback = ascii_fallback or ("download" + os.path.splitext(filename)[1])
+    return f"attachment; filename={fallback}; filename*=UTF-8''{urllib.parse.quote(filename)}"
+
+def new_result_tmp_path(suffix: str = "") -> str:
+    """返回结果目录中的临时文件路径，生成大文件时直接写到这里，避免在内存中整体缓冲。"""
+    os.makedirs(RESULT_STORE_DIR, exist_ok=True)
+    return os.path.join(RESULT_STORE_DIR, f"tmp_{uuid.uuid4().hex}{suffix}")
+
+def _result_path(result_id: str) -> str:
+    if not re.fullmatch(r"[0-9a-f]{32}", result_id or ""):
+        raise ValueError("结果编号无效。")
+    return os.path.join(RESULT_STORE_DIR, result_id)
+
+def cleanup_table_cache(now: float) -> None:
+    """删除过期的表格缓存；总大小超出上限时按最近使用时间从旧到新淘汰。"""
+    if not os.path.isdir(TABLE_CACHE_DIR):
+        return
+    entries = []
+    for name in os.listdir(TABLE_CACHE_DIR):
+        path = os.path.join(TABLE_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+            if now - stat.st_mtime > TABLE_CACHE_TTL_SECONDS:
+                os.remove(path)  # 同时清理中断写入遗留的临时文件
+            elif name.endswith(".parquet"):
+                entries.append((stat.st_mtime, stat.st_size, path))
+        except OSError:
+            pass  # 可能已被其他进程删除
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= TABLE_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total_size -= size
+
+def cleanup_expired_results() -> None:
+    """删除过期的结果文件和表格缓存（最多每 10 分钟执行一次）。"""
+    global _last_result_cleanup
+    now = time.time()
+    if now - _last_result_cleanup < 600:
+        return
+    _last_result_cleanup = now
+    cleanup_table_cache(now)
+    if not os.path.isdir(RESULT_STORE_DIR):
+        return
+    for name in os.listdir(RESULT_STORE_DIR):
+        path = os.path.join(RESULT_STORE_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > RESULT_TTL_SECONDS:
+                os.remove(path)
+        except OSError:
+            pass  # 可能已被其他请求删除
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def save_result(source, filename: str, media_type: str, disposition: Optional[str] = None) -> dict:
+    """
+    将结果保存到结果目录，返回元数据。
+
+    Args:
+        source: bytes、BytesIO，或结果目录中的临时文件路径（直接移动，不复制）
+        filename: 下载文件名
+        media_type: 响应的 Content-Type
+        disposition: 自定义 Content-Disposition，默认由文件名生成
+    """
+    cleanup_expired_results()
+    result_id = uuid.uuid4().hex
+    path = _result_path(result_id)
+    if isinstance(source, str):
+        os.replace(source, path)
+    else:
+        tmp_path = new_result_tmp_path()
+        with open(tmp_path, "wb") as f:
+            f.write(source.getbuffer() if isinstance(source, BytesIO) else source)
+        os.replace(tmp_path, path)
+
+    meta = {
+        "result_id": result_id,
+        "filename": filename,
+        "media_type": media_type,
+        "disposition": disposition or content_disposition(filename),
+        "size": os.path.getsize(path),
+        "etag": f'"{_file_sha256(path)[:32]}"',
+        "created_at": time.time(),
+    }
+    if media_type in COMPRESSIBLE_MEDIA_TYPES:
+        # 预先压缩一份，gzip 表示同样支持 Range（作用于压缩后的字节）
+        with open(path, "rb") as src, gzip.open(path + ".gz", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        meta["gzip_size"] = os.path.getsize(path + ".gz")
+        meta["gzip_etag"] = f'"{_file_sha256(path + ".gz")[:32]}"'
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return meta
+
+def load_result_meta(result_id: str) -> dict:
+    path = _result_path(result_id)
+    if not os.path.exists(path + ".json") or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="结果不存在或已过期，请重新处理。")
+    with open(path + ".json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _etag_matches(header_value: str, etag: str) -> bool:
+    candidates = [tag.strip().removeprefix("W/") for tag in header_value.split(",")]
+    return "*" in candidates or etag in candidates
+
+def result_response(request: Request, meta: dict, cache_status: Optional[str] = None) -> Response:
+    """
+    以文件响应返回已保存的结果：带 Content-Length 和 ETag，支持 Range/If-Range 断点续传，
+    GET/HEAD 请求支持 If-None-Match / If-Modified-Since 条件请求。
+    可压缩类型在客户端接受 gzip 时返回预压缩版本。
+    """
+    path = _result_path(meta["result_id"])
+    use_gzip = "gzip_size" in meta and "gzip" in request.headers.get("accept-encoding", "")
+    etag = meta["gzip_etag"] if use_gzip else meta["etag"]
+    last_modified = formatdate(meta["created_at"], usegmt=True)
+    headers = {
+        "Content-Disposition": meta["disposition"],
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": "private, max-age=3600",
+        "X-Result-Id": meta["result_id"],
+        "X-Result-Url": f"/api/results/{meta['result_id']}",
+    }
+    if cache_status:
+        headers["X-Cache"] = cache_status
+    if "gzip_size" in meta:
+        headers["Vary"] = "Accept-Encoding"
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    if request.method in ("GET", "HEAD"):
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = False
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, etag)
+        elif if_modified_since:
+            try:
+                not_modified = parsedate_to_datetime(if_modified_since).timestamp() >= int(meta["created_at"])
+            except (TypeError, ValueError):
+                pass
+        if not_modified:
+            return Response(status_code=304, headers={k: v for k, v in headers.items() if k in ("ETag", "Last-Modified", "Cache-Control", "Vary")})
+
+    return FileResponse(
+        path + ".gz" if use_gzip else path,
+        media_type=meta["media_type"],
+        headers=headers,
+    )
+
+# --- 结果缓存 ---
+
+def _result_cache_connect() -> sqlite3.Connection:
+    conn = connect_db(RESULT_CACHE_DB)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS result_cache (
+            cache_key TEXT PRIMARY KEY,
+            result_id TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS result_cache_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+    return conn
+
+def _count_cache_event(conn: sqlite3.Connection, name: str) -> None:
+    conn.execute("""
+        INSERT INTO result_cache_stats (name, value) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET value = value + 1
+    """, (name,))
+
+def _delete_result_files(result_id: str) -> None:
+    path = _result_path(result_id)
+    for suffix in ("", ".json", ".gz"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def _normalize_cache_param(value):
+    """把枚举、Pydantic 模型等参数转换为可稳定序列化的值。"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (list, tuple)):
+        return [_normalize_cache_param(v) for v in value]
+    return value
+
+async def result_cache_key(operation: str, params: dict, files: List[UploadFile]) -> str:
+    """
+    由操作名、规范化后的参数和所有输入文件内容的哈希计算缓存键。
+    读取后把文件指针复位，后续处理可以照常读取。
+    """
+    digest = hashlib.sha256()
+    normalized = {k: _normalize_cache_param(v) for k, v in params.items()}
+    digest.update(json.dumps([operation, normalized], sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    for file in files:
+        # 分块哈希，大文件（如数 GB 的 PDF）不会整体读入内存
+        file_digest = hashlib.sha256()
+        while chunk := await file.read(1024 * 1024):
+            file_digest.update(chunk)
+        digest.update(file_digest.digest())
+        await file.seek(0)
+    return digest.hexdigest()
+
+def lookup_cached_result(cache_key: str) -> Optional[dict]:
+    """查找缓存结果，命中时更新访问时间；结果文件已被清理时视为未命中。"""
+    if _current_profile.get() is not None:
+        return None  # 被剖析的请求需要实际执行处理
+    conn = _result_cache_connect()
+    try:
+        row = conn.execute("SELECT result_id FROM result_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+        meta = None
+        if row:
+            try:
+                meta = load_result_meta(row[0])
+            except HTTPException:
+                conn.execute("DELETE FROM result_cache WHERE cache_key = ?", (cache_key,))
+        if meta:
+            now = time.time()
+            conn.execute(
+                "UPDATE result_cache SET last_access = ?, hits = hits + 1 WHERE cache_key = ?",
+                (now, cache_key)
+            )
+            # 刷新文件时间，避免仍在使用的缓存结果被过期清理
+            path = _result_path(meta["result_id"])
+            for suffix in ("", ".json", ".gz"):
+                if os.path.exists(path + suffix):
+                    os.utime(path + suffix)
+        _count_cache_event(conn, "hits" if meta else "misses")
+        conn.commit()
+        return meta
+    finally:
+        conn.close()
+
+def store_cached_result(cache_key: str, meta: dict) -> None:
+    """登记缓存结果，总大小超过上限时按最近最少使用淘汰。"""
+    now = time.time()
+    size = meta["size"] + meta.get("gzip_size", 0)
+    conn = _result_cache_connect()
+    try:
+        conn.execute("""
+            INSERT OR REPLACE INTO result_cache (cache_key, result_id, size, created_at, last_access, hits)
+            VALUES (?, ?, ?, ?, ?, 0)
+        """, (cache_key, meta["result_id"], size, now, now))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM result_cache").fetchone()[0]
+        if total > RESULT_CACHE_MAX_BYTES:
+            rows = conn.execute(
+                "SELECT cache_key, result_id, size FROM result_cache WHERE cache_key != ? ORDER BY last_access",
+                (cache_key,)
+            ).fetchall()
+            for old_key, old_result_id, old_size in rows:
+                if total <= RESULT_CACHE_MAX_BYTES:
+                    break
+                conn.execute("DELETE FROM result_cache WHERE cache_key = ?", (old_key,))
+                _delete_result_files(old_result_id)
+                _count_cache_event(conn, "evictions")
+                total -= old_size
+        conn.commit()
+    finally:
+        conn.close()
+
+@app.get("/api/cache/stats")
+async def result_cache_stats_api():
+    """返回结果缓存的命中/未命中/淘汰次数和占用空间。"""
+    conn = _result_cache_connect()
+    try:
+        counters = dict(conn.execute("SELECT name, value FROM result_cache_stats").fetchall())
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache").fetchone()
+    finally:
+        conn.close()
+    hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "evictions": counters.get("evictions", 0),
+        "hit_rate": round(hits / (hits + misses) * 100, 2) if hits + misses else 0,
+        "entries": entries,
+        "total_bytes": total,
+        "max_bytes": RESULT_CACHE_MAX_BYTES
+    }
+
+@app.api_route("/api/results/{result_id}", methods=["GET", "HEAD"])
+async def result_download_api(request: Request, result_id: str):
+    """
+    重新下载已生成的结果，支持 Range 断点续传和条件请求。
+    """
+    try:
+        meta = load_result_meta(result_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return result_response(request, meta)
+
 # --- API 端点 ---
 
 @app.post("/api/merge")
 async def merge_files_api(
+    request: Request,
     files: List[UploadFile] = File(...),
-    merge_mode: MergeMode = Form(...)
+    merge_mode: MergeMode = Form(...),
+    output_format: str = Form("xlsx", description="输出格式，xlsx 或 csv")
 ):
     """
-    接收上传的表格文件和合并模式，返回合并后的Excel文件。
+    接收上传的表格文件和合并模式，返回合并后的Excel（或CSV）文件。
+    结果保存在服务端，可通过响应头 X-Result-Url 断点续传重新下载。
     """
     if not files:
         raise HTTPException(status_code=400, detail="没有提供任何文件。")
+    if output_format not in ("xlsx", "csv"):
+        raise HTTPException(status_code=400, detail="输出格式必须是 xlsx 或 csv。")
 
     try:
+        # 相同输入和参数的请求直接返回缓存结果
+        cache_key = await result_cache_key("merge", {"merge_mode": merge_mode, "output_format": output_format}, files)
+        cached = await run_in_threadpool(lookup_cached_result, cache_key)
+        if cached:
+            return result_response(request, cached, "HIT")
+
         dataframes = await process_uploaded_files(files)
-        merged_df = merge_dataframes(dataframes, merge_mode)
-        output = dataframe_to_excel_bytes(merged_df)
+        merged_df = await run_stage("transform", merge_dataframes, dataframes, merge_mode)
+        if output_format == "csv":
+            csv_path = new_result_tmp_path(".csv")
+            # utf-8-sig 便于 Excel 直接打开中文 CSV
+            await run_stage("serialize", merged_df.to_csv, csv_path, index=False, encoding="utf-8-sig")
+            meta = await run_stage("save", save_result, csv_path, "merged_pro.csv", "text/csv")
+        else:
+            meta = await run_stage(
+                "save", save_result,
+                await run_stage("serialize", dataframe_to_excel_bytes, merged_df), "merged_pro.xlsx",
+                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+        await run_in_threadpool(store_cached_result, cache_key, meta)
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -320,16 +2076,13 @@ async def merge_files_api(
         logger.error(f"处理合并时发生未知错误: {e}")
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
 
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=merged_pro.xlsx"}
-    )
+    return result_response(request, meta, "MISS")
 
 @app.post("/api/merge/preview")
 async def merge_preview_api(
     files: List[UploadFile] = File(...),
     merge_mode: MergeMode = Form(...),
+    layout: PreviewLayout = Form(PreviewLayout.RECORDS),
     preview_rows: int = Form(10) # 获取前N行用于预览
 ):
     """
@@ -340,17 +2093,16 @@ async def merge_preview_api(
 
     try:
         dataframes = await process_uploaded_files(files)
-        merged_df = merge_dataframes(dataframes, merge_mode)
+        merged_df = await run_stage("transform", merge_dataframes, dataframes, merge_mode)
 
         # 获取预览数据
         preview_df = merged_df.head(preview_rows)
 
-        # 处理 NaN 值，因为 JSON 不能直接序列化 NaN
-        # fillna(None) 会将 NaN 转换为 None，这在 JSON 中是 null
-        preview_json = preview_df.fillna("").to_dict(orient='records')
+        # 处理 NaN 等特殊值，按请求的布局组织数据
+        preview_json = dataframe_to_preview_data(preview_df, layout)
         columns = preview_df.columns.tolist()
 
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "columns": columns,
             "data": preview_json,
             "total_rows": len(merged_df) # 可选：返回总行数
@@ -365,18 +2117,392 @@ async def merge_preview_api(
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
 
 
-@app.post("/api/split/columns")
-async def get_split_columns(file: UploadFile = File(...)):
-    """
-    接收一个表格文件，返回其列名列表。
+# --- 增量合并 ---
+
+def _incremental_merge_paths(token: str):
+    """返回某个令牌对应的 (目录, 数据文件, 清单文件) 路径。"""
+    if not MERGE_TOKEN_PATTERN.match(token or ""):
+        raise ValueError("令牌格式无效，只允许 8-64 位字母、数字、下划线或连字符。")
+    token_dir = os.path.join(INCREMENTAL_MERGE_DIR, token)
+    return token_dir, os.path.join(token_dir, "merged.parquet"), os.path.join(token_dir, "manifest.json")
+
+def _to_parquet_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Parquet 要求列类型一致：把混合类型的 object 列统一为字符串，空值保持为空。"""
+    df = df.copy()
+    df.columns = [str(col) for col in df.columns]
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def load_incremental_merge(token: str):
+    """读取令牌对应的已合并数据和清单，不存在时返回 (None, 空清单)。"""
+    _, data_path, manifest_path = _incremental_merge_paths(token)
+    if not os.path.exists(manifest_path) or not os.path.exists(data_path):
+        return None, {"merge_mode": None, "files": []}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return pd.read_parquet(data_path), manifest
+
+def save_incremental_merge(token: str, df: pd.DataFrame, manifest: dict) -> None:
+    """原子写入已合并数据和清单（先写临时文件再替换）。"""
+    token_dir, data_path, manifest_path = _incremental_merge_paths(token)
+    os.makedirs(token_dir, exist_ok=True)
+    _to_parquet_safe(df).to_parquet(data_path + ".tmp", index=False)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+def apply_incremental_merge(token: str, merge_mode: MergeMode, uploads: List[tuple], reset: bool = False):
     """
-    if not file:
-        raise HTTPException(status_code=400, detail="没有提供文件。")
+    在跨进程锁内完成一次增量合并的读-改-写：跳过清单中已有哈希的文件，只解析新文件并追加。
 
-    try:
-        content = BytesIO(await file.read())
-        filename = file.filename.lower()
-        df = None
+    Args:
+        uploads: (文件名, 文件内容) 列表
+
+    Returns:
+        (合并后的原始数据, 更新后的清单, 跳过的文件数)
+    """
+    token_dir, _, _ = _incremental_merge_paths(token)
+    with interprocess_lock(os.path.join(token_dir, ".lock")):
+        if reset:
+            for name in ("merged.parquet", "manifest.json"):
+                path = os.path.join(token_dir, name)
+                if os.path.exists(path):
+                    os.remove(path)
+
+        existing_df, manifest = load_incremental_merge(token)
+        if existing_df is not None and manifest.get("merge_mode") != merge_mode.value:
+            raise ValueError(f"该令牌已使用 {manifest.get('merge_mode')} 模式合并，如需更换模式请设置 reset。")
+
+        known_hashes = {entry["sha256"] for entry in manifest["files"]}
+        new_dataframes = []
+        skipped = 0
+        for filename, raw in uploads:
+            digest = hashlib.sha256(raw).hexdigest()
+            if digest in known_hashes:
+                skipped += 1
+                continue
+            file_dfs = parse_table_bytes(raw, filename)
+            new_dataframes.extend(file_dfs)
+            known_hashes.add(digest)
+            manifest["files"].append({
+                "name": sanitize_filename(filename),
+                "sha256": digest,
+                "rows": sum(len(df) for df in file_dfs),
+                "merged_at": datetime.now().isoformat(timespec="seconds")
+            })
+
+        if existing_df is None and not new_dataframes:
+            raise HTTPException(status_code=400, detail="上传的文件均无法解析或内容为空。")
+
+        if new_dataframes:
+            # 只对新数据与已有结果做一次拼接，历史文件不再重复解析
+            parts = ([existing_df] if existing_df is not None else []) + new_dataframes
+            raw_merged = concat_dataframes(parts, merge_mode)
+            manifest["merge_mode"] = merge_mode.value
+            save_incremental_merge(token, raw_merged, manifest)
+        else:
+            raw_merged = existing_df
+
+    return raw_merged, manifest, skipped
+
+@app.post("/api/merge/incremental")
+async def merge_incremental_api(
+    files: List[UploadFile] = File(...),
+    merge_mode: MergeMode = Form(...),
+    token: str = Form(...),
+    reset: bool = Form(False)
+):
+    """
+    增量合并：服务端按令牌保存已合并的数据和已处理文件的内容哈希，
+    只解析本次新增的文件并追加，返回更新后的完整合并结果。
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="没有提供任何文件。")
+
+    try:
+        uploads = [(file.filename, await file.read()) for file in files]
+        # 加锁的读-改-写在线程池中执行，等待锁时不阻塞事件循环
+        raw_merged, manifest, skipped = await run_stage(
+            "transform", apply_incremental_merge, token, merge_mode, uploads, reset
+        )
+        merged_df = await run_stage("serialize", prepare_dataframe_for_json_serialization, raw_merged)
+        output = await run_stage("serialize", dataframe_to_excel_bytes, merged_df)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise # Re-raise HTTPExceptions
+    except Exception as e:
+        logger.error(f"处理增量合并时发生未知错误: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
+
+    return StreamingResponse(
+        output,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={
+            "Content-Disposition": "attachment; filename=merged_pro.xlsx",
+            "X-Merged-Files": str(len(manifest["files"])),
+            "X-New-Files": str(len(files) - skipped),
+            "X-Skipped-Files": str(skipped),
+            "X-Total-Rows": str(len(raw_merged))
+        }
+    )
+
+@app.get("/api/merge/incremental/{token}")
+async def merge_incremental_manifest_api(token: str):
+    """返回令牌对应的增量合并清单（已合并文件及行数）。"""
+    try:
+        existing_df, manifest = load_incremental_merge(token)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(content={
+        "merge_mode": manifest.get("merge_mode"),
+        "files": manifest["files"],
+        "total_rows": 0 if existing_df is None else len(existing_df)
+    })
+
+# --- 分页预览 ---
+
+# 已加载的表格：table_id -> DataFrame（LRU）
+_table_frames = OrderedDict()
+# 排序/筛选后的行号：(table_id, 排序, 筛选) -> np.ndarray（LRU）
+_table_views = OrderedDict()
+_table_cache_lock = threading.Lock()
+
+class TableFilterOp(str, Enum):
+    EQUALS = "equals"
+    NOT_EQUALS = "not_equals"
+    CONTAINS = "contains"
+    GT = "gt"
+    LT = "lt"
+    EMPTY = "empty"
+    NOT_EMPTY = "not_empty"
+
+def _lru_put(cache: OrderedDict, key, value, max_items: int) -> None:
+    with _table_cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_items:
+            cache.popitem(last=False)
+
+def _lru_get(cache: OrderedDict, key):
+    with _table_cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+def _table_path(table_id: str) -> str:
+    if not re.fullmatch(r"[0-9a-f]{32}", table_id or ""):
+        raise ValueError("表格编号无效。")
+    return os.path.join(TABLE_CACHE_DIR, f"{table_id}.parquet")
+
+def cache_table(df: pd.DataFrame, raw: bytes) -> str:
+    """把解析后的表格写入缓存（同一内容只保存一份），返回表格编号。"""
+    cleanup_expired_results()
+    table_id = hashlib.sha256(raw).hexdigest()[:32]
+    path = _table_path(table_id)
+    if not os.path.exists(path):
+        os.makedirs(TABLE_CACHE_DIR, exist_ok=True)
+        # 多个工作进程可能同时缓存同一文件，临时文件名需唯一
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        _to_parquet_safe(df).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    else:
+        _touch_table(path)
+    return table_id
+
+def _touch_table(path: str) -> None:
+    """更新表格缓存的修改时间，过期和淘汰按最近使用时间计算。"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass  # 可能刚被清理
+
+def load_cached_table(table_id: str) -> pd.DataFrame:
+    """优先从内存读取缓存的表格，否则从 Parquet 加载。"""
+    df = _lru_get(_table_frames, table_id)
+    if df is None:
+        path = _table_path(table_id)
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="表格不存在或已过期，请重新上传。")
+        df = pd.read_parquet(path)
+        _touch_table(path)
+        _lru_put(_table_frames, table_id, df, TABLE_CACHE_MAX_FRAMES)
+    return df
+
+def _filter_mask(series: pd.Series, op: TableFilterOp, value) -> pd.Series:
+    """对单列计算向量化的筛选条件。"""
+    if op == TableFilterOp.EMPTY:
+        return series.isna() | (series.astype(str).str.strip() == "")
+    if op == TableFilterOp.NOT_EMPTY:
+        return series.notna() & (series.astype(str).str.strip() != "")
+    if op in (TableFilterOp.GT, TableFilterOp.LT):
+        if pd.api.types.is_numeric_dtype(series):
+            target = pd.to_numeric(value, errors="coerce")
+            if pd.isna(target):
+                raise ValueError(f"筛选值 '{value}' 不是数字")
+        else:
+            series, target = series.astype(str), str(value)
+        return (series > target) if op == TableFilterOp.GT else (series < target)
+    text = series.astype(str).where(series.notna(), "")
+    if op == TableFilterOp.CONTAINS:
+        return text.str.contains(str(value), case=False, regex=False)
+    if pd.api.types.is_numeric_dtype(series):
+        target = pd.to_numeric(value, errors="coerce")
+        matched = series == target
+    else:
+        matched = text == str(value)
+    return matched if op == TableFilterOp.EQUALS else ~matched
+
+def table_view_positions(table_id: str, df: pd.DataFrame, sort_by: Optional[str], descending: bool, filters: list) -> np.ndarray:
+    """
+    返回排序/筛选后的行号数组。结果按参数缓存，翻页时只需切片，
+    多百万行表格上每页请求不再重复排序和筛选。
+    """
+    view_key = (table_id, sort_by, descending, json.dumps(filters, sort_keys=True, ensure_ascii=False))
+    positions = _lru_get(_table_views, view_key)
+    if positions is not None:
+        return positions
+
+    mask = np.ones(len(df), dtype=bool)
+    for condition in filters:
+        column = condition.get("column")
+        if column not in df.columns:
+            raise ValueError(f"筛选列 '{column}' 在数据中不存在")
+        try:
+            op = TableFilterOp(condition.get("op", TableFilterOp.CONTAINS.value))
+        except ValueError:
+            raise ValueError(f"不支持的筛选方式: {condition.get('op')}")
+        mask &= _filter_mask(df[column], op, condition.get("value", "")).fillna(False).to_numpy(dtype=bool)
+    positions = np.flatnonzero(mask)
+
+    if sort_by:
+        if sort_by not in df.columns:
+            raise ValueError(f"排序列 '{sort_by}' 在数据中不存在")
+        column = df[sort_by].iloc[positions]
+        order = column.reset_index(drop=True).sort_values(
+            ascending=not descending, kind="stable", na_position="last"
+        ).index.to_numpy()
+        positions = positions[order]
+
+    _lru_put(_table_views, view_key, positions, TABLE_CACHE_MAX_VIEWS)
+    return positions
+
+def table_page(table_id: str, offset: int, limit: int, sort_by: Optional[str], descending: bool, filters: list):
+    """加载缓存的表格并取出排序/筛选后的一页，返回 (该页的 DataFrame, 排序/筛选后的总行数)。"""
+    df = load_cached_table(table_id)
+    positions = table_view_positions(table_id, df, sort_by, descending, filters)
+    return df.take(positions[offset:offset + limit]), len(positions)
+
+@app.post("/api/table")
+async def table_upload_api(file: UploadFile = File(...)):
+    """
+    上传并解析一个表格文件，缓存解析结果，返回表格编号和列信息，供分页接口使用。
+    """
+    try:
+        raw = await file.read()
+        dataframes = await run_stage("parse", parse_table_bytes, raw, file.filename)
+        if not dataframes:
+            raise HTTPException(status_code=400, detail="文件为空或无法解析。")
+        table_id = await run_stage("serialize", cache_table, dataframes[0], raw)
+        df = await run_in_threadpool(load_cached_table, table_id)
+        return FastJSONResponse(content={
+            "table_id": table_id,
+            "columns": [str(col) for col in df.columns],
+            "dtypes": [str(dtype) for dtype in df.dtypes],
+            "total_rows": len(df)
+        })
+
+    except HTTPException:
+        raise # Re-raise HTTPExceptions
+    except Exception as e:
+        logger.error(f"缓存表格时发生错误: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
+
+@app.get("/api/table/{table_id}/rows")
+async def table_rows_api(
+    table_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=TABLE_PAGE_MAX_ROWS),
+    sort_by: Optional[str] = Query(None),
+    descending: bool = Query(False),
+    filters: Optional[str] = Query(None, description='JSON 数组，如 [{"column": "城市", "op": "contains", "value": "北京"}]'),
+    format: str = Query("json", description="json（按列组织的紧凑 JSON）或 arrow（Arrow IPC 流）")
+):
+    """
+    按页返回缓存表格的数据，支持服务端排序和筛选。
+    JSON 按列组织（data[i] 为第 i 列的值），避免每行重复列名。
+    """
+    try:
+        filter_list = json.loads(filters) if filters else []
+        if not isinstance(filter_list, list):
+            raise ValueError("filters 必须是 JSON 数组")
+        page_df, total_rows = await run_stage(
+            "transform", table_page, table_id, offset, limit, sort_by, descending, filter_list
+        )
+
+        if format == "arrow":
+            import pyarrow as pa  # 仅 Arrow 输出需要
+            sink = pa.BufferOutputStream()
+            table = pa.Table.from_pandas(page_df, preserve_index=False)
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return Response(
+                content=sink.getvalue().to_pybytes(),
+                media_type="application/vnd.apache.arrow.stream",
+                headers={"X-Total-Rows": str(total_rows), "X-Offset": str(offset)}
+            )
+
+        return FastJSONResponse(content={
+            "columns": [str(col) for col in page_df.columns],
+            "data": dataframe_to_preview_data(page_df, PreviewLayout.COLUMNS),
+            "offset": offset,
+            "limit": limit,
+            "total_rows": total_rows
+        })
+
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"filters 格式无效: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise # Re-raise HTTPExceptions
+    except Exception as e:
+        logger.error(f"读取分页数据时发生错误: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
+
+@app.delete("/api/table/{table_id}")
+async def table_delete_api(table_id: str):
+    """删除缓存的表格及其排序/筛选结果。"""
+    try:
+        path = _table_path(table_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with _table_cache_lock:
+        _table_frames.pop(table_id, None)
+        for key in [key for key in _table_views if key[0] == table_id]:
+            del _table_views[key]
+    if os.path.exists(path):
+        os.remove(path)
+    return FastJSONResponse(content={"deleted": table_id})
+
+
+@app.post("/api/split/columns")
+async def get_split_columns(file: UploadFile = File(...)):
+    """
+    接收一个表格文件，返回其列名列表。
+    """
+    if not file:
+        raise HTTPException(status_code=400, detail="没有提供文件。")
+
+    try:
+        content = BytesIO(await file.read())
+        filename = file.filename.lower()
+        df = None
 
         if filename.endswith((".xlsx", ".xls")):
             # 读取第一个 sheet
@@ -392,7 +2518,7 @@ async def get_split_columns(file: UploadFile = File(...)):
         if df is not None and not df.empty:
             # 确保列名是字符串类型，避免序列化问题
             columns = [str(col) for col in df.columns.tolist()]
-            return JSONResponse(content={"columns": columns})
+            return FastJSONResponse(content={"columns": columns})
         else:
             raise HTTPException(status_code=400, detail="文件为空或无法解析。")
 
@@ -401,13 +2527,48 @@ async def get_split_columns(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"处理文件时出错: {e}")
 
 
+def write_split_zip(df: pd.DataFrame, split_column: str, zip_path: str) -> int:
+    """按 split_column 分组，每组写成一个 Excel 文件并打包到 zip_path，返回分组数。"""
+    if split_column not in df.columns:
+        raise ValueError(f"指定的拆分列 '{split_column}' 在文件中不存在。")
+
+    # 按 split_column 分组
+    grouped = df.groupby(split_column, sort=False) # sort=False 保持原始顺序
+
+    if grouped.ngroups == 0:
+        raise ValueError("根据指定列拆分后没有产生任何组。")
+
+    # ZIP 直接写入结果目录；分组的临时 Excel 文件放在 TemporaryDirectory 中自动清理
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for name, group in grouped:
+                # 处理分组名，避免文件名中的非法字符
+                safe_name = str(name).replace('/', '_').replace('\\', '_').replace(':', '_')
+                # 简单截断长文件名，防止文件系统问题
+                safe_name = safe_name[:50] 
+                
+                # 为每个组创建一个临时的 Excel 文件
+                group_filename = f"{safe_name}_split.xlsx"
+                group_path = os.path.join(tmpdirname, group_filename)
+                
+                # 保存分组数据到临时Excel文件
+                group.to_excel(group_path, index=False, sheet_name=safe_name[:31]) # Sheet名限制31字符
+                
+                # 将临时Excel文件添加到ZIP中
+                zipf.write(group_path, arcname=group_filename)
+                # 临时文件会在 with tempfile.TemporaryDirectory 退出时自动删除
+    return grouped.ngroups
+
 @app.post("/api/split")
 async def split_file_api(
+    request: Request,
     file: UploadFile = File(...),
     split_column: str = Form(...)
 ):
     """
     接收一个表格文件和拆分列名，返回包含拆分后文件的 ZIP 包。
+    结果保存在服务端，可通过响应头 X-Result-Url 断点续传重新下载。
     """
     if not file:
         raise HTTPException(status_code=400, detail="没有提供文件。")
@@ -415,71 +2576,30 @@ async def split_file_api(
          raise HTTPException(status_code=400, detail="没有提供拆分列名。")
 
     try:
-        content = BytesIO(await file.read())
-        filename = file.filename.lower()
-        df = None
+        # 相同输入和参数的请求直接返回缓存结果
+        cache_key = await result_cache_key("split", {"split_column": split_column}, [file])
+        cached = await run_in_threadpool(lookup_cached_result, cache_key)
+        if cached:
+            return result_response(request, cached, "HIT")
 
-        if filename.endswith((".xlsx", ".xls")):
-            excel_file = pd.ExcelFile(content, engine='openpyxl')
-            df = excel_file.parse(excel_file.sheet_names[0]) # 通常拆分第一个sheet
-        elif filename.endswith(".csv"):
-            try:
-                df = pd.read_csv(content)
-            except UnicodeDecodeError:
-                content.seek(0)
-                df = pd.read_csv(content, encoding='gbk')
+        dataframes = await run_stage("parse", parse_table_bytes, await file.read(), file.filename)
+        df = dataframes[0] if dataframes else None
 
         if df is None or df.empty:
             raise HTTPException(status_code=400, detail="文件为空或无法解析。")
 
-        if split_column not in df.columns:
-            raise HTTPException(status_code=400, detail=f"指定的拆分列 '{split_column}' 在文件中不存在。")
-
-        # --- 执行拆分 ---
-        # 按 split_column 分组
-        grouped = df.groupby(split_column, sort=False) # sort=False 保持原始顺序
-
-        if grouped.ngroups == 0:
-             raise HTTPException(status_code=400, detail="根据指定列拆分后没有产生任何组。")
-
-        # --- 创建 ZIP 文件 ---
-        # 使用 tempfile.TemporaryDirectory 确保临时文件被自动清理
-        with tempfile.TemporaryDirectory() as tmpdirname:
-            zip_filename = "split_files.zip"
-            zip_path = os.path.join(tmpdirname, zip_filename)
-            
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for name, group in grouped:
-                    # 处理分组名，避免文件名中的非法字符
-                    safe_name = str(name).replace('/', '_').replace('\\', '_').replace(':', '_')
-                    # 简单截断长文件名，防止文件系统问题
-                    safe_name = safe_name[:50] 
-                    
-                    # 为每个组创建一个临时的 Excel 文件
-                    group_filename = f"{safe_name}_split.xlsx"
-                    group_path = os.path.join(tmpdirname, group_filename)
-                    
-                    # 保存分组数据到临时Excel文件
-                    group.to_excel(group_path, index=False, sheet_name=safe_name[:31]) # Sheet名限制31字符
-                    
-                    # 将临时Excel文件添加到ZIP中
-                    zipf.write(group_path, arcname=group_filename)
-                    # 临时文件会在 with tempfile.TemporaryDirectory 退出时自动删除
-
-            # 读取生成的 ZIP 文件内容
-            with open(zip_path, 'rb') as f:
-                zip_content = f.read()
+        # --- 执行拆分并创建 ZIP 文件 ---
+        zip_filename = "split_files.zip"
+        zip_path = new_result_tmp_path(".zip")
+        await run_stage("serialize", write_split_zip, df, split_column, zip_path)
 
         # 返回 ZIP 文件
-        zip_bytes_io = BytesIO(zip_content)
-        zip_bytes_io.seek(0)
-
-        return StreamingResponse(
-            zip_bytes_io,
-            media_type="application/zip",
-            headers={"Content-Disposition": f"attachment; filename={zip_filename}"}
-        )
+        meta = await run_stage("save", save_result, zip_path, zip_filename, "application/zip")
+        await run_in_threadpool(store_cached_result, cache_key, meta)
+        return result_response(request, meta, "MISS")
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise # Re-raise HTTPExceptions
     except Exception as e:
@@ -492,6 +2612,9 @@ async def clean_preview_api(
     remove_empty_rows: bool = Form(True),
     remove_empty_cols: bool = Form(True),
     trim_spaces: bool = Form(False),
+    normalize_spaces: bool = Form(False),
+    remove_invisible_chars: bool = Form(False),
+    layout: PreviewLayout = Form(PreviewLayout.RECORDS),
     preview_rows: int = Form(5) # 获取前N行用于预览
 ):
     """
@@ -501,19 +2624,8 @@ async def clean_preview_api(
         raise HTTPException(status_code=400, detail="没有提供文件。")
 
     try:
-        content = BytesIO(await file.read())
-        filename = file.filename.lower()
-        df_original = None
-
-        if filename.endswith((".xlsx", ".xls")):
-            excel_file = pd.ExcelFile(content, engine='openpyxl')
-            df_original = excel_file.parse(excel_file.sheet_names[0]) # 通常处理第一个sheet
-        elif filename.endswith(".csv"):
-            try:
-                df_original = pd.read_csv(content)
-            except UnicodeDecodeError:
-                content.seek(0)
-                df_original = pd.read_csv(content, encoding='gbk')
+        dataframes = await run_stage("parse", parse_table_bytes, await file.read(), file.filename)
+        df_original = dataframes[0] if dataframes else None
 
         if df_original is None or df_original.empty:
             raise HTTPException(status_code=400, detail="文件为空或无法解析。")
@@ -524,27 +2636,33 @@ async def clean_preview_api(
         options = CleanOptions(
             remove_empty_rows=remove_empty_rows,
             remove_empty_cols=remove_empty_cols,
-            trim_spaces=trim_spaces
+            trim_spaces=trim_spaces,
+            normalize_spaces=normalize_spaces,
+            remove_invisible_chars=remove_invisible_chars
         )
-        df_cleaned = clean_dataframe(df_original, options)
+        df_cleaned, column_stats = await run_stage("transform", clean_dataframe_with_stats, df_original, options)
         
         cleaned_rows, cleaned_cols = df_cleaned.shape
 
         # 获取预览数据 (清理后的)
         preview_df = df_cleaned.head(preview_rows)
         # 使用 prepare_dataframe_for_json_serialization 处理数据类型
-        preview_df_processed = prepare_dataframe_for_json_serialization(preview_df)
-        preview_json = preview_df_processed.to_dict(orient='records')
+        preview_json = dataframe_to_preview_data(preview_df, layout)
         columns = preview_df.columns.tolist()
 
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "original_rows": original_rows,
             "original_cols": original_cols,
             "cleaned_rows": cleaned_rows,
             "cleaned_cols": cleaned_cols,
             "preview_columns": columns,
             "preview_data": preview_json,
-            "actions": [k for k, v in options.dict().items() if v] # 返回执行了哪些操作
+            "actions": [k for k, v in options.model_dump().items() if v], # 返回执行了哪些操作
+            "column_stats": column_stats,
+            "null_cells": sum(c["null_cells"] for c in column_stats),
+            "blank_cells": sum(c["blank_cells"] for c in column_stats),
+            "trimmed_cells": sum(c["trimmed_cells"] for c in column_stats),
+            "type_mismatch_cells": sum(c["type_mismatch_cells"] for c in column_stats)
         })
 
     except HTTPException:
@@ -556,10 +2674,13 @@ async def clean_preview_api(
 
 @app.post("/api/clean")
 async def clean_file_api(
+    request: Request,
     file: UploadFile = File(...),
     remove_empty_rows: bool = Form(True),
     remove_empty_cols: bool = Form(True),
-    trim_spaces: bool = Form(False)
+    trim_spaces: bool = Form(False),
+    normalize_spaces: bool = Form(False),
+    remove_invisible_chars: bool = Form(False)
 ):
     """
     接收一个表格文件和清理选项，返回清理后的文件。
@@ -568,39 +2689,36 @@ async def clean_file_api(
         raise HTTPException(status_code=400, detail="没有提供文件。")
 
     try:
-        content = BytesIO(await file.read())
-        filename = file.filename.lower()
-        df_original = None
-
-        if filename.endswith((".xlsx", ".xls")):
-            excel_file = pd.ExcelFile(content, engine='openpyxl')
-            df_original = excel_file.parse(excel_file.sheet_names[0])
-        elif filename.endswith(".csv"):
-            try:
-                df_original = pd.read_csv(content)
-            except UnicodeDecodeError:
-                content.seek(0)
-                df_original = pd.read_csv(content, encoding='gbk')
-
-        if df_original is None or df_original.empty:
-            raise HTTPException(status_code=400, detail="文件为空或无法解析。")
-
         # 应用清理选项
         options = CleanOptions(
             remove_empty_rows=remove_empty_rows,
             remove_empty_cols=remove_empty_cols,
-            trim_spaces=trim_spaces
+            trim_spaces=trim_spaces,
+            normalize_spaces=normalize_spaces,
+            remove_invisible_chars=remove_invisible_chars
         )
-        df_cleaned = clean_dataframe(df_original, options)
+        # 相同输入和参数的请求直接返回缓存结果
+        cache_key = await result_cache_key("clean", {"options": options}, [file])
+        cached = await run_in_threadpool(lookup_cached_result, cache_key)
+        if cached:
+            return result_response(request, cached, "HIT")
 
-        # 将清理后的 DataFrame 导出为 Excel 字节流
-        output = dataframe_to_excel_bytes(df_cleaned) # 复用之前定义的函数
+        dataframes = await run_stage("parse", parse_table_bytes, await file.read(), file.filename)
+        df_original = dataframes[0] if dataframes else None
 
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=cleaned_data.xlsx"}
+        if df_original is None or df_original.empty:
+            raise HTTPException(status_code=400, detail="文件为空或无法解析。")
+
+        df_cleaned = await run_stage("transform", clean_dataframe, df_original, options)
+
+        # 将清理后的 DataFrame 导出为 Excel 并保存结果
+        meta = await run_stage(
+            "save", save_result,
+            await run_stage("serialize", dataframe_to_excel_bytes, df_cleaned), "cleaned_data.xlsx", # 复用之前定义的函数
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
+        await run_in_threadpool(store_cached_result, cache_key, meta)
+        return result_response(request, meta, "MISS")
 
     except HTTPException:
         raise # Re-raise HTTPExceptions
@@ -609,8 +2727,23 @@ async def clean_file_api(
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
 
 
+def render_pdf_to_zip(pdf_bytes: bytes, format: str, dpi: int, zip_path: str) -> None:
+    """逐页渲染 PDF 并写入 ZIP 文件。"""
+    doc = fitz.open(stream=BytesIO(pdf_bytes), filetype="pdf")
+    try:
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for page_num in range(len(doc)):
+                page = doc[page_num]
+                pix = page.get_pixmap(dpi=dpi)
+                img_bytes = pix.tobytes(output=format)
+                img_filename = f"page_{page_num+1}.{format.lower()}"
+                zip_file.writestr(img_filename, img_bytes)
+    finally:
+        doc.close()
+
 @app.post("/api/pdf-to-images")
 async def pdf_to_images(
+    request: Request,
     file: UploadFile = File(..., description="PDF 文件"),
     format: str = Form(..., description="图片格式，png 或 jpeg"),
     dpi: int = Form(150, description="图片 DPI"),
@@ -622,21 +2755,17 @@ async def pdf_to_images(
         raise HTTPException(status_code=400, detail="图片格式必须是 png 或 jpeg。")
 
     try:
-        pdf_bytes = await file.read()
-        pdf_stream = BytesIO(pdf_bytes)
-        doc = fitz.open(stream=pdf_stream, filetype="pdf")
+        # 相同输入和参数的请求直接返回缓存结果
+        cache_key = await result_cache_key("pdf-to-images", {"format": format.lower(), "dpi": dpi, "filename": sanitize_filename(file.filename)}, [file])
+        cached = await run_in_threadpool(lookup_cached_result, cache_key)
+        if cached:
+            return result_response(request, cached, "HIT")
 
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                pix = page.get_pixmap(dpi=dpi)
-                img_bytes = pix.tobytes(output=format)
-                img_filename = f"page_{page_num+1}.{format.lower()}"
-                zip_file.writestr(img_filename, img_bytes)
+        pdf_bytes = await file.read()
 
-        zip_buffer.seek(0)
-        doc.close()
+        # ZIP 直接写入结果目录，避免整个压缩包在内存中缓冲；渲染在线程池中执行
+        zip_path = new_result_tmp_path(".zip")
+        await run_stage("render", render_pdf_to_zip, pdf_bytes, format, dpi, zip_path)
 
         # 清理文件名
         original_filename_no_ext = sanitize_filename(file.filename.rsplit(".", 1)[0])
@@ -646,11 +2775,11 @@ async def pdf_to_images(
         safe_ascii_name = "converted_images.zip"
         quoted_name = urllib.parse.quote(zip_filename)
 
-        headers = {
-            "Content-Disposition": f"attachment; filename={safe_ascii_name}; filename*=UTF-8''{quoted_name}"
-        }
+        disposition = f"attachment; filename={safe_ascii_name}; filename*=UTF-8''{quoted_name}"
 
-        return StreamingResponse(zip_buffer, media_type="application/zip", headers=headers)
+        meta = await run_stage("save", save_result, zip_path, zip_filename, "application/zip", disposition)
+        await run_in_threadpool(store_cached_result, cache_key, meta)
+        return result_response(request, meta, "MISS")
 
     except Exception as e:
         logger.error(f"PDF 转换失败: {e}", exc_info=True)
@@ -698,11 +2827,11 @@ async def pdfmerge_preview_api(
             # 在文件之间添加空白页，n个文件需要n-1个空白页
             total_pages += (len(files) - 1)
         
-        # 如果选择了添加目录页选项
+        # 如果选择了添加目录页选项，目录按文件数分页
         if "add_toc" in merge_options:
-            total_pages += 1  # 添加一个目录页
+            total_pages += pdf_toc_page_count(len(files))
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "total_pages": total_pages,
             "total_size": total_size,
             "actions": merge_options
@@ -715,8 +2844,106 @@ async def pdfmerge_preview_api(
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
 
 
+# 目录页版式（A4，单位为点）：首行标题，其下每行一个文件条目，右侧为起始页码
+PDF_TOC_FONT = "china-s"  # PyMuPDF 内置的简体中文字体，文件名中的中文可以正常显示
+PDF_TOC_TITLE_Y = 50
+PDF_TOC_FIRST_ENTRY_Y = 100
+PDF_TOC_BOTTOM_MARGIN = 50
+PDF_TOC_LINE_HEIGHT = 20
+PDF_TOC_LEFT = 70
+PDF_TOC_RIGHT = 525
+PDF_TOC_FONT_SIZE = 12
+PDF_TOC_ENTRIES_PER_PAGE = (842 - PDF_TOC_BOTTOM_MARGIN - PDF_TOC_FIRST_ENTRY_Y) // PDF_TOC_LINE_HEIGHT + 1
+
+def pdf_toc_page_count(file_count: int) -> int:
+    """目录需要的页数。"""
+    return max(1, math.ceil(file_count / PDF_TOC_ENTRIES_PER_PAGE))
+
+def _fit_toc_text(text: str, max_width: float) -> str:
+    """截断过长的目录条目，使其不覆盖右侧页码。"""
+    if fitz.get_text_length(text, fontname=PDF_TOC_FONT, fontsize=PDF_TOC_FONT_SIZE) <= max_width:
+        return text
+    while text and fitz.get_text_length(text + "…", fontname=PDF_TOC_FONT, fontsize=PDF_TOC_FONT_SIZE) > max_width:
+        text = text[:-1]
+    return text + "…"
+
+def write_pdf_toc_pages(merged_pdf, toc_pages: List[int], filenames: List[str], start_pages: List[int]) -> None:
+    """在预留的目录页上写入条目和页码，并为每个条目添加跳转到对应文件首页的链接。"""
+    number_width = fitz.get_text_length("00000", fontname=PDF_TOC_FONT, fontsize=PDF_TOC_FONT_SIZE)
+    for toc_index, page_num in enumerate(toc_pages):
+        page = merged_pdf[page_num]
+        title = "目录" if toc_index == 0 else "目录（续）"
+        page.insert_text((50, PDF_TOC_TITLE_Y), title, fontname=PDF_TOC_FONT, fontsize=20, color=(0, 0, 0))
+        first = toc_index * PDF_TOC_ENTRIES_PER_PAGE
+        for offset, i in enumerate(range(first, min(first + PDF_TOC_ENTRIES_PER_PAGE, len(filenames)))):
+            y = PDF_TOC_FIRST_ENTRY_Y + offset * PDF_TOC_LINE_HEIGHT
+            label = _fit_toc_text(f"{i+1}. {filenames[i]}", PDF_TOC_RIGHT - PDF_TOC_LEFT - number_width)
+            page.insert_text((PDF_TOC_LEFT, y), label, fontname=PDF_TOC_FONT, fontsize=PDF_TOC_FONT_SIZE, color=(0, 0, 0))
+            number = str(start_pages[i] + 1)
+            number_x = PDF_TOC_RIGHT - fitz.get_text_length(number, fontname="helv", fontsize=PDF_TOC_FONT_SIZE)
+            page.insert_text((number_x, y), number, fontname="helv", fontsize=PDF_TOC_FONT_SIZE, color=(0, 0, 0))
+            page.insert_link({
+                "kind": fitz.LINK_GOTO,
+                "from": fitz.Rect(PDF_TOC_LEFT, y - PDF_TOC_FONT_SIZE, PDF_TOC_RIGHT, y + 4),
+                "page": start_pages[i],
+                "to": fitz.Point(0, 0),
+            })
+
+def merge_pdf_contents(contents: List[bytes], filenames: List[str], merge_options: List[str], output_path: str) -> None:
+    """
+    按顺序合并多个 PDF 的内容，按选项插入目录页和空白页，保存到 output_path。
+    插入时记录每个文件的起始页，据此一次性生成书签（set_toc）和分页目录，不需要再遍历合并结果。
+    目录页在合并前按文件数预留，合并后只在这几页上写入条目。
+    """
+    # 创建一个新的PDF文档用于合并
+    merged_pdf = fitz.open()
+    add_toc = "add_toc" in merge_options
+
+    # 如果选择了添加目录页选项，先按文件数预留目录页，页码在合并完成后填写
+    toc_pages = []
+    if add_toc:
+        for _ in range(pdf_toc_page_count(len(contents))):
+            toc_pages.append(merged_pdf.page_count)
+            merged_pdf.new_page()
+
+    # 逐个处理每个PDF文件
+    start_pages = []
+    outline = []
+    for i, content in enumerate(contents):
+        # 打开PDF文件
+        pdf_document = fitz.open(stream=content, filetype="pdf")
+        
+        # 将所有页面插入到合并的PDF中，记录该文件的起始页（从 0 开始）
+        start = merged_pdf.page_count
+        start_pages.append(start)
+        merged_pdf.insert_pdf(pdf_document)
+
+        # 书签：每个文件一项，原文件自带的书签按起始页偏移后挂在其下
+        outline.append([1, filenames[i], start + 1])
+        outline += [
+            [level + 1, title, page + start if page > 0 else -1]
+            for level, title, page in pdf_document.get_toc(simple=True)
+        ]
+        
+        # 关闭当前PDF文件
+        pdf_document.close()
+        
+        # 如果选择了添加空白页选项，且不是最后一个文件，则添加空白页
+        if "add_blank_page" in merge_options and i < len(contents) - 1:
+            merged_pdf.new_page()
+
+    if add_toc:
+        write_pdf_toc_pages(merged_pdf, toc_pages, filenames, start_pages)
+        outline.insert(0, [1, "目录", toc_pages[0] + 1])
+    # set_toc 的页码从 1 开始，-1 表示没有目标页
+    merged_pdf.set_toc(outline)
+
+    merged_pdf.save(output_path)
+    merged_pdf.close()
+
 @app.post("/api/pdfmerge")
 async def pdfmerge_api(
+    request: Request,
     files: List[UploadFile] = File(...),
     merge_options: List[str] = Form(default=[])
 ):
@@ -730,61 +2957,33 @@ async def pdfmerge_api(
         raise HTTPException(status_code=400, detail="至少需要上传两个PDF文件才能合并。")
 
     try:
-        # 创建一个新的PDF文档用于合并
-        merged_pdf = fitz.open()
-        
-        # 如果选择了添加目录页选项，先添加目录页
-        if "add_toc" in merge_options:
-            toc_page = merged_pdf.new_page()
-            # 添加目录标题
-            toc_page.insert_text((50, 50), "目录", fontsize=20, color=(0, 0, 0))
-            y_position = 100
-            
-            # 添加各个文件的条目
-            for i, file in enumerate(files):
-                filename = sanitize_filename(file.filename)
-                toc_page.insert_text((70, y_position), f"{i+1}. {filename}", fontsize=12, color=(0, 0, 0))
-                y_position += 20
-
-        # 逐个处理每个PDF文件
-        for i, file in enumerate(files):
+        # 目录页包含文件名，文件名也作为缓存参数
+        cache_key = await result_cache_key("pdfmerge", {
+            "merge_options": sorted(merge_options), "filenames": [sanitize_filename(f.filename) for f in files]
+        }, files)
+        cached = await run_in_threadpool(lookup_cached_result, cache_key)
+        if cached:
+            return result_response(request, cached, "HIT")
+
+        # 逐个读取每个PDF文件
+        contents = []
+        for file in files:
             if not file.filename.lower().endswith('.pdf'):
                 raise HTTPException(status_code=400, detail=f"文件 {file.filename} 不是PDF格式。")
-            
-            # 读取文件内容
-            content = await file.read()
-            
-            # 打开PDF文件
-            pdf_document = fitz.open(stream=content, filetype="pdf")
-            
-            # 将所有页面插入到合并的PDF中
-            merged_pdf.insert_pdf(pdf_document)
-            
-            # 关闭当前PDF文件
-            pdf_document.close()
-            
-            # 如果选择了添加空白页选项，且不是最后一个文件，则添加空白页
-            if "add_blank_page" in merge_options and i < len(files) - 1:
-                blank_page = merged_pdf.new_page()
-                # 可以在空白页上添加"分页"文字（可选）
-                # blank_page.insert_text((50, 50), "分页", fontsize=12, color=(0.5, 0.5, 0.5))
+            contents.append(await file.read())
 
-        # 将合并后的PDF保存到内存中
-        output_buffer = BytesIO()
-        merged_pdf.save(output_buffer)
-        merged_pdf.close()
-        
-        # 重置缓冲区指针
-        output_buffer.seek(0)
+        # 合并并直接保存到结果目录；合并在线程池中执行
+        pdf_path = new_result_tmp_path(".pdf")
+        await run_in_threadpool(
+            merge_pdf_contents, contents, [sanitize_filename(f.filename) for f in files], merge_options, pdf_path
+        )
         
         # 生成文件名
         merged_filename = "merged_pdf.pdf"
         
-        return StreamingResponse(
-            output_buffer,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={merged_filename}"}
-        )
+        meta = await run_stage("save", save_result, pdf_path, merged_filename, "application/pdf")
+        await run_in_threadpool(store_cached_result, cache_key, meta)
+        return result_response(request, meta, "MISS")
 
     except HTTPException:
         raise
@@ -792,42 +2991,509 @@ async def pdfmerge_api(
         logger.error(f"PDF合并时发生错误: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
 
+# --- PDF 页面操作（拆分、提取、旋转、压缩）---
+# 上传内容先落盘，再由 PyMuPDF 按文件打开：页面对象按需读取，不会把整个文档载入内存。
+
+# 拆分得到的 PDF 已经是压缩格式，ZIP 中直接存储，避免对数 GB 的内容重复压缩
+PDF_SPLIT_ZIP_COMPRESSION = zipfile.ZIP_STORED
+PDF_ROTATION_ANGLES = {90, 180, 270}
+
+def spool_upload_to_disk(file: UploadFile, suffix: str = "") -> str:
+    """把上传文件复制到结果目录中的临时文件并返回路径（同步函数，需在线程池中调用）。"""
+    path = new_result_tmp_path(suffix)
+    file.file.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(file.file, f, 1024 * 1024)
+    return path
+
+def open_pdf_file(path: str):
+    """按文件打开 PDF；加密或损坏的文档抛出 ValueError。"""
+    try:
+        doc = fitz.open(path, filetype="pdf")
+    except Exception as e:
+        logger.error(f"打开 PDF 失败: {e}")
+        raise ValueError("无法打开 PDF 文件，文件可能已损坏。")
+    if doc.needs_pass:
+        doc.close()
+        raise ValueError("PDF 文件已加密，请先解除密码保护。")
+    return doc
+
+def parse_page_ranges(spec: str, page_count: int) -> List[Tuple[int, int]]:
+    """
+    解析页码范围，如 "1-3,5,8-"（页码从 1 开始，"8-" 表示到最后一页，"-3" 表示从第一页开始）。
+    返回从 0 开始的闭区间列表，顺序与输入一致。
+    """
+    ranges = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        match = re.fullmatch(r"(\d*)\s*(-?)\s*(\d*)", part)
+        if not match or not (match.group(1) or match.group(3)):
+            raise ValueError(f"页码范围格式无效: {part}")
+        start_text, dash, end_text = match.groups()
+        start = int(start_text) if start_text else 1
+        end = (int(end_text) if end_text else page_count) if dash else start
+        if start < 1 or end > page_count or start > end:
+            raise ValueError(f"页码范围 {part} 超出文档页数（共 {page_count} 页）。")
+        ranges.append((start - 1, end - 1))
+    if not ranges:
+        raise ValueError("请提供页码范围。")
+    return ranges
+
+def write_pdf_pages(src, ranges: List[Tuple[int, int]], output_path: str) -> None:
+    """把源文档中的若干页范围依次复制到新文档并保存；只复制这些页面引用到的对象。"""
+    out = fitz.open()
+    try:
+        for start, end in ranges:
+            out.insert_pdf(src, from_page=start, to_page=end)
+        out.save(output_path, garbage=3, deflate=True, use_objstms=1)
+    finally:
+        out.close()
+
+def split_pdf_file(path: str, ranges: Optional[str], every: Optional[int], base_name: str, zip_path: str) -> int:
+    """按页码范围（每个范围一个文件）或每 N 页拆分 PDF，逐个写入 ZIP，返回生成的文件数。"""
+    doc = open_pdf_file(path)
+    try:
+        if ranges:
+            ranges = parse_page_ranges(ranges, doc.page_count)
+        else:
+            ranges = [(start, min(start + every, doc.page_count) - 1) for start in range(0, doc.page_count, every)]
+        with zipfile.ZipFile(zip_path, "w", PDF_SPLIT_ZIP_COMPRESSION) as zip_file:
+            for start, end in ranges:
+                label = f"{start + 1}" if start == end else f"{start + 1}-{end + 1}"
+                part_path = new_result_tmp_path(".pdf")
+                try:
+                    write_pdf_pages(doc, [(start, end)], part_path)
+                    zip_file.write(part_path, f"{base_name}_p{label}.pdf")
+                finally:
+                    os.remove(part_path)
+        return len(ranges)
+    finally:
+        doc.close()
+
+def extract_pdf_pages(path: str, pages: str, output_path: str) -> None:
+    """按页码范围提取页面（可调整顺序或重复）为一个新的 PDF。"""
+    doc = open_pdf_file(path)
+    try:
+        write_pdf_pages(doc, parse_page_ranges(pages, doc.page_count), output_path)
+    finally:
+        doc.close()
+
+def rotate_pdf_pages(path: str, angle: int, pages: Optional[str]) -> str:
+    """
+    旋转指定页面（默认全部页面）。能增量保存时直接在原文件末尾追加修改的页面对象，
+    耗时与页数改动量相关而与文档大小无关；返回结果文件路径。
+    """
+    doc = open_pdf_file(path)
+    try:
+        ranges = parse_page_ranges(pages, doc.page_count) if pages else [(0, doc.page_count - 1)]
+        for start, end in ranges:
+            for page_num in range(start, end + 1):
+                page = doc[page_num]
+                page.set_rotation((page.rotation + angle) % 360)
+        if doc.can_save_incrementally():
+            doc.save(path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+            return path
+        # 需要修复的文档无法增量保存，退回完整保存
+        output_path = new_result_tmp_path(".pdf")
+        doc.save(output_path, garbage=1, deflate=True)
+    finally:
+        doc.close()
+    os.remove(path)
+    return output_path
+
+def compress_pdf_file(path: str, image_dpi: int, image_quality: int, output_path: str) -> None:
+    """
+    重新压缩 PDF：把分辨率高于目标的图片降采样并重新编码，
+    再清理未引用的对象、合并重复对象、压缩数据流并使用对象流保存。
+    """
+    doc = open_pdf_file(path)
+    try:
+        # 只处理明显超过目标分辨率的图片，避免对接近目标的图片反复有损压缩
+        doc.rewrite_images(dpi_threshold=int(image_dpi * 1.5), dpi_target=image_dpi, quality=image_quality)
+        doc.save(
+            output_path, garbage=3, clean=True, deflate=True,
+            deflate_images=True, deflate_fonts=True, use_objstms=1,
+        )
+    finally:
+        doc.close()
+
+def pdf_base_name(file: UploadFile) -> str:
+    return sanitize_filename(file.filename.rsplit(".", 1)[0]) or "document"
+
+async def run_pdf_operation(request: Request, file: UploadFile, operation: str, params: dict, handler, result_name: str, media_type: str):
+    """
+    PDF 页面操作的公共流程：校验、查结果缓存、上传落盘、在线程池中执行 handler(input_path) 并保存结果。
+    handler 返回结果文件路径（位于结果目录中）。
+    """
+    if not file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="上传的文件必须是 PDF 格式。")
+
+    input_path = None
+    try:
+        cache_key = await result_cache_key(operation, params, [file])
+        cached = await run_in_threadpool(lookup_cached_result, cache_key)
+        if cached:
+            return result_response(request, cached, "HIT")
+
+        input_path = await run_in_threadpool(spool_upload_to_disk, file, ".pdf")
+        output_path = await run_in_threadpool(handler, input_path)
+        if output_path == input_path:
+            input_path = None  # 原地修改的文件直接移入结果目录
+
+        meta = await run_stage("save", save_result, output_path, result_name, media_type)
+        await run_in_threadpool(store_cached_result, cache_key, meta)
+        return result_response(request, meta, "MISS")
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"PDF 页面操作 {operation} 失败: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
+    finally:
+        if input_path and os.path.exists(input_path):
+            os.remove(input_path)
+
+@app.post("/api/pdf/split")
+async def pdf_split_api(
+    request: Request,
+    file: UploadFile = File(..., description="PDF 文件"),
+    ranges: Optional[str] = Form(None, description="页码范围，每个范围拆分为一个文件，如 1-3,4-10,11-"),
+    every: Optional[int] = Form(None, description="每 N 页拆分为一个文件"),
+):
+    """按页码范围或固定页数拆分 PDF，返回包含各部分的 ZIP。"""
+    if bool(ranges) == bool(every):
+        raise HTTPException(status_code=400, detail="请提供页码范围（ranges）或每份页数（every）其中之一。")
+    if every is not None and every < 1:
+        raise HTTPException(status_code=400, detail="每份页数必须大于 0。")
+    base_name = pdf_base_name(file)
+
+    def handler(path: str) -> str:
+        zip_path = new_result_tmp_path(".zip")
+        split_pdf_file(path, ranges, every, base_name, zip_path)
+        return zip_path
+
+    return await run_pdf_operation(
+        request, file, "pdf-split", {"ranges": ranges, "every": every, "base_name": base_name},
+        handler, f"{base_name}_split.zip", "application/zip",
+    )
+
+@app.post("/api/pdf/extract")
+async def pdf_extract_api(
+    request: Request,
+    file: UploadFile = File(..., description="PDF 文件"),
+    pages: str = Form(..., description="要提取的页码，如 1-3,5,8-；按给出的顺序排列"),
+):
+    """提取指定页面为新的 PDF。"""
+    def handler(path: str) -> str:
+        output_path = new_result_tmp_path(".pdf")
+        extract_pdf_pages(path, pages, output_path)
+        return output_path
+
+    return await run_pdf_operation(
+        request, file, "pdf-extract", {"pages": pages},
+        handler, f"{pdf_base_name(file)}_extract.pdf", "application/pdf",
+    )
+
+@app.post("/api/pdf/rotate")
+async def pdf_rotate_api(
+    request: Request,
+    file: UploadFile = File(..., description="PDF 文件"),
+    angle: int = Form(..., description="顺时针旋转角度：90、180 或 270（-90 表示逆时针）"),
+    pages: Optional[str] = Form(None, description="要旋转的页码，默认全部页面"),
+):
+    """旋转指定页面，尽量以增量方式保存。"""
+    angle = angle % 360
+    if angle not in PDF_ROTATION_ANGLES:
+        raise HTTPException(status_code=400, detail="旋转角度必须是 90 的倍数且不为 0。")
+
+    return await run_pdf_operation(
+        request, file, "pdf-rotate", {"angle": angle, "pages": pages},
+        lambda path: rotate_pdf_pages(path, angle, pages),
+        f"{pdf_base_name(file)}_rotated.pdf", "application/pdf",
+    )
+
+@app.post("/api/pdf/compress")
+async def pdf_compress_api(
+    request: Request,
+    file: UploadFile = File(..., description="PDF 文件"),
+    image_dpi: int = Form(150, description="图片目标分辨率（DPI）"),
+    image_quality: int = Form(75, description="JPEG 图片质量，1-100"),
+):
+    """压缩 PDF：图片降采样并重新编码，清理和压缩对象。"""
+    if not 36 <= image_dpi <= 600:
+        raise HTTPException(status_code=400, detail="图片分辨率需在 36 到 600 DPI 之间。")
+    if not 1 <= image_quality <= 100:
+        raise HTTPException(status_code=400, detail="图片质量需在 1 到 100 之间。")
+
+    def handler(path: str) -> str:
+        output_path = new_result_tmp_path(".pdf")
+        compress_pdf_file(path, image_dpi, image_quality, output_path)
+        return output_path
+
+    return await run_pdf_operation(
+        request, file, "pdf-compress", {"image_dpi": image_dpi, "image_quality": image_quality},
+        handler, f"{pdf_base_name(file)}_compressed.pdf", "application/pdf",
+    )
+
+# --- PDF 表格提取 ---
+# 按页分块并行提取：每块在进程池中处理，结果以 JSON Lines 写入临时文件；
+# 主进程按页序逐块读取并以 openpyxl 只写模式写入 Excel，内存占用与文档页数无关。
+
+class PdfExtractMode(str, Enum):
+    TABLES = "tables"  # 识别页面中的表格
+    TEXT = "text"      # 按行提取文本
+
+# 每个任务处理的页数
+PDF_TABLE_CHUNK_PAGES = 20
+# 提取进程数；为 1 时在当前进程中顺序处理
+PDF_TABLE_WORKERS = int(os.environ.get("EXCELAB_PDF_WORKERS", min(4, os.cpu_count() or 1)))
+# 表头不同的表格各占一个工作表，超过上限的放入同一个“其他表格”工作表
+PDF_TABLE_MAX_SHEETS = 50
+# Excel 单个工作表的最大数据行数（不含表头）
+EXCEL_MAX_DATA_ROWS = 1_048_575
+# Excel 单元格中不允许出现的控制字符
+EXCEL_ILLEGAL_CHARS_PATTERN = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_pdf_process_pool = None
+_pdf_process_pool_lock = threading.Lock()
+
+def get_pdf_process_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """按需创建提取进程池（spawn 方式，避免在多线程的服务进程中 fork）。"""
+    global _pdf_process_pool
+    with _pdf_process_pool_lock:
+        if _pdf_process_pool is None:
+            _pdf_process_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=PDF_TABLE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_process_pool
+
+def shutdown_pdf_process_pool() -> None:
+    global _pdf_process_pool
+    with _pdf_process_pool_lock:
+        if _pdf_process_pool is not None:
+            _pdf_process_pool.shutdown(wait=False, cancel_futures=True)
+            _pdf_process_pool = None
+
+def normalize_table_header(names: list) -> List[str]:
+    """规范化表头：去掉换行和首尾空白，空列名用“列N”代替。"""
+    header = []
+    for i, name in enumerate(names):
+        name = " ".join(str(name).split()) if name is not None else ""
+        header.append(name or f"列{i + 1}")
+    return header
+
+def extract_pdf_page_chunk(path: str, start: int, end: int, mode: str, output_path: str) -> int:
+    """
+    提取第 start 到 end 页（从 0 开始，闭区间）的表格或文本行，逐行写入 output_path（JSON Lines），返回行数。
+    记录格式：["T", 页码, 表头] 表示一个新表格开始，["R", 页码, 单元格列表] 表示一行数据。
+    在进程池的工作进程中运行，也可在当前进程直接调用。
+    """
+    doc = fitz.open(path, filetype="pdf")
+    rows = 0
+    try:
+        with open(output_path, "w", encoding="utf-8") as out:
+            for page_num in range(start, end + 1):
+                page = doc[page_num]
+                if mode == PdfExtractMode.TEXT.value:
+                    for line in page.get_text("text", sort=True).splitlines():
+                        if line.strip():
+                            out.write(json.dumps(["R", page_num + 1, [line.strip()]], ensure_ascii=False) + "\n")
+                            rows += 1
+                    continue
+                for table in page.find_tables().tables:
+                    data = table.extract()
+                    # 表头在表格内部时，提取结果的第一行就是表头
+                    if not table.header.external:
+                        data = data[1:]
+                    out.write(json.dumps(["T", page_num + 1, normalize_table_header(table.header.names)], ensure_ascii=False) + "\n")
+                    for cells in data:
+                        out.write(json.dumps(["R", page_num + 1, cells], ensure_ascii=False) + "\n")
+                        rows += 1
+    finally:
+        doc.close()
+    return rows
+
+class PdfTableWorkbookWriter:
+    """
+    以 openpyxl 只写模式流式写入提取结果。
+    表头相同的表格（如跨页续表）写入同一工作表，超过 Excel 行数上限时自动续到新工作表。
+    """
+    def __init__(self, mode: str):
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.mode = mode
+        self.sheets = {}  # 表头 -> [工作表, 已写行数, 基础名称, 分表序号]
+        self.current = None
+        self.tables = 0
+        self.rows = 0
+        if mode == PdfExtractMode.TEXT.value:
+            self.current = self._sheet(("文本",), "文本")
+
+    def _new_worksheet(self, name: str, header: tuple):
+        worksheet = self.workbook.create_sheet(title=name)
+        worksheet.append(["页码", *header])
+        return worksheet
+
+    def _sheet(self, header: tuple, name: Optional[str] = None) -> list:
+        if header not in self.sheets:
+            if name is None and len(self.sheets) >= PDF_TABLE_MAX_SHEETS:
+                header = ("__other__",)
+                if header not in self.sheets:
+                    self.sheets[header] = [self._new_worksheet("其他表格", ()), 0, "其他表格", 1]
+                return self.sheets[header]
+            name = name or f"表格{len(self.sheets) + 1}"
+            self.sheets[header] = [self._new_worksheet(name, header), 0, name, 1]
+        return self.sheets[header]
+
+    def start_table(self, page: int, header: List[str]) -> None:
+        self.tables += 1
+        self.current = self._sheet(tuple(header))
+        if self.current[2] == "其他表格":
+            # 表头各不相同的表格放在一起时，保留每个表格自己的表头行
+            self._append(page, header)
+
+    def _append(self, page: int, cells: list) -> None:
+        sheet = self.current
+        if sheet[1] >= EXCEL_MAX_DATA_ROWS:
+            sheet[3] += 1
+            sheet[0] = self._new_worksheet(f"{sheet[2]}_{sheet[3]}", ())
+            sheet[1] = 0
+        sheet[0].append([page, *[
+            EXCEL_ILLEGAL_CHARS_PATTERN.sub("", cell) if isinstance(cell, str) else cell for cell in cells
+        ]])
+        sheet[1] += 1
+
+    def append_row(self, page: int, cells: list) -> None:
+        self._append(page, cells)
+        self.rows += 1
+
+    def write_part(self, part_path: str) -> None:
+        """按顺序读取一个分块的提取结果并写入。"""
+        with open(part_path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record[0] == "T":
+                    self.start_table(record[1], record[2])
+                else:
+                    self.append_row(record[1], record[2])
+
+    def save(self, output_path: str) -> None:
+        if self.rows == 0:
+            if self.mode == PdfExtractMode.TABLES.value:
+                raise ValueError("未在 PDF 中识别到表格，可尝试使用文本模式提取。")
+            raise ValueError("未在 PDF 中提取到文本，扫描件需要先进行文字识别。")
+        self.workbook.save(output_path)
+
+def convert_pdf_to_workbook(path: str, mode: str, pages: Optional[str], output_path: str) -> dict:
+    """把 PDF 中的表格或文本提取为 Excel，多页文档按页分块并行处理；返回表格数和行数。"""
+    doc = open_pdf_file(path)
+    try:
+        ranges = parse_page_ranges(pages, doc.page_count) if pages else [(0, doc.page_count - 1)]
+    finally:
+        doc.close()
+    chunks = [
+        (chunk_start, min(chunk_start + PDF_TABLE_CHUNK_PAGES, end + 1) - 1)
+        for start, end in ranges
+        for chunk_start in range(start, end + 1, PDF_TABLE_CHUNK_PAGES)
+    ]
+    part_paths = [new_result_tmp_path(".jsonl") for _ in chunks]
+
+    futures = []
+    try:
+        if PDF_TABLE_WORKERS > 1 and len(chunks) > 1:
+            pool = get_pdf_process_pool()
+            futures = [
+                pool.submit(extract_pdf_page_chunk, path, start, end, mode, part_path)
+                for (start, end), part_path in zip(chunks, part_paths)
+            ]
+            wait_part = lambda i: futures[i].result()
+        else:
+            wait_part = lambda i: extract_pdf_page_chunk(path, *chunks[i], mode, part_paths[i])
+
+        writer = PdfTableWorkbookWriter(mode)
+        for i, part_path in enumerate(part_paths):
+            wait_part(i)
+            writer.write_part(part_path)
+            os.remove(part_path)
+        writer.save(output_path)
+        return {"tables": writer.tables, "rows": writer.rows, "chunks": len(chunks)}
+    except BrokenProcessPool:
+        # 工作进程异常退出（如内存不足被终止），下次请求重新创建进程池
+        shutdown_pdf_process_pool()
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                with contextlib.suppress(OSError):
+                    os.remove(part_path)
+
+@app.post("/api/pdf-to-table")
+async def pdf_to_table_api(
+    request: Request,
+    file: UploadFile = File(..., description="PDF 文件"),
+    mode: PdfExtractMode = Form(PdfExtractMode.TABLES, description="tables 识别表格，text 按行提取文本"),
+    pages: Optional[str] = Form(None, description="页码范围，如 1-10,15；默认全部页面"),
+):
+    """
+    提取 PDF 中的表格（或文本行）并导出为 Excel。
+    表头相同的表格合并到同一工作表，每行附带来源页码。
+    """
+    base_name = pdf_base_name(file)
+
+    def handler(path: str) -> str:
+        output_path = new_result_tmp_path(".xlsx")
+        stats = convert_pdf_to_workbook(path, mode.value, pages, output_path)
+        logger.info(f"PDF 表格提取完成: {base_name}, {stats}")
+        return output_path
+
+    return await run_pdf_operation(
+        request, file, "pdf-to-table", {"mode": mode.value, "pages": pages},
+        handler, f"{base_name}_tables.xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
 @app.post("/api/deduplicate/preview")
 async def deduplicate_preview_api(
     file: UploadFile = File(...),
     deduplicate_column: str = Form(...),
     logic: DeduplicateLogic = Form(...),
     value_column: Optional[str] = Form(None),
+    match_mode: DeduplicateMatch = Form(DeduplicateMatch.EXACT),
+    similarity_threshold: float = Form(0.9),
+    layout: PreviewLayout = Form(PreviewLayout.RECORDS),
     preview_rows: int = Form(5) # 获取前N行用于预览
 ):
     """
-    接收一个表格文件和去重选项，返回去重预览（统计信息和前几行数据）。
+    接收一个表格文件和去重选项，返回去重预览（统计信息、重复簇分布和前几行数据）。
     """
     if not file:
         raise HTTPException(status_code=400, detail="没有提供文件。")
 
     try:
-        content = BytesIO(await file.read())
-        filename = file.filename.lower()
-        df_original = None
-
-        if filename.endswith((".xlsx", ".xls")):
-            excel_file = pd.ExcelFile(content, engine='openpyxl')
-            df_original = excel_file.parse(excel_file.sheet_names[0]) # 通常处理第一个sheet
-        elif filename.endswith(".csv"):
-            try:
-                df_original = pd.read_csv(content)
-            except UnicodeDecodeError:
-                content.seek(0)
-                df_original = pd.read_csv(content, encoding='gbk')
+        dataframes = await run_stage("parse", parse_table_bytes, await file.read(), file.filename)
+        df_original = dataframes[0] if dataframes else None
 
         if df_original is None or df_original.empty:
             raise HTTPException(status_code=400, detail="文件为空或无法解析。")
 
         original_rows, original_cols = df_original.shape
         
+        # 计算重复簇，统计与去重共用同一份结果
+        if deduplicate_column not in df_original.columns:
+            raise ValueError(f"去重列 '{deduplicate_column}' 在数据中不存在")
+        clusters = await run_stage("transform", build_dedup_clusters, df_original[deduplicate_column], match_mode, similarity_threshold)
+        cluster_stats = summarize_dedup_clusters(df_original, deduplicate_column, clusters)
+
         # 应用去重
-        df_deduplicated = deduplicate_dataframe(df_original, deduplicate_column, logic, value_column)
+        df_deduplicated = await run_stage(
+            "transform", deduplicate_dataframe,
+            df_original, deduplicate_column, logic, value_column, match_mode, similarity_threshold, clusters
+        )
         
         deduplicated_rows, deduplicated_cols = df_deduplicated.shape
 
@@ -837,11 +3503,10 @@ async def deduplicate_preview_api(
         # 获取预览数据 (去重后的)
         preview_df = df_deduplicated.head(preview_rows)
         # 使用 prepare_dataframe_for_json_serialization 处理数据类型
-        preview_df_processed = prepare_dataframe_for_json_serialization(preview_df)
-        preview_json = preview_df_processed.to_dict(orient='records')
+        preview_json = dataframe_to_preview_data(preview_df, layout)
         columns = preview_df.columns.tolist()
 
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "original_rows": original_rows,
             "original_cols": original_cols,
             "deduplicated_rows": deduplicated_rows,
@@ -851,7 +3516,9 @@ async def deduplicate_preview_api(
             "preview_data": preview_json,
             "logic": logic,
             "deduplicate_column": deduplicate_column,
-            "value_column": value_column
+            "value_column": value_column,
+            "match_mode": match_mode,
+            "cluster_stats": cluster_stats
         })
 
     except ValueError as e:
@@ -865,10 +3532,13 @@ async def deduplicate_preview_api(
 
 @app.post("/api/deduplicate")
 async def deduplicate_file_api(
+    request: Request,
     file: UploadFile = File(...),
     deduplicate_column: str = Form(...),
     logic: DeduplicateLogic = Form(...),
-    value_column: Optional[str] = Form(None)
+    value_column: Optional[str] = Form(None),
+    match_mode: DeduplicateMatch = Form(DeduplicateMatch.EXACT),
+    similarity_threshold: float = Form(0.9)
 ):
     """
     接收一个表格文件和去重选项，返回去重后的文件。
@@ -877,33 +3547,341 @@ async def deduplicate_file_api(
         raise HTTPException(status_code=400, detail="没有提供文件。")
 
     try:
-        content = BytesIO(await file.read())
-        filename = file.filename.lower()
-        df_original = None
-
-        if filename.endswith((".xlsx", ".xls")):
-            excel_file = pd.ExcelFile(content, engine='openpyxl')
-            df_original = excel_file.parse(excel_file.sheet_names[0])
-        elif filename.endswith(".csv"):
-            try:
-                df_original = pd.read_csv(content)
-            except UnicodeDecodeError:
-                content.seek(0)
-                df_original = pd.read_csv(content, encoding='gbk')
+        # 相同输入和参数的请求直接返回缓存结果
+        cache_key = await result_cache_key("deduplicate", {
+            "deduplicate_column": deduplicate_column, "logic": logic, "value_column": value_column,
+            "match_mode": match_mode, "similarity_threshold": similarity_threshold
+        }, [file])
+        cached = await run_in_threadpool(lookup_cached_result, cache_key)
+        if cached:
+            return result_response(request, cached, "HIT")
+
+        dataframes = await run_stage("parse", parse_table_bytes, await file.read(), file.filename)
+        df_original = dataframes[0] if dataframes else None
 
         if df_original is None or df_original.empty:
             raise HTTPException(status_code=400, detail="文件为空或无法解析。")
 
         # 应用去重
-        df_deduplicated = deduplicate_dataframe(df_original, deduplicate_column, logic, value_column)
+        df_deduplicated = await run_stage(
+            "transform", deduplicate_dataframe,
+            df_original, deduplicate_column, logic, value_column, match_mode, similarity_threshold
+        )
+
+        # 将去重后的 DataFrame 导出为 Excel 并保存结果
+        meta = await run_stage(
+            "save", save_result,
+            await run_stage("serialize", dataframe_to_excel_bytes, df_deduplicated), "deduplicated_data.xlsx",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+        await run_in_threadpool(store_cached_result, cache_key, meta)
+        return result_response(request, meta, "MISS")
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise # Re-raise HTTPExceptions
+    except Exception as e:
+        logger.error(f"去重文件时发生错误: {e}")
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
+
+# --- 处理流水线 ---
+# 在同一个 DataFrame 上按顺序执行合并、清理、去重、拆分等步骤，只在最后序列化一次，
+# 省去逐个功能下载再上传时每一步的 Excel 读写。
+
+class PipelineOp(str, Enum):
+    MERGE = "merge"              # 合并多个文件/工作表，只能作为第一步
+    CLEAN = "clean"
+    DEDUPLICATE = "deduplicate"
+    SPLIT = "split"              # 按列拆分为多个文件，只能作为最后一步
+
+def _pipeline_enum(enum_cls, value, field: str, index: int):
+    try:
+        return enum_cls(value)
+    except ValueError:
+        choices = "、".join(item.value for item in enum_cls)
+        raise ValueError(f"第 {index} 步的 {field} 取值无效: {value}（可选: {choices}）")
+
+def parse_pipeline_steps(raw: str) -> List[dict]:
+    """
+    解析并校验流水线步骤（JSON 数组），例如:
+    [{"op": "merge", "mode": "outer"}, {"op": "clean", "trim_spaces": true},
+     {"op": "deduplicate", "column": "客户", "logic": "max", "value_column": "金额"}, {"op": "split", "column": "城市"}]
+    """
+    try:
+        items = json.loads(raw)
+    except json.JSONDecodeError:
+        raise ValueError("步骤必须是 JSON 数组。")
+    if not isinstance(items, list) or not items:
+        raise ValueError("请至少提供一个处理步骤。")
+
+    steps = []
+    for index, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f"第 {index} 步必须是 JSON 对象。")
+        op = _pipeline_enum(PipelineOp, item.get("op"), "op", index)
+        if op == PipelineOp.MERGE:
+            if index != 1:
+                raise ValueError("合并步骤只能作为第一步。")
+            steps.append({"op": op, "mode": _pipeline_enum(MergeMode, item.get("mode", MergeMode.OUTER.value), "mode", index)})
+        elif op == PipelineOp.CLEAN:
+            options = {key: item[key] for key in CleanOptions.model_fields if key in item}
+            if any(not isinstance(value, bool) for value in options.values()):
+                raise ValueError(f"第 {index} 步的清理选项必须是 true 或 false。")
+            steps.append({"op": op, "options": CleanOptions(**options)})
+        elif op == PipelineOp.DEDUPLICATE:
+            if not item.get("column"):
+                raise ValueError(f"第 {index} 步缺少去重列 column。")
+            threshold = item.get("similarity_threshold", 0.9)
+            if not isinstance(threshold, (int, float)):
+                raise ValueError(f"第 {index} 步的 similarity_threshold 必须是数字。")
+            steps.append({
+                "op": op,
+                "column": item["column"],
+                "logic": _pipeline_enum(DeduplicateLogic, item.get("logic"), "logic", index),
+                "value_column": item.get("value_column"),
+                "match_mode": _pipeline_enum(DeduplicateMatch, item.get("match_mode", DeduplicateMatch.EXACT.value), "match_mode", index),
+                "similarity_threshold": float(threshold),
+            })
+        else:
+            if index != len(items):
+                raise ValueError("拆分步骤只能作为最后一步。")
+            if not item.get("column"):
+                raise ValueError(f"第 {index} 步缺少拆分列 column。")
+            steps.append({"op": op, "column": item["column"]})
+    return steps
+
+def run_pipeline(dataframes: List[pd.DataFrame], steps: List[dict]):
+    """
+    依次执行合并、清理、去重步骤（拆分只在写出结果时执行），
+    返回 (结果 DataFrame, 每步的行数和耗时)。
+    """
+    if len(dataframes) > 1 and steps[0]["op"] != PipelineOp.MERGE:
+        raise ValueError(f"上传了 {len(dataframes)} 个表格（文件或工作表），第一步需要是合并（merge）。")
+
+    df = dataframes[0]
+    timings = []
+    for index, step in enumerate(steps, start=1):
+        if step["op"] == PipelineOp.SPLIT:
+            break
+        rows_in = sum(len(frame) for frame in dataframes) if step["op"] == PipelineOp.MERGE else len(df)
+        started = time.perf_counter()
+        if step["op"] == PipelineOp.MERGE:
+            # 保留 NaN 等原始类型，后续去重等步骤才能正确比较；JSON 处理只在预览时进行
+            df = concat_dataframes(dataframes, step["mode"])
+        elif step["op"] == PipelineOp.CLEAN:
+            df = clean_dataframe(df, step["options"])
+        else:
+            df = deduplicate_dataframe(
+                df, step["column"], step["logic"], step["value_column"], step["match_mode"], step["similarity_threshold"]
+            )
+        timings.append({
+            "step": index,
+            "op": step["op"].value,
+            "rows_in": rows_in,
+            "rows_out": len(df),
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+    return df, timings
+
+def server_timing_header(timings: List[dict]) -> str:
+    """按 Server-Timing 规范输出各阶段耗时，浏览器开发者工具可直接展示。"""
+    return ", ".join(f'{t["step"]}-{t["op"]};dur={t["ms"]}' for t in timings)
+
+@app.post("/api/pipeline/preview")
+async def pipeline_preview_api(
+    files: List[UploadFile] = File(...),
+    steps: str = Form(..., description="处理步骤（JSON 数组）"),
+    layout: PreviewLayout = Form(PreviewLayout.RECORDS),
+    preview_rows: int = Form(10)
+):
+    """
+    执行流水线并返回结果预览、每一步的行数变化和耗时；最后一步为拆分时返回各分组的行数。
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="没有提供任何文件。")
+
+    try:
+        parsed_steps = parse_pipeline_steps(steps)
+
+        started = time.perf_counter()
+        dataframes = await process_uploaded_files(files)
+        parse_ms = round((time.perf_counter() - started) * 1000, 1)
+        df, timings = await run_stage("transform", run_pipeline, dataframes, parsed_steps)
+        timings.insert(0, {"step": 0, "op": "parse", "rows_in": None, "rows_out": sum(len(frame) for frame in dataframes), "ms": parse_ms})
+
+        response = {
+            "steps": timings,
+            "columns": df.columns.tolist(),
+            "data": dataframe_to_preview_data(df.head(preview_rows), layout),
+            "total_rows": len(df),
+        }
+        if parsed_steps[-1]["op"] == PipelineOp.SPLIT:
+            split_column = parsed_steps[-1]["column"]
+            if split_column not in df.columns:
+                raise ValueError(f"指定的拆分列 '{split_column}' 在数据中不存在。")
+            group_sizes = df.groupby(split_column, sort=False).size()
+            response["split_groups"] = {
+                "count": len(group_sizes),
+                "sizes": [{"name": str(name), "rows": int(rows)} for name, rows in group_sizes.head(50).items()],
+            }
+        return FastJSONResponse(content=response)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"流水线预览时发生错误: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
+
+@app.post("/api/pipeline")
+async def pipeline_api(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    steps: str = Form(..., description="处理步骤（JSON 数组）"),
+    output_format: str = Form("xlsx", description="输出格式，xlsx 或 csv；最后一步为拆分时输出 ZIP")
+):
+    """
+    按顺序执行处理步骤，只序列化最终结果；各阶段耗时通过 Server-Timing 响应头返回。
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="没有提供任何文件。")
+    if output_format not in ("xlsx", "csv"):
+        raise HTTPException(status_code=400, detail="输出格式必须是 xlsx 或 csv。")
+
+    try:
+        parsed_steps = parse_pipeline_steps(steps)
+        split_last = parsed_steps[-1]["op"] == PipelineOp.SPLIT
+
+        # 相同输入和步骤的请求直接返回缓存结果
+        cache_key = await result_cache_key("pipeline", {
+            "steps": json.loads(steps), "output_format": "zip" if split_last else output_format
+        }, files)
+        cached = await run_in_threadpool(lookup_cached_result, cache_key)
+        if cached:
+            return result_response(request, cached, "HIT")
+
+        started = time.perf_counter()
+        dataframes = await process_uploaded_files(files)
+        timings = [{"step": 0, "op": "parse", "ms": round((time.perf_counter() - started) * 1000, 1)}]
+        df, step_timings = await run_stage("transform", run_pipeline, dataframes, parsed_steps)
+        timings += step_timings
+
+        # 只在最后写出一次结果
+        started = time.perf_counter()
+        if split_last:
+            zip_path = new_result_tmp_path(".zip")
+            await run_stage("serialize", write_split_zip, df, parsed_steps[-1]["column"], zip_path)
+            meta = await run_stage("save", save_result, zip_path, "pipeline_split.zip", "application/zip")
+        elif output_format == "csv":
+            csv_path = new_result_tmp_path(".csv")
+            # utf-8-sig 便于 Excel 直接打开中文 CSV
+            await run_stage("serialize", df.to_csv, csv_path, index=False, encoding="utf-8-sig")
+            meta = await run_stage("save", save_result, csv_path, "pipeline_result.csv", "text/csv")
+        else:
+            meta = await run_stage(
+                "save", save_result,
+                await run_stage("serialize", dataframe_to_excel_bytes, df), "pipeline_result.xlsx",
+                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+        timings.append({"step": len(parsed_steps) + 1, "op": "write", "ms": round((time.perf_counter() - started) * 1000, 1)})
+        await run_in_threadpool(store_cached_result, cache_key, meta)
+
+        response = result_response(request, meta, "MISS")
+        response.headers["Server-Timing"] = server_timing_header(timings)
+        return response
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"执行流水线时发生错误: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
+
+@app.post("/api/join/preview")
+async def join_preview_api(
+    left_file: UploadFile = File(...),
+    right_file: UploadFile = File(...),
+    left_on: str = Form(...),
+    right_on: Optional[str] = Form(None),
+    how: JoinHow = Form(JoinHow.LEFT),
+    trim_keys: bool = Form(True),
+    casefold_keys: bool = Form(False),
+    first_match_only: bool = Form(True),
+    layout: PreviewLayout = Form(PreviewLayout.RECORDS),
+    preview_rows: int = Form(5) # 获取前N行用于预览
+):
+    """
+    接收主表、查找表和关联选项，返回匹配统计和关联结果的前几行。
+    """
+    try:
+        left_df = await read_single_table(left_file)
+        right_df = await read_single_table(right_file)
+        left_columns = parse_column_list(left_on)
+        right_columns = parse_column_list(right_on) or left_columns
+
+        stats = await run_stage(
+            "transform", join_match_statistics,
+            left_df, right_df, left_columns, right_columns, trim_keys, casefold_keys
+        )
+
+        # 预览只需关联主表的前几行，避免构造完整结果
+        preview_df = (await run_stage(
+            "transform", join_dataframes,
+            left_df.head(preview_rows), right_df, left_columns, right_columns,
+            how, trim_keys, casefold_keys, first_match_only
+        )).head(preview_rows)
+
+        return FastJSONResponse(content={
+            **stats,
+            "preview_columns": [str(col) for col in preview_df.columns],
+            "preview_data": dataframe_to_preview_data(preview_df, layout),
+            "how": how
+        })
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise # Re-raise HTTPExceptions
+    except Exception as e:
+        logger.error(f"生成关联预览时发生错误: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
 
-        # 将去重后的 DataFrame 导出为 Excel 字节流
-        output = dataframe_to_excel_bytes(df_deduplicated)
+
+@app.post("/api/join")
+async def join_file_api(
+    left_file: UploadFile = File(...),
+    right_file: UploadFile = File(...),
+    left_on: str = Form(...),
+    right_on: Optional[str] = Form(None),
+    how: JoinHow = Form(JoinHow.LEFT),
+    trim_keys: bool = Form(True),
+    casefold_keys: bool = Form(False),
+    first_match_only: bool = Form(True)
+):
+    """
+    接收主表和查找表，按一个或多个关联列做哈希关联，返回关联后的文件。
+    """
+    try:
+        left_df = await read_single_table(left_file)
+        right_df = await read_single_table(right_file)
+        left_columns = parse_column_list(left_on)
+        right_columns = parse_column_list(right_on) or left_columns
+
+        joined_df = await run_stage(
+            "transform", join_dataframes,
+            left_df, right_df, left_columns, right_columns,
+            how, trim_keys, casefold_keys, first_match_only
+        )
+        joined_df = await run_stage("serialize", prepare_dataframe_for_json_serialization, joined_df)
+        output = await run_stage("serialize", dataframe_to_excel_bytes, joined_df)
 
         return StreamingResponse(
             output,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=deduplicated_data.xlsx"}
+            headers={"Content-Disposition": "attachment; filename=joined_data.xlsx"}
         )
 
     except ValueError as e:
@@ -911,16 +3889,184 @@ async def deduplicate_file_api(
     except HTTPException:
         raise # Re-raise HTTPExceptions
     except Exception as e:
-        logger.error(f"去重文件时发生错误: {e}")
+        logger.error(f"关联文件时发生错误: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
+
+@app.post("/api/aggregate/preview")
+async def aggregate_preview_api(
+    file: UploadFile = File(...),
+    group_by: str = Form(...),
+    value_columns: str = Form(...),
+    funcs: str = Form("sum"),
+    pivot_column: Optional[str] = Form(None),
+    layout: PreviewLayout = Form(PreviewLayout.RECORDS),
+    preview_rows: int = Form(10) # 获取前N行用于预览
+):
+    """
+    接收一个表格文件和分组聚合选项，返回聚合结果的统计信息和前几行。
+    """
+    try:
+        agg_funcs = parse_agg_funcs(funcs)
+        result_df = await run_stage(
+            "transform", aggregate_chunks,
+            iter_upload_table_chunks(file), parse_column_list(group_by),
+            parse_column_list(value_columns), agg_funcs, pivot_column or None
+        )
+
+        preview_df = result_df.head(preview_rows)
+
+        return FastJSONResponse(content={
+            "group_count": len(result_df),
+            "result_cols": len(result_df.columns),
+            "preview_columns": [str(col) for col in preview_df.columns],
+            "preview_data": dataframe_to_preview_data(preview_df, layout)
+        })
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise # Re-raise HTTPExceptions
+    except Exception as e:
+        logger.error(f"生成聚合预览时发生错误: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
+
+
+@app.post("/api/aggregate")
+async def aggregate_file_api(
+    file: UploadFile = File(...),
+    group_by: str = Form(...),
+    value_columns: str = Form(...),
+    funcs: str = Form("sum"),
+    pivot_column: Optional[str] = Form(None)
+):
+    """
+    接收一个表格文件，按一个或多个分组列聚合（可选透视），返回聚合结果文件。
+    """
+    try:
+        agg_funcs = parse_agg_funcs(funcs)
+        result_df = await run_stage(
+            "transform", aggregate_chunks,
+            iter_upload_table_chunks(file), parse_column_list(group_by),
+            parse_column_list(value_columns), agg_funcs, pivot_column or None
+        )
+        result_df = await run_stage("serialize", prepare_dataframe_for_json_serialization, result_df)
+        output = await run_stage("serialize", dataframe_to_excel_bytes, result_df)
+
+        return StreamingResponse(
+            output,
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": "attachment; filename=aggregated_data.xlsx"}
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise # Re-raise HTTPExceptions
+    except Exception as e:
+        logger.error(f"聚合文件时发生错误: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
 
+def prepare_image_for_format(img, input_ext: str, output_pil_format: str):
+    """处理多帧图片的当前帧、透明通道等与目标格式的兼容问题，返回可直接保存的图像。"""
+    # 多帧 GIF 的帧转为 RGB（输出 GIF 时保持原样）
+    if input_ext == ".gif" and getattr(img, "n_frames", 1) > 1:
+        return img.convert("RGB") if output_pil_format != "GIF" else img
+    # 对于透明通道等兼容性问题做处理
+    if img.mode in ("RGBA", "LA", "P") and output_pil_format == "JPEG":
+        # JPEG 不支持透明通道，转为 RGB 白底
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        if img.mode == "P":
+            img = img.convert("RGBA")
+        alpha = img.split()[-1]  # 获取 alpha 通道
+        background.paste(img, mask=alpha)
+        return background
+    if img.mode != "RGB" and output_pil_format == "JPEG":
+        return img.convert("RGB")
+    if img.mode == "P" and output_pil_format in ("PNG", "WEBP", "TIFF"):
+        # 尽量保留质量
+        return img.convert("RGBA" if img.info.get("transparency") else "RGB")
+    return img
+
+def save_animated_image(img, output_pil_format: str, target) -> None:
+    """把多帧图片的全部帧保存为一个动画或多页文件；Pillow 保存时逐帧解码、编码，不会同时持有全部帧。"""
+    if output_pil_format not in ANIMATED_OUTPUT_FORMATS:
+        raise ValueError(f"{output_pil_format} 格式不支持多帧，请选择 GIF、WebP、PNG 或 TIFF，或逐帧输出。")
+    params = {}
+    if output_pil_format in ("WEBP", "PNG"):
+        # WebP 和 APNG 只读取第一帧的时长，需要显式传入每一帧的时长（多页 TIFF 没有时长，按 100 毫秒）
+        params["duration"] = [frame.info.get("duration", 100) for frame in ImageSequence.Iterator(img)]
+        params["loop"] = img.info.get("loop", 0)
+        img.seek(0)
+    img.save(target, format=output_pil_format, save_all=True, **params)
+
+def convert_image(source, input_ext: str, output_format: str, target, frames: ImageFrames = ImageFrames.FIRST) -> None:
+    """
+    把图片转换为 output_format（扩展名，如 ".png"）；frames 为 animated 时多帧图片的全部帧保存为一个文件。
+    source、target 可以是文件路径或字节流，批处理时直接读写磁盘文件。
+    """
+    output_pil_format = FORMAT_MAP[output_format]  # 获取 PIL 使用的格式名
+    with Image.open(source) as img:
+        if frames == ImageFrames.ANIMATED and getattr(img, "n_frames", 1) > 1:
+            save_animated_image(img, output_pil_format, target)
+            return
+        converted = prepare_image_for_format(img, input_ext, output_pil_format)
+        converted.save(target, format=output_pil_format, optimize=True)
+
+def iter_converted_frames(source, input_ext: str, output_format: str) -> Iterator[Tuple[int, int, bytes]]:
+    """逐帧转换图片（GIF 动画、多页 TIFF 等），依次产出 (帧序号, 帧数, 编码后的字节)，同一时间只解码一帧。"""
+    output_pil_format = FORMAT_MAP[output_format]
+    with Image.open(source) as img:
+        frame_count = getattr(img, "n_frames", 1)
+        for index, frame in enumerate(ImageSequence.Iterator(img)):
+            buffer = BytesIO()
+            prepare_image_for_format(frame, input_ext, output_pil_format).save(buffer, format=output_pil_format, optimize=True)
+            yield index, frame_count, buffer.getvalue()
+
+def add_converted_image_to_zip(zipf: zipfile.ZipFile, source, filename: str, output_format: str, frames: ImageFrames) -> None:
+    """转换一张图片并写入 ZIP；frames 为 all 时多帧图片的每一帧写为单独的文件（文件名加帧序号）。"""
+    base_name, input_ext = os.path.splitext(filename)
+    input_ext = input_ext.lower()
+    if frames == ImageFrames.ALL:
+        for index, frame_count, data in iter_converted_frames(source, input_ext, output_format):
+            suffix = f"_{index + 1:03d}" if frame_count > 1 else ""
+            zipf.writestr(f"{base_name}{suffix}{output_format}", data)
+    else:
+        output_buffer = BytesIO()
+        convert_image(source, input_ext, output_format, output_buffer, frames)
+        zipf.writestr(f"{base_name}{output_format}", output_buffer.getvalue())
+
+def convert_images_to_zip(files: List[UploadFile], output_format: str, frames: ImageFrames, zip_path: str) -> None:
+    """逐个转换上传的图片并写入 ZIP 文件（同步函数，需在线程池中调用）；上传内容按文件读取，不整体载入内存。"""
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for file in files:
+            filename = file.filename.strip()
+            if not filename:
+                continue
+
+            input_ext = os.path.splitext(filename)[1].lower()
+            if input_ext not in SUPPORTED_INPUT_FORMATS:
+                logger.warning(f"跳过不支持的文件格式: {filename}")
+                continue
+
+            try:
+                file.file.seek(0)
+                add_converted_image_to_zip(zipf, file.file, filename, output_format, frames)
+            except Image.UnidentifiedImageError:
+                raise HTTPException(status_code=400, detail=f"无法处理图片文件 '{filename}': 无法识别的图片格式")
+            except Exception as e:
+                logger.error(f"转换图片失败 {filename}: {e}")
+                raise HTTPException(status_code=400, detail=f"无法处理图片文件 '{filename}': {str(e)}")
+
 @app.post("/api/image_convert")
 async def image_convert_api(
+    request: Request,
     files: list[UploadFile] = File(...),
-    format: str = Form(...)
+    format: str = Form(...),
+    frames: ImageFrames = Form(ImageFrames.FIRST, description="多帧图片（GIF 动画、多页 TIFF）的处理方式：first、all 或 animated")
 ):
     """
     接收一个或多个图片文件，将其转换为指定格式，并打包为 ZIP 返回。
+    多帧图片可以只转换第一帧、每一帧输出为单独的文件，或全部帧保存为动画（如 GIF 转动画 WebP）。
     """
     if not files or all(f.filename == "" for f in files):
         raise HTTPException(status_code=400, detail="没有提供任何文件。")
@@ -932,6 +4078,8 @@ async def image_convert_api(
 
     if format not in FORMAT_MAP:
         raise HTTPException(status_code=400, detail=f"不支持的目标格式: {format}")
+    if frames == ImageFrames.ANIMATED and FORMAT_MAP[format] not in ANIMATED_OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"{format} 格式不支持动画，请选择 gif、webp、png 或 tiff。")
 
     # 过滤空文件
     valid_files = [f for f in files if f.filename]
@@ -939,84 +4087,162 @@ async def image_convert_api(
         raise HTTPException(status_code=400, detail="提供的文件均无效。")
 
     output_format = format  # 保存目标扩展名
-    output_pil_format = FORMAT_MAP[output_format]  # 获取 PIL 使用的格式名
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        zip_path = os.path.join(tmpdir, "converted_images.zip")
+    try:
+        # 相同输入和参数的请求直接返回缓存结果
+        cache_key = await result_cache_key("image-convert", {
+            "format": output_format, "frames": frames, "filenames": [f.filename for f in valid_files]
+        }, valid_files)
+        cached = await run_in_threadpool(lookup_cached_result, cache_key)
+        if cached:
+            return result_response(request, cached, "HIT")
+
+        # ZIP 直接写入结果目录，转换在线程池中逐个进行
+        zip_path = new_result_tmp_path(".zip")
+        await run_stage("encode", convert_images_to_zip, valid_files, output_format, frames, zip_path)
+
+        meta = await run_stage("save", save_result, zip_path, "converted_images.zip", "application/zip")
+        await run_in_threadpool(store_cached_result, cache_key, meta)
+        return result_response(request, meta, "MISS")
 
-        try:
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for file in valid_files:
-                    filename = file.filename.strip()
-                    if not filename:
-                        continue
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"图片转换过程中发生错误: {e}")
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
 
-                    input_ext = os.path.splitext(filename)[1].lower()
-                    if input_ext not in SUPPORTED_INPUT_FORMATS:
-                        logger.warning(f"跳过不支持的文件格式: {filename}")
-                        continue
+# --- 图片合成 PDF ---
 
-                    try:
-                        # 读取原始图像数据
-                        content = await file.read()
-                        image_stream = BytesIO(content)
-                        img = Image.open(image_stream)
-
-                        # 如果是 GIF 且多帧，需要特殊处理
-                        if input_ext == ".gif" and hasattr(img, "n_frames") and img.n_frames > 1:
-                            # 只取第一帧进行转换（避免 ZIP 中出现多个文件）
-                            img.seek(0)
-                            img = img.convert("RGB") if output_pil_format != "GIF" else img
-                        else:
-                            # 对于透明通道等兼容性问题做处理
-                            if img.mode in ("RGBA", "LA", "P") and output_pil_format == "JPEG":
-                                # JPEG 不支持透明通道，转为 RGB 白底
-                                background = Image.new("RGB", img.size, (255, 255, 255))
-                                if img.mode == "P":
-                                    img = img.convert("RGBA")
-                                alpha = img.split()[-1]  # 获取 alpha 通道
-                                background.paste(img, mask=alpha)
-                                img = background
-                            elif img.mode != "RGB" and output_pil_format == "JPEG":
-                                img = img.convert("RGB")
-                            elif img.mode == "P" and output_pil_format in ("PNG", "WEBP", "TIFF"):
-                                # 尽量保留质量
-                                img = img.convert("RGBA" if img.info.get("transparency") else "RGB")
-
-                        # 构造输出文件名
-                        base_name = os.path.splitext(filename)[0]
-                        new_filename = f"{base_name}{output_format}"
-
-                        # 保存转换后的图像到临时字节流
-                        output_buffer = BytesIO()
-                        img.save(output_buffer, format=output_pil_format, optimize=True)
-                        output_buffer.seek(0)
-
-                        # 写入 ZIP
-                        zipf.writestr(new_filename, output_buffer.getvalue())
-
-                    except Exception as e:
-                        logger.error(f"转换图片失败 {filename}: {e}")
-                        raise HTTPException(status_code=400, detail=f"无法处理图片文件 '{filename}': {str(e)}")
-
-            # 读取 ZIP 内容
-            with open(zip_path, "rb") as f:
-                zip_content = f.read()
-
-            zip_stream = BytesIO(zip_content)
-            zip_stream.seek(0)
-
-            return StreamingResponse(
-                zip_stream,
-                media_type="application/zip",
-                headers={"Content-Disposition": "attachment; filename=converted_images.zip"}
-            )
+def iter_pdf_image_streams(source) -> Iterator[Tuple[bytes, Tuple[int, int], Optional[tuple]]]:
+    """
+    逐帧产出 (图片数据, 像素尺寸, DPI)。单帧且无需旋转的 JPEG/PNG 直接使用原始文件数据，不解码也不重新编码；
+    其他格式和多帧图片（如多页 TIFF 扫描件）逐帧按 EXIF 方向转正后编码（来源为 JPEG 时仍编码为 JPEG，否则为 PNG）。
+    """
+    with Image.open(source) as img:
+        dpi = img.info.get("dpi")
+        orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+        if getattr(img, "n_frames", 1) == 1 and img.format in ("JPEG", "PNG") and orientation == 1:
+            size = img.size
+            if isinstance(source, str):
+                with open(source, "rb") as f:
+                    data = f.read()
+            else:
+                source.seek(0)
+                data = source.read()
+            yield data, size, dpi
+            return
+
+        output_pil_format = "JPEG" if img.format == "JPEG" else "PNG"
+        for frame in ImageSequence.Iterator(img):
+            page_image = ImageOps.exif_transpose(frame)
+            if output_pil_format == "JPEG" and page_image.mode not in ("RGB", "L", "CMYK"):
+                page_image = page_image.convert("RGB")
+            elif output_pil_format == "PNG" and page_image.mode not in ("1", "L", "LA", "P", "RGB", "RGBA", "I;16"):
+                page_image = page_image.convert("RGB")
+            buffer = BytesIO()
+            if output_pil_format == "JPEG":
+                page_image.save(buffer, format="JPEG", quality=95)
+            else:
+                page_image.save(buffer, format="PNG")
+            yield buffer.getvalue(), page_image.size, frame.info.get("dpi", dpi)
+
+def add_image_page(doc, data: bytes, size: Tuple[int, int], dpi: Optional[tuple], page_size: PdfPageSize) -> None:
+    """新建一页并插入图片：页面与图片同尺寸（按 DPI 换算为点），或为 A4 页面并等比缩放居中。"""
+    width, height = size
+    if page_size == PdfPageSize.A4:
+        paper = fitz.paper_rect("a4-l" if width > height else "a4")
+        page = doc.new_page(width=paper.width, height=paper.height)
+        margin = IMAGES_TO_PDF_A4_MARGIN
+        target = fitz.Rect(margin, margin, paper.width - margin, paper.height - margin)
+    else:
+        if dpi and len(dpi) == 2 and min(dpi) >= 10:
+            x_dpi, y_dpi = float(dpi[0]), float(dpi[1])  # TIFF 的 DPI 为 IFDRational
+        else:
+            x_dpi = y_dpi = IMAGES_TO_PDF_DEFAULT_DPI
+        page = doc.new_page(width=width * 72 / x_dpi, height=height * 72 / y_dpi)
+        target = page.rect
+    page.insert_image(target, stream=data)
+
+def images_to_pdf(sources: Iterable[tuple], page_size: PdfPageSize, pdf_path: str) -> int:
+    """
+    把图片按顺序合成为一个 PDF，每张图片（多帧图片的每一帧）一页，返回页数。
+    sources 逐个产出 (文件名, 文件路径或文件对象)。图片逐张插入，每 IMAGES_TO_PDF_FLUSH_PAGES 页
+    增量保存一次并重新打开文档，已写入磁盘的图片数据不再留在内存中。
+    """
+    doc = fitz.open()
+    page_count = pending = 0
+    saved = False
+    try:
+        for filename, source in sources:
+            try:
+                for data, size, dpi in iter_pdf_image_streams(source):
+                    add_image_page(doc, data, size, dpi, page_size)
+                    page_count += 1
+                    pending += 1
+            except Image.UnidentifiedImageError:
+                raise ValueError(f"无法处理图片文件 '{filename}': 无法识别的图片格式")
+            except Exception as e:
+                logger.error(f"插入图片失败 {filename}: {e}")
+                raise ValueError(f"无法处理图片文件 '{filename}': {e}")
+
+            if pending >= IMAGES_TO_PDF_FLUSH_PAGES:
+                if saved:
+                    doc.saveIncr()
+                else:
+                    doc.save(pdf_path)
+                    saved = True
+                doc.close()
+                doc = fitz.open(pdf_path)
+                pending = 0
+
+        if page_count == 0:
+            raise ValueError("没有可转换的图片。")
+        if not saved:
+            doc.save(pdf_path)
+        elif pending:
+            doc.saveIncr()
+    finally:
+        doc.close()
+    return page_count
+
+@app.post("/api/images-to-pdf")
+async def images_to_pdf_api(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    page_size: PdfPageSize = Form(PdfPageSize.IMAGE, description="页面尺寸：image（与图片同尺寸）或 a4")
+):
+    """
+    把多张图片按上传顺序合成为一个 PDF，每张图片（多页 TIFF、GIF 的每一帧）一页。
+    """
+    valid_files = [f for f in files if f.filename]
+    if not valid_files:
+        raise HTTPException(status_code=400, detail="没有提供任何文件。")
+    for file in valid_files:
+        if os.path.splitext(file.filename)[1].lower() not in SUPPORTED_INPUT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"不支持的图片格式: {file.filename}")
+
+    try:
+        # 相同输入和参数的请求直接返回缓存结果
+        cache_key = await result_cache_key("images-to-pdf", {"page_size": page_size}, valid_files)
+        cached = await run_in_threadpool(lookup_cached_result, cache_key)
+        if cached:
+            return result_response(request, cached, "HIT")
+
+        # 上传的图片已由服务器暂存在磁盘上，合成时逐张读取
+        pdf_path = new_result_tmp_path(".pdf")
+        await run_stage("render", images_to_pdf, [(f.filename, f.file) for f in valid_files], page_size, pdf_path)
 
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"图片转换过程中发生错误: {e}")
-            raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
+        meta = await run_stage("save", save_result, pdf_path, "images.pdf", "application/pdf")
+        await run_in_threadpool(store_cached_result, cache_key, meta)
+        return result_response(request, meta, "MISS")
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"图片合成 PDF 失败: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {e}")
 
 # 获取客户端ip的工具函数
 def get_client_ip(request):
@@ -1028,45 +4254,116 @@ def get_client_ip(request):
 @app.post("/api/heart-click")
 async def heart_click(request: Request):
     client_ip = get_client_ip(request)
-    now = datetime.now()
+    # SQLite 在多进程写入时可能等待锁（最长 30 秒），在线程池中执行，不阻塞事件循环
+    total = await run_in_threadpool(record_heart_click, client_ip, datetime.now())
+    return FastJSONResponse(content={"message": "Thank you!", "total_clicks": total})
+
+
+def record_heart_click(client_ip: str, now: datetime) -> int:
+    """记录一次点赞，返回总点击数。"""
     one_hour_ago = now - timedelta(hours=1)
 
-    conn = sqlite3.connect("heart.db")
-    cursor = conn.cursor()
+    conn = connect_db(HEART_DB_PATH)
+    try:
+        cursor = conn.cursor()
 
-    # 检查该 IP 是否在过去一小时内点过
-    # cursor.execute("""
-    #     SELECT COUNT(*) FROM heart_clicks
-    #     WHERE ip = ? AND timestamp > ?
-    # """, (client_ip, one_hour_ago))
-    # count = cursor.fetchone()[0]
+        # 检查该 IP 是否在过去一小时内点过
+        # cursor.execute("""
+        #     SELECT COUNT(*) FROM heart_clicks
+        #     WHERE ip = ? AND timestamp > ?
+        # """, (client_ip, one_hour_ago))
+        # count = cursor.fetchone()[0]
 
-    # if count > 0:
-    #     conn.close()
-    #     raise HTTPException(status_code=429, detail="Too many requests")
+        # if count > 0:
+        #     raise HTTPException(status_code=429, detail="Too many requests")
 
-    # 插入新记录
-    cursor.execute("""
-        INSERT INTO heart_clicks (ip, timestamp) VALUES (?, ?)
-    """, (client_ip, now))
-    conn.commit()
+        # 插入新记录
+        cursor.execute("""
+            INSERT INTO heart_clicks (ip, timestamp) VALUES (?, ?)
+        """, (client_ip, now))
+        conn.commit()
+
+        # 获取总点击数
+        cursor.execute("SELECT COUNT(*) FROM heart_clicks")
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
 
-    # 获取总点击数
-    cursor.execute("SELECT COUNT(*) FROM heart_clicks")
-    total = cursor.fetchone()[0]
-    conn.close()
 
-    return JSONResponse(content={"message": "Thank you!", "total_clicks": total})
+def count_heart_clicks() -> int:
+    conn = connect_db(HEART_DB_PATH)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM heart_clicks").fetchone()[0]
+    finally:
+        conn.close()
 
 
 @app.get("/api/heart-stats")
 async def heart_stats():
-    conn = sqlite3.connect("heart.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM heart_clicks")
-    total = cursor.fetchone()[0]
-    conn.close()
-    return JSONResponse(content={"total_clicks": total})
+    total = await run_in_threadpool(count_heart_clicks)
+    return FastJSONResponse(content={"total_clicks": total})
+
+
+@app.get("/api/admission/stats")
+async def admission_stats_api():
+    """返回重型请求准入控制的当前状态和累计计数。"""
+    return admission.stats()
+
+
+@app.get("/api/startup/stats")
+async def startup_stats_api():
+    """返回启动耗时、预加载配置以及已导入的重型依赖及其导入耗时。"""
+    return {
+        **STARTUP_STATS,
+        "preload": PRELOAD_SUBSYSTEMS,
+        "loaded_modules": dict(IMPORT_TIMINGS),
+    }
+
+
+def _profile_dir(profile_id: str) -> str:
+    if not re.fullmatch(r"[0-9a-f]{32}", profile_id or ""):
+        raise HTTPException(status_code=400, detail="剖析编号无效。")
+    profile_dir = os.path.join(PROFILE_DIR, profile_id)
+    if not os.path.exists(os.path.join(profile_dir, "summary.json")):
+        raise HTTPException(status_code=404, detail="剖析结果不存在或已被清理。")
+    return profile_dir
+
+@app.get("/api/profiles")
+async def profiles_list_api(request: Request):
+    """列出保存的性能剖析（最新的在前），需要管理员令牌。"""
+    require_admin(request)
+    profiles = []
+    if os.path.isdir(PROFILE_DIR):
+        for profile_id in os.listdir(PROFILE_DIR):
+            try:
+                with open(os.path.join(PROFILE_DIR, profile_id, "summary.json"), "r", encoding="utf-8") as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue  # 正在写入或已被清理
+            profiles.append({key: summary[key] for key in ("profile_id", "method", "path", "status", "started_at", "total_ms")})
+    profiles.sort(key=lambda item: item["started_at"], reverse=True)
+    return {"profiles": profiles}
+
+@app.get("/api/profiles/{profile_id}")
+async def profile_summary_api(request: Request, profile_id: str):
+    """返回一次剖析的摘要：各阶段耗时和内存、累计耗时最多的函数、内存分配最多的代码行。"""
+    require_admin(request)
+    with open(os.path.join(_profile_dir(profile_id), "summary.json"), "r", encoding="utf-8") as f:
+        return FastJSONResponse(content=json.load(f))
+
+@app.get("/api/profiles/{profile_id}/{filename}")
+async def profile_download_api(request: Request, profile_id: str, filename: str):
+    """
+    下载剖析原始数据：profile.prof 可用 pstats/snakeviz 打开，stacks.txt 可用 flamegraph.pl/speedscope 生成火焰图，
+    allocations.tracemalloc 可用 tracemalloc.Snapshot.load 加载。
+    """
+    require_admin(request)
+    if filename not in PROFILE_FILES:
+        raise HTTPException(status_code=404, detail="文件不存在。")
+    path = os.path.join(_profile_dir(profile_id), filename)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="文件不存在。")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}_{filename}")
 
 
 @app.get("/health")
@@ -1082,7 +4379,6 @@ async def test_post():
         "python_executable": sys.executable,
         "python_path": sys.path,
         "current_working_directory": os.getcwd(),
-        "environment_variables": dict(os.environ)
     }
 
 # --- 挂载前端静态文件 ---
@@ -1106,4 +4402,7 @@ else:
 # --- 挂载结束 ---
 
 # --- 运行服务 ---
-# 使用命令行运行: uvicorn main:app --reload
\ No newline at end of file
+# 使用命令行运行: uvicorn main:app --reload
+
+# 模块导入完成时间（不含启动钩子），用于启动耗时统计
+_MODULE_IMPORTED = time.perf_counter()
@@ -0,0 +1,54 @@
+# serve.py
+"""
+生产环境多进程启动入口。
+
+用法:
+    python serve.py --workers 4 --port 8001
+
+多个工作进程之间共享的状态都放在数据目录（EXCELAB_DATA_DIR）中：
+点赞计数和结果缓存索引使用 SQLite WAL，结果文件、分页缓存和增量合并数据为磁盘文件。
+"""
+import argparse
+import os
+
+import uvicorn
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Excelab 后端多进程启动")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument(
+        "--total-memory-budget-mb", type=int, default=None,
+        help="所有工作进程合计的重型请求内存预算，按进程数平分（未设置 EXCELAB_MEMORY_BUDGET_MB 时生效）"
+    )
+    parser.add_argument(
+        "--preload", default=os.environ.get("EXCELAB_PRELOAD", "all"),
+        help="启动后在后台预加载的子系统：table,pdf,image 的逗号组合、all，或留空表示按需加载"
+    )
+    args = parser.parse_args()
+
+    # 工作进程继承环境变量：数据目录使用绝对路径，保证各进程指向同一份共享状态
+    os.environ["EXCELAB_DATA_DIR"] = os.path.abspath(
+        os.environ.get("EXCELAB_DATA_DIR", os.path.join(BACKEND_DIR, "data"))
+    )
+    os.environ["EXCELAB_PRELOAD"] = args.preload
+    if args.total_memory_budget_mb and "EXCELAB_MEMORY_BUDGET_MB" not in os.environ:
+        os.environ["EXCELAB_MEMORY_BUDGET_MB"] = str(max(args.total_memory_budget_mb // args.workers, 64))
+
+    uvicorn.run(
+        "main:app",
+        app_dir=BACKEND_DIR,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# main 在导入时读取数据目录，测试使用独立的临时目录，不影响 backend/data
+os.environ.setdefault("EXCELAB_DATA_DIR", tempfile.mkdtemp(prefix="excelab-test-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+import main
+
+
+def _controller(**kwargs):
+    options = {"memory_budget": 100, "max_concurrent": 1, "max_queue": 2, "queue_timeout": 1.0}
+    options.update(kwargs)
+    return main.AdmissionController(**options)
+
+
+def test_queued_request_is_admitted_after_release():
+    async def scenario():
+        controller = _controller()
+        await controller.acquire(10)
+        waiter = asyncio.create_task(controller.acquire(10))
+        await asyncio.sleep(0)
+        assert controller.stats()["waiting"] == 1
+        controller.release(10, 0.1)
+        await waiter
+        assert controller.stats()["active"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_and_timeout_are_rejected():
+    async def scenario():
+        controller = _controller(max_queue=1, queue_timeout=0.05)
+        await controller.acquire(10)
+        waiter = asyncio.create_task(controller.acquire(10))
+        await asyncio.sleep(0)
+        with pytest.raises(main.AdmissionRejected):
+            await controller.acquire(10)
+        with pytest.raises(main.AdmissionRejected):
+            await waiter
+        assert controller.stats()["waiting"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        controller = _controller()
+        await controller.acquire(10)
+        waiter = asyncio.create_task(controller.acquire(10))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller.stats()["waiting"] == 0
+        controller.release(10, 0.1)
+        assert controller.stats()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_granted_to_cancelled_waiter_passes_to_next():
+    async def scenario():
+        controller = _controller()
+        await controller.acquire(10)
+        first = asyncio.create_task(controller.acquire(10))
+        second = asyncio.create_task(controller.acquire(20))
+        await asyncio.sleep(0)
+        # 放行 first 后、它恢复执行之前被取消：名额应交给 second
+        controller.release(10, 0.1)
+        first.cancel()
+        try:
+            await first
+        except asyncio.CancelledError:
+            pass
+        else:
+            # Python 3.11 的 wait_for 在已放行时忽略取消，请求照常执行并在结束时释放
+            controller.release(10, 0.1)
+        await asyncio.wait_for(second, 1)
+        stats = controller.stats()
+        assert (stats["active"], stats["memory_in_use"], stats["waiting"]) == (1, 20, 0)
+
+    asyncio.run(scenario())
@@ -0,0 +1,59 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+F = main.AggFunc
+
+
+def _agg(chunks, funcs, **kwargs):
+    return main.aggregate_chunks(chunks, ["g"], ["v"], funcs, **kwargs).set_index("g")
+
+
+def test_chunked_result_matches_single_frame():
+    df = pd.DataFrame({"g": list("abab" * 5), "v": np.arange(20)})
+    funcs = [F.SUM, F.COUNT, F.MEAN, F.MIN, F.MAX, F.NUNIQUE]
+    chunked = _agg([df.iloc[i:i + 3] for i in range(0, len(df), 3)], funcs)
+    pd.testing.assert_frame_equal(chunked, _agg([df], funcs))
+    assert chunked.loc["a", "v_sum"] == sum(range(0, 20, 2))
+    assert chunked.loc["b", "v_mean"] == np.mean(range(1, 20, 2))
+
+
+def test_mixed_text_and_numbers_use_numeric_values():
+    df = pd.DataFrame({"g": ["a", "a", "a"], "v": [3, "x", 1]})
+    result = _agg([df.iloc[:1], df.iloc[1:]], [F.SUM, F.MIN, F.MAX, F.COUNT])
+    assert result.loc["a"].tolist() == [4, 1, 3, 3]
+
+
+def test_all_text_group_sum_is_empty_not_zero():
+    df = pd.DataFrame({"g": ["a", "b"], "v": [1, "text"]})
+    result = _agg([df], [F.SUM, F.MEAN])
+    assert result.loc["a", "v_sum"] == 1
+    assert pd.isna(result.loc["b", "v_sum"])
+    assert pd.isna(result.loc["b", "v_mean"])
+
+
+def test_pivot_column():
+    df = pd.DataFrame({"g": ["a", "a", "b"], "p": ["x", "y", "x"], "v": [1, 2, 3]})
+    result = main.aggregate_chunks([df], ["g"], ["v"], [F.SUM], pivot_column="p").set_index("g")
+    assert result.columns.tolist() == ["x", "y"]
+    assert result.loc["a"].tolist() == [1, 2]
+
+
+def test_missing_column_is_rejected():
+    with pytest.raises(ValueError):
+        main.aggregate_chunks([pd.DataFrame({"g": [1]})], ["g"], ["v"], [F.SUM])
+
+
+def test_aggregate_endpoint_mixed_column(client):
+    response = client.post(
+        "/api/aggregate",
+        files={"file": ("a.csv", b"g,v\na,1\na,x\nb,2\n", "text/csv")},
+        data={"group_by": "g", "value_columns": "v", "funcs": "sum,max"},
+    )
+    assert response.status_code == 200
+    df = pd.read_excel(io.BytesIO(response.content))
+    assert df["v_max"].tolist() == [1, 2]
@@ -0,0 +1,40 @@
+import datetime
+import io
+
+import pandas as pd
+
+import main
+
+
+def test_mixed_type_object_column_keeps_non_strings():
+    # 布尔值和空值混在同一 object 列中，不能走 .str 访问器
+    df = pd.read_csv(io.StringIO("a,flag\n1,True\n2,\n3,False\n"))
+    cleaned, stats = main.clean_dataframe_with_stats(df, main.CleanOptions())
+    assert cleaned["flag"].tolist()[0] is True
+    assert cleaned["flag"].tolist()[2] is False
+    assert len(cleaned) == 3
+    assert stats[1]["null_cells"] == 1
+
+
+def test_time_column_with_blank_cell():
+    df = pd.DataFrame({"t": [datetime.time(1, 2), None, datetime.time(3, 4)]})
+    cleaned, stats = main.clean_dataframe_with_stats(df, main.CleanOptions(trim_spaces=True))
+    assert cleaned["t"].tolist() == [datetime.time(1, 2), datetime.time(3, 4)]
+    assert stats[0]["blank_cells"] == 0
+
+
+def test_only_string_cells_are_trimmed():
+    df = pd.DataFrame({"v": [" x ", "   ", 5, True]})
+    cleaned, stats = main.clean_dataframe_with_stats(df, main.CleanOptions(trim_spaces=True))
+    assert cleaned["v"].tolist() == ["x", 5, True]
+    assert stats[0]["blank_cells"] == 1
+    assert stats[0]["trimmed_cells"] == 1
+
+
+def test_clean_endpoint_mixed_csv(client):
+    response = client.post(
+        "/api/clean/preview",
+        files={"file": ("a.csv", b"a,flag\n1,True\n2,\n3,False\n", "text/csv")},
+    )
+    assert response.status_code == 200
+    assert response.json()["cleaned_rows"] == 3
@@ -0,0 +1,64 @@
+import json
+import os
+
+import fitz
+import pandas as pd
+
+import cli
+
+
+def _write_csv(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_merge_writes_output_file(tmp_path):
+    a = _write_csv(tmp_path / "a.csv", "客户,金额\n甲,1\n")
+    b = _write_csv(tmp_path / "b.csv", "客户,城市\n乙,北京\n")
+    output = tmp_path / "merged.csv"
+    assert cli.main_cli(["merge", a, b, "-o", str(output), "--mode", "inner"]) == 0
+    assert pd.read_csv(output).to_dict("records") == [{"客户": "甲"}, {"客户": "乙"}]
+
+
+def test_clean_skips_completed_files_until_forced(tmp_path, capsys):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    _write_csv(inbox / "a.csv", "a,b\n x ,1\n,\n")
+    out = tmp_path / "out"
+    args = ["clean", str(inbox), "-o", str(out), "--trim-spaces", "--output-format", "csv", "--workers", "1"]
+
+    assert cli.main_cli(args) == 0
+    assert pd.read_csv(out / "a_cleaned.csv").to_dict("records") == [{"a": "x", "b": 1}]
+    manifest = json.loads((out / cli.MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert [entry["status"] for entry in manifest["items"].values()] == ["done"]
+
+    capsys.readouterr()
+    assert cli.main_cli(args) == 0
+    assert "跳过已完成 1 个" in capsys.readouterr().out
+    assert cli.main_cli(args + ["--force"]) == 0
+    assert "跳过已完成 0 个" in capsys.readouterr().out
+
+
+def test_pipeline_rejects_invalid_steps(tmp_path, capsys):
+    source = _write_csv(tmp_path / "a.csv", "a\n1\n")
+    code = cli.main_cli(["pipeline", source, "-o", str(tmp_path / "out"), "--steps", '[{"op": "nope"}]'])
+    assert code != 0
+    assert not (tmp_path / "out").exists()
+
+
+def test_pdf_merge_with_toc(tmp_path):
+    paths = []
+    for name in ("a", "b"):
+        doc = fitz.open()
+        doc.new_page()
+        doc.save(str(tmp_path / f"{name}.pdf"))
+        doc.close()
+        paths.append(str(tmp_path / f"{name}.pdf"))
+    output = tmp_path / "merged.pdf"
+    assert cli.main_cli(["pdf-merge", *paths, "-o", str(output), "--toc"]) == 0
+    with fitz.open(str(output)) as doc:
+        assert [entry[1] for entry in doc.get_toc()] == ["目录", "a.pdf", "b.pdf"]
+
+
+def test_missing_inputs(tmp_path):
+    assert cli.main_cli(["clean", str(tmp_path / "none*.csv"), "-o", str(tmp_path / "out")]) == 2
@@ -0,0 +1,69 @@
+import datetime
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import main
+
+
+def _client(monkeypatch, offloaded):
+    real = main.run_in_threadpool
+
+    async def recording(func, *args, **kwargs):
+        offloaded.append(len(args[0]))
+        return await real(func, *args, **kwargs)
+
+    monkeypatch.setattr(main, "run_in_threadpool", recording)
+    routes = [
+        Route("/json/{size:int}", lambda request: JSONResponse({"data": "x" * request.path_params["size"]})),
+        Route("/binary", lambda request: Response(b"y" * 10_000, media_type="application/zip")),
+    ]
+    app = main.JSONCompressionMiddleware(Starlette(routes=routes), minimum_size=1024, offload_size=100_000)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("size, compressed, offloaded_expected", [(10, False, False), (5_000, True, False), (200_000, True, True)])
+def test_json_compression_thresholds(monkeypatch, size, compressed, offloaded_expected):
+    offloaded = []
+    client = _client(monkeypatch, offloaded)
+    response = client.get(f"/json/{size}", headers={"Accept-Encoding": "gzip"})
+    assert response.json()["data"] == "x" * size
+    assert (response.headers.get("content-encoding") == "gzip") == compressed
+    assert bool(offloaded) == offloaded_expected
+
+
+def test_non_json_responses_pass_through(monkeypatch):
+    client = _client(monkeypatch, [])
+    response = client.get("/binary", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert len(response.content) == 10_000
+
+
+def test_gzip_body_is_valid():
+    body = b'{"a": 1}' * 1000
+    assert gzip.decompress(main.JSONCompressionMiddleware.compress(body, "gzip")) == body
+
+
+def test_fast_json_response_handles_numpy_nan_and_datetime():
+    content = {
+        "int": np.int64(3),
+        "float": np.float32(1.5),
+        "nan": float("nan"),
+        "array": np.array([1, 2]),
+        "when": datetime.datetime(2024, 1, 2, 3, 4, 5),
+        "ts": pd.Timestamp("2024-01-02"),
+        "missing": pd.NaT,
+    }
+    decoded = json.loads(main.FastJSONResponse(content).body)
+    assert decoded["int"] == 3 and decoded["float"] == 1.5
+    assert decoded["nan"] is None and decoded["missing"] is None
+    assert decoded["array"] == [1, 2]
+    assert decoded["when"].startswith("2024-01-02T03:04:05")
+    assert decoded["ts"].startswith("2024-01-02")
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+import main
+
+M = main.DeduplicateMatch
+NAMES = pd.Series(["Acme Corp", "ACME  corp", "Ａｃｍｅ Corp", "Acme Corp.", "Beta Ltd", "  ", "", None])
+
+
+def test_normalized_mode_groups_width_case_and_spaces():
+    clusters = main.build_dedup_clusters(NAMES, M.NORMALIZED)
+    assert clusters[0] == clusters[1] == clusters[2]
+    assert clusters[3] != clusters[0]
+
+
+def test_blank_keys_form_their_own_group():
+    for mode in (M.NORMALIZED, M.FUZZY):
+        clusters = main.build_dedup_clusters(NAMES, mode, 0.8)
+        assert clusters[5] == clusters[6]
+        assert clusters[5] not in set(clusters[:5])
+        assert pd.isna(clusters[7])
+
+
+def test_fuzzy_mode_merges_near_duplicates():
+    clusters = main.build_dedup_clusters(NAMES, M.FUZZY, 0.9)
+    assert clusters[0] == clusters[3]
+    assert clusters[4] != clusters[0]
+
+
+def test_fuzzy_fallback_without_rapidfuzz(monkeypatch):
+    monkeypatch.setattr(main, "import_timed", lambda name: None)
+    clusters = main.build_dedup_clusters(NAMES, M.FUZZY, 0.9)
+    assert clusters[0] == clusters[3]
+    assert clusters[4] != clusters[0]
+
+
+@pytest.mark.parametrize("threshold", [0, 1.5, -0.1])
+def test_threshold_out_of_range_is_rejected(threshold):
+    for mode in M:
+        with pytest.raises(ValueError):
+            main.build_dedup_clusters(NAMES, mode, threshold)
+
+
+def test_deduplicate_max_keeps_largest_value_per_cluster():
+    df = pd.DataFrame({"name": ["acme", "ACME ", "beta", " "], "amt": [1, 5, 2, 3]})
+    result = main.deduplicate_dataframe(df, "name", main.DeduplicateLogic.MAX, "amt", M.NORMALIZED)
+    assert sorted(result["amt"].tolist()) == [2, 3, 5]
+
+
+def test_deduplicate_endpoint_rejects_bad_threshold(client):
+    response = client.post(
+        "/api/deduplicate/preview",
+        files={"file": ("a.csv", b"name,amt\na,1\nb,2\n", "text/csv")},
+        data={"deduplicate_column": "name", "logic": "random", "match_mode": "fuzzy", "similarity_threshold": "1.5"},
+    )
+    assert response.status_code == 400
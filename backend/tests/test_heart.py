@@ -0,0 +1,6 @@
+def test_heart_click_increments_total(client):
+    before = client.get("/api/heart-stats").json()["total_clicks"]
+    response = client.post("/api/heart-click")
+    assert response.status_code == 200
+    assert response.json()["total_clicks"] == before + 1
+    assert client.get("/api/heart-stats").json()["total_clicks"] == before + 1
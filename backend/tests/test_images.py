@@ -0,0 +1,83 @@
+import io
+import zipfile
+
+import fitz
+from PIL import Image
+
+
+def _gif(frames=3):
+    images = [Image.new("RGB", (16, 12), color) for color in ("red", "green", "blue")[:frames]]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="GIF", save_all=True, append_images=images[1:], duration=[50, 80, 120][:frames], loop=0)
+    return buffer.getvalue()
+
+
+def _png(size=(20, 10)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _convert(client, frames, fmt):
+    response = client.post(
+        "/api/image_convert",
+        files=[("files", ("anim.gif", _gif(), "image/gif"))],
+        data={"format": fmt, "frames": frames},
+    )
+    assert response.status_code == 200, response.text
+    return zipfile.ZipFile(io.BytesIO(response.content))
+
+
+def test_convert_every_frame(client):
+    with _convert(client, "all", "png") as archive:
+        assert sorted(archive.namelist()) == ["anim_001.png", "anim_002.png", "anim_003.png"]
+
+
+def test_convert_animated_keeps_frames_and_durations(client):
+    with _convert(client, "animated", "webp") as archive:
+        with Image.open(io.BytesIO(archive.read("anim.webp"))) as img:
+            assert img.n_frames == 3
+            durations = []
+            for index in range(img.n_frames):
+                img.seek(index)
+                img.load()  # WebP 的帧时长在解码后才写入 info
+                durations.append(img.info["duration"])
+    assert durations == [50, 80, 120]
+
+
+def test_convert_animated_rejects_single_frame_format(client):
+    response = client.post(
+        "/api/image_convert",
+        files=[("files", ("anim.gif", _gif(), "image/gif"))],
+        data={"format": "jpg", "frames": "animated"},
+    )
+    assert response.status_code == 400
+
+
+def test_images_to_pdf_one_page_per_frame(client):
+    response = client.post(
+        "/api/images-to-pdf",
+        files=[("files", ("a.png", _png(), "image/png")), ("files", ("b.gif", _gif(2), "image/gif"))],
+        data={"page_size": "a4"},
+    )
+    assert response.status_code == 200, response.text
+    with fitz.open(stream=response.content, filetype="pdf") as doc:
+        assert doc.page_count == 3
+        # A4 页面，方向跟随图片
+        assert sorted(round(v) for v in doc[0].rect[2:]) == [595, 842]
+
+
+def test_images_to_pdf_flushes_in_batches(monkeypatch, tmp_path):
+    import main
+
+    monkeypatch.setattr(main, "IMAGES_TO_PDF_FLUSH_PAGES", 2)
+    sources = [(f"{i}.png", io.BytesIO(_png((10 + i, 10)))) for i in range(5)]
+    pdf_path = str(tmp_path / "out.pdf")
+    assert main.images_to_pdf(sources, main.PdfPageSize.IMAGE, pdf_path) == 5
+    with fitz.open(pdf_path) as doc:
+        assert [round(page.rect.width) for page in doc] == [round((10 + i) * 72 / main.IMAGES_TO_PDF_DEFAULT_DPI) for i in range(5)]
+
+
+def test_images_to_pdf_rejects_unsupported_files(client):
+    response = client.post("/api/images-to-pdf", files=[("files", ("a.txt", b"x", "text/plain"))])
+    assert response.status_code == 400
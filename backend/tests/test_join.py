@@ -0,0 +1,69 @@
+import io
+
+import pandas as pd
+
+import main
+
+
+LEFT = pd.DataFrame({"id": ["a", " b", "c", None], "x": [1, 2, 3, 4]})
+RIGHT = pd.DataFrame({"id": ["b", "a", "a", "z"], "v": [10, 20, 30, 40]})
+
+
+def test_first_match_takes_first_lookup_row():
+    joined = main.join_dataframes(LEFT, RIGHT, ["id"], ["id"], main.JoinHow.LEFT)
+    assert joined["x"].tolist() == [1, 2, 3, 4]
+    assert joined["v"].tolist()[:2] == [20, 10]
+    assert joined["v"].isna().tolist() == [False, False, True, True]
+
+
+def test_first_match_same_result_when_lookup_table_is_larger():
+    # 查找表行数更多时索引建在主表一侧，结果必须与建在查找表一侧时一致
+    big_right = pd.concat([RIGHT] + [pd.DataFrame({"id": ["y"], "v": [0]})] * 10, ignore_index=True)
+    small_left = LEFT.head(3)
+    for how in (main.JoinHow.LEFT, main.JoinHow.INNER):
+        joined = main.join_dataframes(small_left, big_right, ["id"], ["id"], how)
+        expected = main.join_dataframes(small_left, RIGHT, ["id"], ["id"], how)
+        pd.testing.assert_frame_equal(joined, expected)
+
+
+def test_inner_and_anti_join():
+    inner = main.join_dataframes(LEFT, RIGHT, ["id"], ["id"], main.JoinHow.INNER)
+    assert inner["x"].tolist() == [1, 2]
+    anti = main.join_dataframes(LEFT, RIGHT, ["id"], ["id"], main.JoinHow.ANTI)
+    assert anti["x"].tolist() == [3, 4]
+
+
+def test_expand_all_matches():
+    joined = main.join_dataframes(LEFT, RIGHT, ["id"], ["id"], main.JoinHow.INNER, first_match_only=False)
+    assert sorted(joined["v"].tolist()) == [10, 20, 30]
+
+
+def test_match_statistics():
+    stats = main.join_match_statistics(LEFT, RIGHT, ["id"], ["id"])
+    assert stats["left_unique_keys"] == 3
+    assert stats["matched_keys"] == 2
+    assert stats["matched_left_rows"] == 2
+    assert stats["left_empty_keys"] == 1
+    assert stats["right_duplicate_keys"] == 1
+
+
+def _files():
+    return {
+        "left_file": ("left.csv", b"id,x\na,1\nb,2\nc,3\n", "text/csv"),
+        "right_file": ("right.csv", b"id,v\na,10\nb,20\n", "text/csv"),
+    }
+
+
+def test_join_preview_endpoint(client):
+    response = client.post("/api/join/preview", files=_files(), data={"left_on": "id", "how": "left"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["matched_left_rows"] == 2
+    assert [row["v"] for row in body["preview_data"]] == [10, 20, ""]
+
+
+def test_join_endpoint_returns_excel(client):
+    response = client.post("/api/join", files=_files(), data={"left_on": "id", "how": "inner"})
+    assert response.status_code == 200
+    df = pd.read_excel(io.BytesIO(response.content))
+    assert df["v"].tolist() == [10, 20]
@@ -0,0 +1,34 @@
+import io
+
+import pandas as pd
+
+
+def _post(client, token, *files, reset=False):
+    return client.post(
+        "/api/merge/incremental",
+        files=[("files", (name, content, "text/csv")) for name, content in files],
+        data={"merge_mode": "outer", "token": token, "reset": str(reset).lower()},
+    )
+
+
+def test_incremental_merge_skips_already_merged_files(client):
+    token = "test-incremental-merge"
+    first = _post(client, token, ("a.csv", b"k,v\n1,x\n"), reset=True)
+    assert first.status_code == 200
+    assert first.headers["X-Total-Rows"] == "1"
+
+    second = _post(client, token, ("a.csv", b"k,v\n1,x\n"), ("b.csv", b"k,w\n2,y\n"))
+    assert second.status_code == 200
+    assert second.headers["X-Skipped-Files"] == "1"
+    assert second.headers["X-Merged-Files"] == "2"
+    df = pd.read_excel(io.BytesIO(second.content))
+    assert df["k"].tolist() == [1, 2]
+    assert df.columns.tolist() == ["k", "v", "w"]
+
+    manifest = client.get(f"/api/merge/incremental/{token}").json()
+    assert [item["rows"] for item in manifest["files"]] == [1, 1]
+
+
+def test_incremental_merge_rejects_invalid_token(client):
+    response = _post(client, "../escape", ("a.csv", b"k\n1\n"))
+    assert response.status_code == 400
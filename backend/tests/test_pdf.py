@@ -0,0 +1,106 @@
+import io
+import zipfile
+
+import fitz
+import openpyxl
+import pytest
+
+import main
+
+
+def _pdf(pages, prefix="P"):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"{prefix}{i + 1}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _texts(data):
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return [page.get_text().strip() for page in doc]
+
+
+def _upload(data, name="doc.pdf"):
+    return {"file": (name, data, "application/pdf")}
+
+
+def test_parse_page_ranges():
+    assert main.parse_page_ranges("1-3, 5, 8-", 10) == [(0, 2), (4, 4), (7, 9)]
+    assert main.parse_page_ranges("-2", 5) == [(0, 1)]
+    for spec in ("0", "4-2", "1-11", "a", ""):
+        with pytest.raises(ValueError):
+            main.parse_page_ranges(spec, 10)
+
+
+def test_split_by_ranges(client):
+    response = client.post("/api/pdf/split", files=_upload(_pdf(4)), data={"ranges": "1-2,3-"})
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        parts = [archive.read(name) for name in sorted(archive.namelist())]
+    assert [_texts(part) for part in parts] == [["P1", "P2"], ["P3", "P4"]]
+
+
+def test_split_requires_exactly_one_mode(client):
+    response = client.post("/api/pdf/split", files=_upload(_pdf(2)), data={"ranges": "1", "every": "1"})
+    assert response.status_code == 400
+
+
+def test_extract_keeps_requested_order(client):
+    response = client.post("/api/pdf/extract", files=_upload(_pdf(3)), data={"pages": "3,1"})
+    assert response.status_code == 200
+    assert _texts(response.content) == ["P3", "P1"]
+
+
+def test_rotate_selected_pages(client):
+    response = client.post("/api/pdf/rotate", files=_upload(_pdf(3)), data={"angle": "-90", "pages": "2"})
+    assert response.status_code == 200
+    with fitz.open(stream=response.content, filetype="pdf") as doc:
+        assert [page.rotation for page in doc] == [0, 270, 0]
+    assert client.post("/api/pdf/rotate", files=_upload(_pdf(1)), data={"angle": "45"}).status_code == 400
+
+
+def test_compress_returns_valid_pdf(client):
+    response = client.post("/api/pdf/compress", files=_upload(_pdf(2)))
+    assert response.status_code == 200
+    assert _texts(response.content) == ["P1", "P2"]
+    assert client.post("/api/pdf/compress", files=_upload(_pdf(1)), data={"image_dpi": "10"}).status_code == 400
+
+
+def test_merge_with_toc_and_blank_pages(client):
+    response = client.post(
+        "/api/pdfmerge",
+        files=[("files", ("a.pdf", _pdf(2, "A"), "application/pdf")), ("files", ("b.pdf", _pdf(1, "B"), "application/pdf"))],
+        data={"merge_options": ["add_toc", "add_blank_page"]},
+    )
+    assert response.status_code == 200
+    with fitz.open(stream=response.content, filetype="pdf") as doc:
+        toc_pages = main.pdf_toc_page_count(2)
+        assert doc.page_count == toc_pages + 2 + 1 + 1
+        assert doc.get_toc(simple=True) == [
+            [1, "目录", 1], [1, "a.pdf", toc_pages + 1], [1, "b.pdf", toc_pages + 4]
+        ]
+        assert "a.pdf" in doc[0].get_text()
+        # 目录条目可点击跳转到对应文件的起始页
+        assert sorted(link["page"] for link in doc[0].get_links()) == [toc_pages, toc_pages + 3]
+
+
+def test_pdf_text_to_workbook_in_chunks(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "PDF_TABLE_CHUNK_PAGES", 1)
+    monkeypatch.setattr(main, "PDF_TABLE_WORKERS", 1)
+    source = tmp_path / "in.pdf"
+    source.write_bytes(_pdf(3))
+    output = tmp_path / "out.xlsx"
+    stats = main.convert_pdf_to_workbook(str(source), main.PdfExtractMode.TEXT.value, "2-3", str(output))
+    assert stats["chunks"] == 2
+    rows = list(openpyxl.load_workbook(output)["文本"].values)
+    assert rows[1:] == [(2, "P2"), (3, "P3")]
+
+
+def test_pdf_to_table_endpoint(client):
+    response = client.post("/api/pdf-to-table", files=_upload(_pdf(2)), data={"mode": "text"})
+    assert response.status_code == 200
+    rows = list(openpyxl.load_workbook(io.BytesIO(response.content))["文本"].values)
+    assert [row[0] for row in rows[1:]] == [1, 2]
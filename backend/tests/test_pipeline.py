@@ -0,0 +1,56 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+import main
+
+
+def _csv(text):
+    return pd.read_csv(io.StringIO(text))
+
+
+def test_merge_then_dedup_max_keeps_blank_amount_as_nan():
+    frames = [_csv("name,amt\nA,1\nB,\n"), _csv("name,amt\nA,5\nB,2\n")]
+    steps = main.parse_pipeline_steps(json.dumps([
+        {"op": "merge", "mode": "outer"},
+        {"op": "deduplicate", "column": "name", "logic": "max", "value_column": "amt"},
+    ]))
+    df, timings = main.run_pipeline(frames, steps)
+    assert dict(zip(df["name"], df["amt"])) == {"A": 5, "B": 2}
+    assert [t["rows_out"] for t in timings] == [4, 2]
+
+
+def test_inner_merge_keeps_first_table_column_order():
+    frames = [_csv("b,a,c\n1,2,3\n"), _csv("c,a,b\n4,5,6\n")]
+    merged = main.concat_dataframes(frames, main.MergeMode.INNER)
+    assert merged.columns.tolist() == ["b", "a", "c"]
+    assert merged["a"].tolist() == [2, 5]
+
+
+def test_first_step_must_merge_multiple_tables():
+    steps = main.parse_pipeline_steps(json.dumps([{"op": "clean"}]))
+    with pytest.raises(ValueError):
+        main.run_pipeline([_csv("a\n1\n"), _csv("a\n2\n")], steps)
+
+
+def test_pipeline_preview_merge_clean_dedup(client):
+    steps = [
+        {"op": "merge", "mode": "outer"},
+        {"op": "clean"},
+        {"op": "deduplicate", "column": "name", "logic": "max", "value_column": "amt"},
+    ]
+    response = client.post(
+        "/api/pipeline/preview",
+        files=[
+            ("files", ("a.csv", b"name,amt\nA,1\nB,\n", "text/csv")),
+            ("files", ("b.csv", b"name,amt\nA,5\nB,2\n", "text/csv")),
+        ],
+        data={"steps": json.dumps(steps)},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total_rows"] == 2
+    assert [step["op"] for step in body["steps"]] == ["parse", "merge", "clean", "deduplicate"]
+    assert {row["name"]: row["amt"] for row in body["data"]} == {"A": 5, "B": 2}
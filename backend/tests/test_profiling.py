@@ -0,0 +1,52 @@
+import pytest
+
+import main
+
+TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", TOKEN)
+    return {"X-Admin-Token": TOKEN}
+
+
+def _clean(client, headers):
+    return client.post(
+        "/api/clean",
+        files={"file": ("a.csv", b"a,b\n1, x \n2,y\n", "text/csv")},
+        data={"trim_spaces": "true"},
+        headers=headers,
+    )
+
+
+def test_profile_requires_admin_token(client, admin):
+    assert _clean(client, {"X-Profile": "1"}).status_code == 403
+    assert _clean(client, {"X-Profile": "1", "X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/api/profiles").status_code == 403
+
+
+def test_profile_not_configured_rejects_any_token(client, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "")
+    assert _clean(client, {"X-Profile": "1", "X-Admin-Token": ""}).status_code == 403
+
+
+@pytest.mark.parametrize("options, filename", [("cprofile,memory", "profile.prof"), ("sample", "stacks.txt")])
+def test_profiled_request_saves_summary(client, admin, options, filename):
+    response = _clean(client, {**admin, "X-Profile": options})
+    assert response.status_code == 200
+    url = response.headers["X-Profile-Url"]
+    assert response.headers["X-Cache"] != "HIT"  # 被剖析的请求不使用结果缓存
+
+    summary = client.get(url, headers=admin)
+    assert summary.status_code == 200
+    assert "parse" in {stage["name"] for stage in summary.json()["stages"]}
+
+    profile_id = response.headers["X-Profile-Id"]
+    assert client.get(f"{url}/{filename}", headers=admin).status_code == 200
+    assert profile_id in [item["profile_id"] for item in client.get("/api/profiles", headers=admin).json()["profiles"]]
+
+
+def test_profile_id_validation(client, admin):
+    assert client.get("/api/profiles/not-an-id", headers=admin).status_code == 400
+    assert client.get("/api/profiles/" + "0" * 32, headers=admin).status_code == 404
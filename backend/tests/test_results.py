@@ -0,0 +1,71 @@
+import uuid
+
+import main
+
+
+def _merge_csv(client):
+    # 每次内容不同，避免命中其他测试留下的缓存
+    marker = uuid.uuid4().hex
+    files = [
+        ("files", ("a.csv", f"k,v\n1,{marker}\n".encode(), "text/csv")),
+        ("files", ("b.csv", ("k,v\n" + "2,x\n" * 500).encode(), "text/csv")),
+    ]
+    return client.post("/api/merge", files=files, data={"merge_mode": "outer", "output_format": "csv"})
+
+
+def test_result_download_supports_range_and_conditional_requests(client):
+    response = _merge_csv(client)
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "MISS"
+    url = response.headers["X-Result-Url"]
+    identity = {"Accept-Encoding": "identity"}
+
+    full = client.get(url, headers=identity)
+    assert full.status_code == 200
+    assert int(full.headers["Content-Length"]) == len(full.content)
+    etag = full.headers["ETag"]
+
+    partial = client.get(url, headers={**identity, "Range": "bytes=3-9"})
+    assert partial.status_code == 206
+    assert partial.content == full.content[3:10]
+    assert partial.headers["Content-Range"] == f"bytes 3-9/{len(full.content)}"
+
+    assert client.get(url, headers={**identity, "If-None-Match": etag}).status_code == 304
+    stale = client.get(url, headers={**identity, "Range": "bytes=0-1", "If-Range": '"other"'})
+    assert stale.status_code == 200
+
+    head = client.head(url, headers=identity)
+    assert head.status_code == 200
+    assert head.headers["Content-Length"] == full.headers["Content-Length"]
+
+
+def test_csv_result_is_served_precompressed(client):
+    url = _merge_csv(client).headers["X-Result-Url"]
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    plain = client.get(url, headers={"Accept-Encoding": "identity"}).content
+    assert response.content == plain  # httpx 自动解压
+
+
+def test_repeated_request_hits_result_cache(client):
+    marker = uuid.uuid4().hex.encode()
+    files = {"file": ("a.csv", b"name,v\n" + marker + b",1\n x ,2\n", "text/csv")}
+    before = client.get("/api/cache/stats").json()
+    first = client.post("/api/clean", files=files, data={"trim_spaces": "true"})
+    second = client.post("/api/clean", files=files, data={"trim_spaces": "true"})
+    other_options = client.post("/api/clean", files=files, data={"trim_spaces": "false"})
+    assert (first.headers["X-Cache"], second.headers["X-Cache"], other_options.headers["X-Cache"]) == ("MISS", "HIT", "MISS")
+    assert second.content == first.content
+    after = client.get("/api/cache/stats").json()
+    assert after["hits"] == before["hits"] + 1
+
+
+def test_result_cache_key_normalizes_params():
+    assert main._normalize_cache_param(main.MergeMode.OUTER) == "outer"
+    assert main._normalize_cache_param(main.CleanOptions(trim_spaces=True))["trim_spaces"] is True
+
+
+def test_unknown_and_invalid_result_ids(client):
+    assert client.get("/api/results/" + "0" * 32).status_code == 404
+    assert client.get("/api/results/bad-id").status_code == 400
@@ -0,0 +1,29 @@
+import main
+
+
+def test_import_timed_records_and_tolerates_missing_modules():
+    assert main.import_timed("excelab_missing_module") is None
+    assert "excelab_missing_module" not in main.IMPORT_TIMINGS
+    assert main.import_timed("json") is not None
+    assert "json" in main.IMPORT_TIMINGS
+
+
+def test_lazy_module_imports_on_first_access():
+    lazy = main.LazyModule("colorsys")
+    assert "未加载" in repr(lazy)
+    assert lazy.rgb_to_hsv(0, 0, 0) == (0, 0, 0)
+    assert "已加载" in repr(lazy)
+    missing = main.LazyModule("excelab_missing_module")
+    try:
+        missing.anything
+    except ImportError:
+        pass
+    else:
+        raise AssertionError("missing module should raise ImportError")
+
+
+def test_startup_stats(client):
+    response = client.get("/api/startup/stats")
+    assert response.status_code == 200
+    body = response.json()
+    assert "preload" in body and "loaded_modules" in body
@@ -0,0 +1,63 @@
+import io
+import json
+import os
+import time
+
+import pyarrow as pa
+
+import main
+
+
+def _upload(client, content=b"city,amt\nbj,3\nsh,1\nbj,2\ngz,\n"):
+    response = client.post("/api/table", files={"file": ("t.csv", content, "text/csv")})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_upload_returns_columns_and_row_count(client):
+    body = _upload(client)
+    assert body["columns"] == ["city", "amt"]
+    assert body["total_rows"] == 4
+
+
+def test_rows_sort_filter_and_paging(client):
+    table_id = _upload(client)["table_id"]
+    response = client.get(f"/api/table/{table_id}/rows", params={
+        "sort_by": "amt", "descending": "true", "offset": 1, "limit": 2,
+        "filters": json.dumps([{"column": "city", "op": "not_empty"}]),
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total_rows"] == 4
+    assert body["data"][1] == [2.0, 1.0]
+
+    filtered = client.get(f"/api/table/{table_id}/rows", params={
+        "filters": json.dumps([{"column": "city", "op": "equals", "value": "bj"}]),
+    }).json()
+    assert filtered["total_rows"] == 2
+    assert filtered["data"][0] == ["bj", "bj"]
+
+
+def test_rows_as_arrow(client):
+    table_id = _upload(client)["table_id"]
+    response = client.get(f"/api/table/{table_id}/rows", params={"format": "arrow", "limit": 2})
+    assert response.headers["X-Total-Rows"] == "4"
+    table = pa.ipc.open_stream(io.BytesIO(response.content)).read_all()
+    assert table.column("city").to_pylist() == ["bj", "sh"]
+
+
+def test_rows_errors(client):
+    assert client.get("/api/table/" + "0" * 32 + "/rows").status_code == 404
+    assert client.get("/api/table/not-an-id/rows").status_code == 400
+    table_id = _upload(client)["table_id"]
+    assert client.get(f"/api/table/{table_id}/rows", params={"sort_by": "nope"}).status_code == 400
+
+
+def test_table_cache_cleanup_expires_and_evicts(client, monkeypatch):
+    ids = [_upload(client, f"a\n{i}\n".encode())["table_id"] for i in range(3)]
+    old = time.time() - main.TABLE_CACHE_TTL_SECONDS - 10
+    os.utime(main._table_path(ids[0]), (old, old))
+    os.utime(main._table_path(ids[1]), (time.time() - 100,) * 2)
+    monkeypatch.setattr(main, "TABLE_CACHE_MAX_BYTES", os.path.getsize(main._table_path(ids[2])))
+    main.cleanup_table_cache(time.time())
+    assert [os.path.exists(main._table_path(table_id)) for table_id in ids] == [False, False, True]